@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+aiohttp WebSocket Route
+Serves the control channel as a WebSocketResponse on the HTTP port (/ws), so
+phones need only one listener and one firewall hole. The connection is
+wrapped to look like a 'websockets' connection, so the same handler serves
+both the /ws route and the legacy port-8765 listener.
+"""
+
+from aiohttp import web, WSMsgType
+
+import protocol
+
+
+class AiohttpWebSocket:
+    """Adapts an aiohttp WebSocketResponse to the websockets connection interface"""
+
+    def __init__(self, request, ws):
+        self._ws = ws
+        self.request = request
+        self.remote_address = request.transport.get_extra_info('peername') if request.transport else None
+        self.subprotocol = ws.ws_protocol
+
+    def __aiter__(self):
+        return self._messages()
+
+    async def _messages(self):
+        async for msg in self._ws:
+            if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+                yield msg.data
+            elif msg.type == WSMsgType.ERROR:
+                break
+
+    async def send(self, data):
+        if isinstance(data, str):
+            await self._ws.send_str(data)
+        else:
+            await self._ws.send_bytes(data)
+
+    async def close(self, code=1000, reason=''):
+        await self._ws.close(code=code, message=reason.encode('utf-8'))
+
+
+def websocket_route(handler):
+    """Wrap a websockets-style connection handler as an aiohttp GET route"""
+    async def serve_websocket(request):
+        ws = web.WebSocketResponse(protocols=protocol.SUBPROTOCOLS, heartbeat=20)
+        await ws.prepare(request)
+        await handler(AiohttpWebSocket(request, ws))
+        return ws
+    return serve_websocket
@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+"""
+Input Backends
+Pluggable OS input injection. The pyautogui backend keeps the original
+behaviour; the native backends send relative motion and key events directly
+(SendInput on Windows, uinput on Linux) without per-call sleeps, failsafe
+checks or cursor-position queries. All backends can also set the cursor
+position directly (absolute pointer mode). The recording backend injects nothing
+and is used by the benchmarks.
+
+pyautogui and the native backends take a while to import, so servers create
+them deferred: they load on a background thread while the server starts
+listening, and the first input call waits for them.
+"""
+
+import sys
+import threading
+import time
+
+import monitors
+
+BACKEND_NAMES = ('pyautogui', 'native', 'fake')
+
+
+class InputBackend:
+    """Base class for input backends
+
+    Subclasses implement move_rel, mouse_down, mouse_up, scroll, key_down
+    and key_up; clicks, key presses, hotkeys and typing are built on those.
+    Key names follow pyautogui ('enter', 'ctrl', 'a', ...).
+
+    scroll_smooth(dx, dy) scrolls by fractional wheel notches (dy > 0 up,
+    dx > 0 right). Backends with high-resolution or horizontal wheels
+    override it; the default sends whole vertical notches through scroll().
+
+    move_to(x, y) puts the cursor on a virtual-desktop pixel (absolute
+    pointer mode, see monitors.py) in one call, without reading it first.
+    """
+
+    name = 'base'
+    # write() can type any Unicode text, not just what's on the keyboard
+    unicode_write = False
+    # Optional paste(text) replacing the clipboard paste (see text_input.py)
+    paste = None
+
+    def move_rel(self, dx, dy):
+        raise NotImplementedError
+
+    def move_to(self, x, y):
+        raise NotImplementedError
+
+    def mouse_down(self, button='left'):
+        raise NotImplementedError
+
+    def mouse_up(self, button='left'):
+        raise NotImplementedError
+
+    def scroll(self, dy):
+        raise NotImplementedError
+
+    def key_down(self, key):
+        raise NotImplementedError
+
+    def key_up(self, key):
+        raise NotImplementedError
+
+    def scroll_smooth(self, dx, dy):
+        _, notches = self._wheel_units(dx, dy, 1)
+        if notches:
+            self.scroll(notches)
+
+    def _wheel_units(self, dx, dy, per_notch):
+        """Whole wheel units for fractional notches, carrying the remainder"""
+        remainder = self.__dict__.setdefault('_wheel_remainder', [0.0, 0.0])
+        x = dx * per_notch + remainder[0]
+        y = dy * per_notch + remainder[1]
+        ix = int(x)
+        iy = int(y)
+        remainder[0] = x - ix
+        remainder[1] = y - iy
+        return ix, iy
+
+    def click(self, button='left', double=False):
+        for _ in range(2 if double else 1):
+            self.mouse_down(button)
+            self.mouse_up(button)
+
+    def press(self, key):
+        self.key_down(key)
+        self.key_up(key)
+
+    def hotkey(self, *keys):
+        for key in keys:
+            self.key_down(key)
+        for key in reversed(keys):
+            self.key_up(key)
+
+    def write(self, text):
+        for char in text:
+            self.press(char)
+
+    def close(self):
+        pass
+
+
+class PyAutoGUIBackend(InputBackend):
+    """Injection through pyautogui (original behaviour, works everywhere)"""
+
+    name = 'pyautogui'
+
+    def __init__(self):
+        import pyautogui
+        # Configure pyautogui for remote control
+        pyautogui.FAILSAFE = False
+        pyautogui.PAUSE = 0.01
+        self._gui = pyautogui
+        # moveTo reads the cursor position first (for tweening); the platform call doesn't.
+        # It is internal to pyautogui, so move_to falls back to moveTo if it goes away or changes.
+        self._set_position = getattr(getattr(pyautogui, 'platformModule', None), '_moveTo', None)
+
+    def move_rel(self, dx, dy):
+        self._gui.moveRel(dx, dy)
+
+    def move_to(self, x, y):
+        if self._set_position is not None:
+            try:
+                self._set_position(x, y)
+                return
+            except (AttributeError, TypeError) as e:
+                print(f"[!] pyautogui platform move unavailable ({e}), using moveTo")
+                self._set_position = None
+        self._gui.moveTo(x, y)
+
+    def mouse_down(self, button='left'):
+        self._gui.mouseDown(button=button)
+
+    def mouse_up(self, button='left'):
+        self._gui.mouseUp(button=button)
+
+    def scroll(self, dy):
+        self._gui.scroll(dy)
+
+    def scroll_smooth(self, dx, dy):
+        # pyautogui passes raw wheel data on Windows (120 per notch), whole notches elsewhere
+        ix, iy = self._wheel_units(dx, dy, 120 if sys.platform == 'win32' else 1)
+        if iy:
+            self._gui.scroll(iy)
+        if ix:
+            self._gui.hscroll(ix)
+
+    def key_down(self, key):
+        self._gui.keyDown(key)
+
+    def key_up(self, key):
+        self._gui.keyUp(key)
+
+    def click(self, button='left', double=False):
+        if double:
+            self._gui.doubleClick(button=button)
+        else:
+            self._gui.click(button=button)
+
+    def press(self, key):
+        self._gui.press(key)
+
+    def hotkey(self, *keys):
+        self._gui.hotkey(*keys)
+
+    def write(self, text):
+        self._gui.write(text)
+
+
+class RecordingBackend(InputBackend):
+    """Fake backend that records calls instead of injecting them
+
+    Each call is stored as (monotonic time, method, args). An optional
+    per-call delay simulates the cost of a real injection.
+    """
+
+    name = 'fake'
+
+    def __init__(self, delay=0.0, keep=100000):
+        self.delay = delay
+        self.keep = keep
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _record(self, method, *args):
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            self.calls.append((time.monotonic(), method, args))
+            if len(self.calls) > self.keep:
+                del self.calls[:len(self.calls) - self.keep]
+
+    def move_rel(self, dx, dy):
+        self._record('move_rel', dx, dy)
+
+    def move_to(self, x, y):
+        self._record('move_to', x, y)
+
+    def mouse_down(self, button='left'):
+        self._record('mouse_down', button)
+
+    def mouse_up(self, button='left'):
+        self._record('mouse_up', button)
+
+    def scroll(self, dy):
+        self._record('scroll', dy)
+
+    def scroll_smooth(self, dx, dy):
+        self._record('scroll_smooth', dx, dy)
+
+    def key_down(self, key):
+        self._record('key_down', key)
+
+    def key_up(self, key):
+        self._record('key_up', key)
+
+    def paste(self, text):
+        self._record('paste', text)
+
+    def take(self):
+        """Return and clear the recorded calls"""
+        with self._lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+
+# Windows: SendInput
+
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    _INPUT_MOUSE = 0
+    _INPUT_KEYBOARD = 1
+    _MOUSEEVENTF_MOVE = 0x0001
+    _MOUSEEVENTF_WHEEL = 0x0800
+    _MOUSEEVENTF_HWHEEL = 0x1000
+    _WHEEL_DELTA = 120
+    _KEYEVENTF_EXTENDEDKEY = 0x0001
+    _KEYEVENTF_KEYUP = 0x0002
+    _KEYEVENTF_UNICODE = 0x0004
+
+    class _MOUSEINPUT(ctypes.Structure):
+        _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG),
+                    ('mouseData', wintypes.DWORD), ('dwFlags', wintypes.DWORD),
+                    ('time', wintypes.DWORD), ('dwExtraInfo', wintypes.WPARAM)]
+
+    class _KEYBDINPUT(ctypes.Structure):
+        _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD),
+                    ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD),
+                    ('dwExtraInfo', wintypes.WPARAM)]
+
+    class _HARDWAREINPUT(ctypes.Structure):
+        _fields_ = [('uMsg', wintypes.DWORD), ('wParamL', wintypes.WORD),
+                    ('wParamH', wintypes.WORD)]
+
+    class _INPUTUNION(ctypes.Union):
+        _fields_ = [('mi', _MOUSEINPUT), ('ki', _KEYBDINPUT), ('hi', _HARDWAREINPUT)]
+
+    class _INPUT(ctypes.Structure):
+        _fields_ = [('type', wintypes.DWORD), ('u', _INPUTUNION)]
+
+
+# pyautogui key name -> Windows virtual-key code
+_WIN_KEYS = {
+    'backspace': 0x08, 'tab': 0x09, 'enter': 0x0D, 'return': 0x0D,
+    'shift': 0x10, 'ctrl': 0x11, 'alt': 0x12, 'pause': 0x13, 'capslock': 0x14,
+    'escape': 0x1B, 'esc': 0x1B, 'space': 0x20, ' ': 0x20,
+    'pageup': 0x21, 'pgup': 0x21, 'pagedown': 0x22, 'pgdn': 0x22,
+    'end': 0x23, 'home': 0x24, 'left': 0x25, 'up': 0x26, 'right': 0x27, 'down': 0x28,
+    'printscreen': 0x2C, 'insert': 0x2D, 'delete': 0x2E, 'del': 0x2E,
+    'win': 0x5B, 'winleft': 0x5B, 'winright': 0x5C, 'apps': 0x5D,
+    'shiftleft': 0xA0, 'shiftright': 0xA1, 'ctrlleft': 0xA2, 'ctrlright': 0xA3,
+    'altleft': 0xA4, 'altright': 0xA5,
+    'volumemute': 0xAD, 'volumedown': 0xAE, 'volumeup': 0xAF,
+    'nexttrack': 0xB0, 'prevtrack': 0xB1, 'playpause': 0xB3,
+}
+_WIN_KEYS.update({f'f{n}': 0x6F + n for n in range(1, 25)})
+_WIN_EXTENDED = {0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27, 0x28, 0x2D, 0x2E,
+                 0x5B, 0x5C, 0x5D, 0xA3, 0xA5}
+_WIN_MOUSE_FLAGS = {
+    'left': (0x0002, 0x0004),
+    'right': (0x0008, 0x0010),
+    'middle': (0x0020, 0x0040),
+}
+
+
+class Win32Backend(InputBackend):
+    """Direct SendInput injection on Windows"""
+
+    name = 'native'
+    unicode_write = True
+    # Characters per SendInput call when typing text
+    WRITE_CHUNK = 128
+
+    def __init__(self):
+        self._user32 = ctypes.WinDLL('user32', use_last_error=True)
+        self._user32.SendInput.argtypes = (wintypes.UINT, ctypes.POINTER(_INPUT), ctypes.c_int)
+        self._user32.SendInput.restype = wintypes.UINT
+        self._user32.VkKeyScanW.argtypes = (wintypes.WCHAR,)
+        self._user32.VkKeyScanW.restype = ctypes.c_short
+        self._user32.SetCursorPos.argtypes = (ctypes.c_int, ctypes.c_int)
+        self._size = ctypes.sizeof(_INPUT)
+
+    def _send(self, *inputs):
+        array = (_INPUT * len(inputs))(*inputs)
+        self._user32.SendInput(len(inputs), array, self._size)
+
+    def _mouse(self, flags, dx=0, dy=0, data=0):
+        event = _INPUT(type=_INPUT_MOUSE)
+        event.u.mi = _MOUSEINPUT(dx, dy, data & 0xFFFFFFFF, flags, 0, 0)
+        return event
+
+    def _key(self, vk, up=False):
+        flags = _KEYEVENTF_KEYUP if up else 0
+        if vk in _WIN_EXTENDED:
+            flags |= _KEYEVENTF_EXTENDEDKEY
+        event = _INPUT(type=_INPUT_KEYBOARD)
+        event.u.ki = _KEYBDINPUT(vk, 0, flags, 0, 0)
+        return event
+
+    def _vk(self, key):
+        vk = _WIN_KEYS.get(key.lower() if len(key) > 1 else key)
+        if vk is not None:
+            return vk, False
+        if len(key) == 1:
+            scan = self._user32.VkKeyScanW(key)
+            if scan != -1:
+                return scan & 0xFF, bool(scan & 0x100)
+        raise ValueError(f"unknown key '{key}'")
+
+    def move_rel(self, dx, dy):
+        self._send(self._mouse(_MOUSEEVENTF_MOVE, int(round(dx)), int(round(dy))))
+
+    def move_to(self, x, y):
+        # Same (DPI-virtualized) coordinates as EnumDisplayMonitors in monitors.py
+        self._user32.SetCursorPos(int(x), int(y))
+
+    def mouse_down(self, button='left'):
+        self._send(self._mouse(_WIN_MOUSE_FLAGS[button][0]))
+
+    def mouse_up(self, button='left'):
+        self._send(self._mouse(_WIN_MOUSE_FLAGS[button][1]))
+
+    def click(self, button='left', double=False):
+        down, up = _WIN_MOUSE_FLAGS[button]
+        events = [self._mouse(down), self._mouse(up)] * (2 if double else 1)
+        self._send(*events)
+
+    def scroll(self, dy):
+        # Same units as pyautogui.scroll on Windows (raw wheel data)
+        self._send(self._mouse(_MOUSEEVENTF_WHEEL, data=int(round(dy))))
+
+    def scroll_smooth(self, dx, dy):
+        # Wheel data below WHEEL_DELTA is smooth scrolling for apps that support it
+        ix, iy = self._wheel_units(dx, dy, _WHEEL_DELTA)
+        events = []
+        if iy:
+            events.append(self._mouse(_MOUSEEVENTF_WHEEL, data=iy))
+        if ix:
+            events.append(self._mouse(_MOUSEEVENTF_HWHEEL, data=ix))
+        if events:
+            self._send(*events)
+
+    def key_down(self, key):
+        vk, shift = self._vk(key)
+        events = [self._key(0x10)] if shift else []
+        self._send(*events, self._key(vk))
+
+    def key_up(self, key):
+        vk, shift = self._vk(key)
+        events = [self._key(0x10, up=True)] if shift else []
+        self._send(self._key(vk, up=True), *events)
+
+    def press(self, key):
+        vk, shift = self._vk(key)
+        events = [self._key(vk), self._key(vk, up=True)]
+        if shift:
+            events = [self._key(0x10)] + events + [self._key(0x10, up=True)]
+        self._send(*events)
+
+    def _unicode(self, unit, up=False):
+        event = _INPUT(type=_INPUT_KEYBOARD)
+        flags = _KEYEVENTF_UNICODE | (_KEYEVENTF_KEYUP if up else 0)
+        event.u.ki = _KEYBDINPUT(0, unit, flags, 0, 0)
+        return event
+
+    def write(self, text):
+        """Type text as batched KEYEVENTF_UNICODE events, independent of the keyboard layout"""
+        text = text.replace('\r\n', '\n')
+        for start in range(0, len(text), self.WRITE_CHUNK):
+            events = []
+            for char in text[start:start + self.WRITE_CHUNK]:
+                if char in '\n\r\t':
+                    # Apps expect real Enter/Tab key presses for these
+                    vk = 0x09 if char == '\t' else 0x0D
+                    events += [self._key(vk), self._key(vk, up=True)]
+                    continue
+                # UTF-16 code units; characters outside the BMP become surrogate pairs
+                encoded = char.encode('utf-16-le')
+                for i in range(0, len(encoded), 2):
+                    unit = encoded[i] | (encoded[i + 1] << 8)
+                    events += [self._unicode(unit), self._unicode(unit, up=True)]
+            self._send(*events)
+
+
+# Linux: uinput (python-evdev)
+
+# pyautogui key name -> evdev KEY_* name
+_UINPUT_KEYS = {
+    'backspace': 'BACKSPACE', 'tab': 'TAB', 'enter': 'ENTER', 'return': 'ENTER',
+    'shift': 'LEFTSHIFT', 'shiftleft': 'LEFTSHIFT', 'shiftright': 'RIGHTSHIFT',
+    'ctrl': 'LEFTCTRL', 'ctrlleft': 'LEFTCTRL', 'ctrlright': 'RIGHTCTRL',
+    'alt': 'LEFTALT', 'altleft': 'LEFTALT', 'altright': 'RIGHTALT',
+    'win': 'LEFTMETA', 'winleft': 'LEFTMETA', 'winright': 'RIGHTMETA',
+    'capslock': 'CAPSLOCK', 'escape': 'ESC', 'esc': 'ESC', 'space': 'SPACE',
+    'pageup': 'PAGEUP', 'pgup': 'PAGEUP', 'pagedown': 'PAGEDOWN', 'pgdn': 'PAGEDOWN',
+    'end': 'END', 'home': 'HOME', 'left': 'LEFT', 'up': 'UP', 'right': 'RIGHT',
+    'down': 'DOWN', 'insert': 'INSERT', 'delete': 'DELETE', 'del': 'DELETE',
+    'printscreen': 'SYSRQ', 'pause': 'PAUSE', 'apps': 'COMPOSE',
+    'volumemute': 'MUTE', 'volumedown': 'VOLUMEDOWN', 'volumeup': 'VOLUMEUP',
+    'nexttrack': 'NEXTSONG', 'prevtrack': 'PREVIOUSSONG', 'playpause': 'PLAYPAUSE',
+}
+_UINPUT_KEYS.update({f'f{n}': f'F{n}' for n in range(1, 25)})
+# Characters on a US layout: char -> (KEY_* name, needs shift)
+_UINPUT_CHARS = {' ': ('SPACE', False), '\n': ('ENTER', False), '\t': ('TAB', False)}
+for _plain, _shifted, _code in zip("`1234567890-=[]\\;',./", '~!@#$%^&*()_+{}|:"<>?',
+                                   ['GRAVE', '1', '2', '3', '4', '5', '6', '7', '8', '9', '0',
+                                    'MINUS', 'EQUAL', 'LEFTBRACE', 'RIGHTBRACE', 'BACKSLASH',
+                                    'SEMICOLON', 'APOSTROPHE', 'COMMA', 'DOT', 'SLASH']):
+    _UINPUT_CHARS[_plain] = (_code, False)
+    _UINPUT_CHARS[_shifted] = (_code, True)
+for _letter in 'abcdefghijklmnopqrstuvwxyz':
+    _UINPUT_CHARS[_letter] = (_letter.upper(), False)
+    _UINPUT_CHARS[_letter.upper()] = (_letter.upper(), True)
+
+
+class UInputBackend(InputBackend):
+    """Relative pointer and key events through a virtual uinput device on Linux
+
+    Needs python-evdev (pip install evdev) and write access to /dev/uinput.
+    """
+
+    name = 'native'
+
+    def __init__(self):
+        try:
+            from evdev import UInput, ecodes
+        except ImportError:
+            raise RuntimeError("the native backend on Linux needs python-evdev (pip install evdev)")
+        self._ecodes = ecodes
+        self._keys = {name: getattr(ecodes, 'KEY_' + code) for name, code in _UINPUT_KEYS.items()}
+        self._chars = {char: (getattr(ecodes, 'KEY_' + code), shift)
+                       for char, (code, shift) in _UINPUT_CHARS.items()}
+        self._buttons = {'left': ecodes.BTN_LEFT, 'right': ecodes.BTN_RIGHT,
+                         'middle': ecodes.BTN_MIDDLE}
+        key_codes = set(self._keys.values()) | {code for code, _ in self._chars.values()}
+        key_codes |= set(self._buttons.values())
+        # High-resolution wheel axes (120 per notch) need Linux 5.0+ and a recent evdev
+        self._hi_res = hasattr(ecodes, 'REL_WHEEL_HI_RES')
+        rel_axes = [ecodes.REL_X, ecodes.REL_Y, ecodes.REL_WHEEL, ecodes.REL_HWHEEL]
+        if self._hi_res:
+            rel_axes += [ecodes.REL_WHEEL_HI_RES, ecodes.REL_HWHEEL_HI_RES]
+        self._notch_remainder = [0, 0]
+        self._device = UInput({
+            ecodes.EV_KEY: sorted(key_codes),
+            ecodes.EV_REL: rel_axes,
+        }, name='phone-remote-control')
+        # Absolute pointer (like a VM tablet), created on the first move_to
+        self._tablet = None
+        self._tablet_desktop = None
+
+    def _code(self, key):
+        code = self._keys.get(key.lower() if len(key) > 1 else key)
+        if code is not None:
+            return code, False
+        if key in self._chars:
+            return self._chars[key]
+        raise ValueError(f"unknown key '{key}'")
+
+    def _emit(self, *events):
+        for event_type, code, value in events:
+            self._device.write(event_type, code, value)
+        self._device.syn()
+
+    def move_rel(self, dx, dy):
+        ecodes = self._ecodes
+        self._emit((ecodes.EV_REL, ecodes.REL_X, int(round(dx))),
+                   (ecodes.EV_REL, ecodes.REL_Y, int(round(dy))))
+
+    def move_to(self, x, y):
+        # The compositor stretches the tablet's axes over the whole desktop
+        # Positions are only queued once the layout is ready (commands.py)
+        desktop = monitors.layout.desktop
+        if desktop != self._tablet_desktop:
+            self._open_tablet(desktop)
+        ecodes = self._ecodes
+        self._tablet.write(ecodes.EV_ABS, ecodes.ABS_X, int(x) - desktop.x)
+        self._tablet.write(ecodes.EV_ABS, ecodes.ABS_Y, int(y) - desktop.y)
+        self._tablet.syn()
+
+    def _open_tablet(self, desktop):
+        from evdev import UInput, AbsInfo
+        ecodes = self._ecodes
+        if self._tablet is not None:
+            self._tablet.close()
+        axes = [(ecodes.ABS_X, AbsInfo(0, 0, desktop.width - 1, 0, 0, 0)),
+                (ecodes.ABS_Y, AbsInfo(0, 0, desktop.height - 1, 0, 0, 0))]
+        # A button makes udev class it as a pointer rather than a joystick
+        self._tablet = UInput({ecodes.EV_KEY: [ecodes.BTN_LEFT], ecodes.EV_ABS: axes},
+                              name='phone-remote-control-absolute')
+        self._tablet_desktop = desktop
+
+    def mouse_down(self, button='left'):
+        self._emit((self._ecodes.EV_KEY, self._buttons[button], 1))
+
+    def mouse_up(self, button='left'):
+        self._emit((self._ecodes.EV_KEY, self._buttons[button], 0))
+
+    def scroll(self, dy):
+        self._emit((self._ecodes.EV_REL, self._ecodes.REL_WHEEL, int(round(dy))))
+
+    def scroll_smooth(self, dx, dy):
+        ecodes = self._ecodes
+        if not self._hi_res:
+            ix, iy = self._wheel_units(dx, dy, 1)
+            events = []
+            if iy:
+                events.append((ecodes.EV_REL, ecodes.REL_WHEEL, iy))
+            if ix:
+                events.append((ecodes.EV_REL, ecodes.REL_HWHEEL, ix))
+            if events:
+                self._emit(*events)
+            return
+        # Hi-res axes for apps that read them, plus a whole notch on the
+        # classic axes each time 120 units have built up, like real wheels do
+        ix, iy = self._wheel_units(dx, dy, 120)
+        events = []
+        for units, index, hi_res, classic in ((iy, 1, ecodes.REL_WHEEL_HI_RES, ecodes.REL_WHEEL),
+                                              (ix, 0, ecodes.REL_HWHEEL_HI_RES, ecodes.REL_HWHEEL)):
+            if not units:
+                continue
+            events.append((ecodes.EV_REL, hi_res, units))
+            total = self._notch_remainder[index] + units
+            notches = int(total / 120)
+            self._notch_remainder[index] = total - notches * 120
+            if notches:
+                events.append((ecodes.EV_REL, classic, notches))
+        if events:
+            self._emit(*events)
+
+    def key_down(self, key):
+        code, shift = self._code(key)
+        if shift:
+            self._emit((self._ecodes.EV_KEY, self._ecodes.KEY_LEFTSHIFT, 1))
+        self._emit((self._ecodes.EV_KEY, code, 1))
+
+    def key_up(self, key):
+        code, shift = self._code(key)
+        self._emit((self._ecodes.EV_KEY, code, 0))
+        if shift:
+            self._emit((self._ecodes.EV_KEY, self._ecodes.KEY_LEFTSHIFT, 0))
+
+    def close(self):
+        self._device.close()
+        if self._tablet is not None:
+            self._tablet.close()
+
+
+class DeferredBackend(InputBackend):
+    """Loads another backend on a background thread; input calls wait for it"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._backend = None
+        self._error = None
+        self._ready = threading.Event()
+        threading.Thread(target=self._load, name=f'load-{name}', daemon=True).start()
+
+    def _load(self):
+        start = time.monotonic()
+        try:
+            self._backend = self._factory()
+        except Exception as e:
+            self._error = e
+            print(f"[ERROR] Input backend '{self.name}' failed to load: {e}")
+        else:
+            print(f"[IN] Input backend '{self.name}' ready ({(time.monotonic() - start) * 1000:.0f} ms)")
+        finally:
+            self._ready.set()
+
+    def wait(self, timeout=None):
+        """The loaded backend; raises RuntimeError if it failed to load or timed out"""
+        if not self._ready.wait(timeout):
+            raise RuntimeError(f"input backend '{self.name}' is still loading")
+        if self._error is not None:
+            raise RuntimeError(f"input backend '{self.name}' unavailable: {self._error}")
+        return self._backend
+
+    def _get(self):
+        backend = self._backend
+        return backend if backend is not None else self.wait()
+
+    @property
+    def unicode_write(self):
+        return self._get().unicode_write
+
+    @property
+    def paste(self):
+        return self._get().paste
+
+    def move_rel(self, dx, dy):
+        self._get().move_rel(dx, dy)
+
+    def move_to(self, x, y):
+        self._get().move_to(x, y)
+
+    def mouse_down(self, button='left'):
+        self._get().mouse_down(button)
+
+    def mouse_up(self, button='left'):
+        self._get().mouse_up(button)
+
+    def scroll(self, dy):
+        self._get().scroll(dy)
+
+    def scroll_smooth(self, dx, dy):
+        self._get().scroll_smooth(dx, dy)
+
+    def key_down(self, key):
+        self._get().key_down(key)
+
+    def key_up(self, key):
+        self._get().key_up(key)
+
+    def click(self, button='left', double=False):
+        self._get().click(button, double)
+
+    def press(self, key):
+        self._get().press(key)
+
+    def hotkey(self, *keys):
+        self._get().hotkey(*keys)
+
+    def write(self, text):
+        self._get().write(text)
+
+    def close(self):
+        if self._backend is not None:
+            self._backend.close()
+
+
+def create_backend(name, deferred=False):
+    """Create an input backend by name ('pyautogui', 'native' or 'fake')
+
+    With deferred=True, pyautogui and native backends load in the background
+    (see DeferredBackend); errors are then reported when they finish loading.
+    """
+    if deferred and name != 'fake':
+        return DeferredBackend(name, lambda: create_backend(name))
+    if name == 'pyautogui':
+        return PyAutoGUIBackend()
+    if name == 'fake':
+        return RecordingBackend()
+    if name == 'native':
+        if sys.platform == 'win32':
+            return Win32Backend()
+        if sys.platform.startswith('linux'):
+            return UInputBackend()
+        raise RuntimeError(f"no native input backend for {sys.platform}, use --backend pyautogui")
+    raise ValueError(f"unknown input backend '{name}'")
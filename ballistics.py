@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Pointer Ballistics
+Velocity-dependent gain for relative pointer motion, applied by the injector
+to each lane's coalesced moves just before they are injected. Slow moves get
+less than 1:1 gain for precision, fast flings more, so crossing the screen
+needs fewer and shorter swipes.
+
+    gain(v) = min_gain + (max_gain - min_gain) * smoothstep(v_low .. v_high)
+
+v is the pointer speed in pixels per second (after the phone's sensitivity
+multiplier). With 'smoothing' on, the speed passes through a One-Euro filter
+first, so the gain doesn't jitter with noisy touch samples. Only the speed is
+filtered, not the motion: a low-passed relative delta would lose whatever
+lag it still had when the finger stops.
+
+Fractional pixels are carried to the next move instead of being rounded
+away, so slow drags and low gains still add up to the full distance.
+"""
+
+import math
+
+# Name -> (min_gain, max_gain, v_low, v_high, smoothing)
+PROFILES = {
+    'linear': (1.0, 1.0, 0.0, 1.0, False),
+    'precise': (0.4, 1.5, 100.0, 1200.0, True),
+    'balanced': (0.6, 2.0, 150.0, 1500.0, True),
+    'fast': (0.7, 3.5, 200.0, 2500.0, True),
+}
+DEFAULT_PROFILE = 'linear'
+
+# Moves further apart than this start a new stroke (seconds)
+IDLE_RESET = 0.1
+# Shortest interval used for speed estimates (seconds)
+MIN_DT = 0.001
+
+
+class OneEuroFilter:
+    """One-Euro low-pass filter (Casiez et al.) for an irregularly sampled signal"""
+
+    def __init__(self, min_cutoff=3.0, beta=0.002, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._slope = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, value, dt):
+        if self._value is None:
+            self._value = value
+            return value
+        slope = (value - self._value) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        self._slope = a_d * slope + (1 - a_d) * self._slope
+        cutoff = self.min_cutoff + self.beta * abs(self._slope)
+        a = self._alpha(cutoff, dt)
+        self._value = a * value + (1 - a) * self._value
+        return self._value
+
+
+class PointerBallistics:
+    """Gain curve and sub-pixel remainder for one client's pointer"""
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        self.profile = profile
+        self.min_gain, self.max_gain, self.v_low, self.v_high, smoothing = PROFILES[profile]
+        self._filter = OneEuroFilter() if smoothing else None
+        self._last = None
+        self._rem_x = 0.0
+        self._rem_y = 0.0
+
+    def gain(self, speed):
+        """Gain for a pointer speed in pixels per second"""
+        if self.max_gain == self.min_gain:
+            return self.min_gain
+        t = (speed - self.v_low) / (self.v_high - self.v_low)
+        t = min(1.0, max(0.0, t))
+        return self.min_gain + (self.max_gain - self.min_gain) * t * t * (3 - 2 * t)
+
+    def apply(self, dx, dy, now):
+        """Scale a coalesced move applied at time now; returns whole pixels (ix, iy)"""
+        if self.max_gain != 1.0 or self.min_gain != 1.0:
+            if self._last is None or now - self._last > IDLE_RESET:
+                # New stroke: no meaningful speed yet, assume the slow end
+                dt = IDLE_RESET
+                if self._filter is not None:
+                    self._filter.reset()
+            else:
+                dt = max(MIN_DT, now - self._last)
+            speed = math.hypot(dx, dy) / dt
+            if self._filter is not None:
+                speed = self._filter(speed, dt)
+            gain = self.gain(speed)
+            dx *= gain
+            dy *= gain
+        self._last = now
+        x = dx + self._rem_x
+        y = dy + self._rem_y
+        ix = int(round(x))
+        iy = int(round(y))
+        self._rem_x = x - ix
+        self._rem_y = y - iy
+        return ix, iy
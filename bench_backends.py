@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Input Backend Benchmark
+Measures the per-call cost of relative and absolute mouse moves and key
+presses for each input backend. The real backends move the cursor by one
+pixel back and forth and tap shift, so run it on a desktop session you don't
+mind nudging.
+
+    python bench_backends.py --backends pyautogui native --count 500
+"""
+
+import argparse
+import statistics
+import time
+
+from backends import create_backend, BACKEND_NAMES
+import monitors
+
+
+def measure(func, count):
+    """Call func(i) count times and return per-call durations in microseconds"""
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {label:<10} mean {statistics.mean(samples):9.1f} us   "
+          f"p50 {statistics.median(samples):9.1f} us   p99 {p99:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark input backends")
+    parser.add_argument('--backends', nargs='+', choices=BACKEND_NAMES,
+                        default=['pyautogui', 'native', 'fake'])
+    parser.add_argument('--count', type=int, default=500, help="calls per measurement")
+    args = parser.parse_args()
+
+    for name in args.backends:
+        try:
+            backend = create_backend(name)
+        except Exception as e:
+            print(f"[{name}] unavailable: {e}")
+            continue
+        print(f"[{name}]")
+        try:
+            report('move_rel', measure(lambda i: backend.move_rel(1 if i % 2 else -1, 0), args.count))
+            x, y = monitors.layout.ensure().to_pixels(0.5, 0.5)
+            report('move_to', measure(lambda i: backend.move_to(x + i % 2, y), args.count))
+            report('press', measure(lambda i: backend.press('shift'), args.count))
+        finally:
+            backend.close()
+
+
+if __name__ == "__main__":
+    main()
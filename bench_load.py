@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Load and Latency Benchmark
+Starts server.py in-process with the recording (fake) input backend, drives it
+with N synthetic phone clients replaying touch traces, and reports throughput,
+dispatch latency and event-loop lag.
+
+Dispatch latency is measured with probe key presses interleaved into each
+client's stream: the time from the client sending a probe to the fake backend
+executing it, so probes wait behind whatever traffic is queued ahead of them.
+
+    python bench_load.py --clients 4 --duration 10
+    python bench_load.py --save-traces traces/      # write the built-in traces
+    python bench_load.py --trace traces/drag.jsonl  # replay a recorded trace
+
+A trace is a JSON-lines file of {"t": seconds from start, "cmd": {...}} where
+cmd is any command the phone would send.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+
+import websockets
+
+import injector
+import metrics
+import protocol
+import server
+
+PROBE_PREFIX = 'probe-'
+
+
+# Synthetic touch traces
+
+def drag_trace(rate=120, seconds=1.5):
+    """Double-tap-hold drag: mousedown, smooth motion, mouseup"""
+    events = [(0.0, {'type': 'mousedown', 'button': 'left'})]
+    steps = int(rate * seconds)
+    for i in range(1, steps + 1):
+        angle = 2 * math.pi * i / steps
+        events.append((i / rate, {'type': 'mouse_move',
+                                  'dx': round(6 * math.cos(angle), 2),
+                                  'dy': round(4 * math.sin(2 * angle), 2)}))
+    events.append((seconds + 0.02, {'type': 'mouseup', 'button': 'left'}))
+    return events
+
+
+def fling_trace(rate=120, seconds=0.35):
+    """Fast swipe across the pad: accelerating then decelerating motion"""
+    events = []
+    steps = int(rate * seconds)
+    for i in range(1, steps + 1):
+        speed = math.sin(math.pi * i / steps) * 60
+        events.append((i / rate, {'type': 'mouse_move', 'dx': round(speed, 2), 'dy': round(speed * 0.3, 2)}))
+    events.append((seconds + 0.15, {'type': 'click', 'button': 'left'}))
+    return events
+
+
+def typing_trace(text="the quick brown fox jumps over the lazy dog", cps=9.0):
+    """Typing burst from the phone keyboard, one 'type' frame per character"""
+    events = []
+    t = 0.0
+    rng = random.Random(7)
+    for char in text:
+        t += rng.uniform(0.5, 1.5) / cps
+        events.append((t, {'type': 'type', 'text': char}))
+    events.append((t + 0.2, {'type': 'key', 'key': 'backspace'}))
+    events.append((t + 0.4, {'type': 'key', 'key': 'enter'}))
+    return events
+
+
+def scroll_trace(rate=30, seconds=1.0):
+    """Swipes on the scroll area"""
+    steps = int(rate * seconds)
+    return [(i / rate, {'type': 'scroll', 'dy': 3 if i < steps // 2 else -3}) for i in range(steps)]
+
+
+BUILTIN_TRACES = {
+    'drag': drag_trace,
+    'fling': fling_trace,
+    'typing': typing_trace,
+    'scroll': scroll_trace,
+}
+
+
+def batch_trace(events, fps):
+    """Group a trace the way latest.html does: motion merged per animation frame
+
+    Consecutive moves and scroll steps within one frame merge and go out at
+    the end of the frame; any other command flushes immediately.
+    """
+    out = []
+    pending = []
+    frame_end = None
+
+    def flush(t):
+        if pending:
+            cmd = pending[0] if len(pending) == 1 else {'type': 'batch', 'events': list(pending)}
+            out.append((t, cmd))
+            pending.clear()
+
+    for t, cmd in events:
+        if frame_end is not None and t >= frame_end:
+            flush(frame_end)
+            frame_end = None
+        last = pending[-1] if pending else None
+        if last is not None and last['type'] == cmd['type'] == 'mouse_move':
+            last['dx'] += cmd['dx']
+            last['dy'] += cmd['dy']
+        elif last is not None and last['type'] == cmd['type'] == 'scroll':
+            last['dy'] += cmd['dy']
+        else:
+            pending.append(dict(cmd))
+        if cmd['type'] in ('mouse_move', 'scroll'):
+            if frame_end is None:
+                frame_end = (int(t * fps) + 1) / fps
+        else:
+            flush(t)
+            frame_end = None
+    flush(frame_end if frame_end is not None else events[-1][0])
+    return out
+
+
+def load_trace(path):
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                events.append((float(record['t']), record['cmd']))
+    return events
+
+
+def save_traces(directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, make in BUILTIN_TRACES.items():
+        path = os.path.join(directory, f'{name}.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for t, cmd in make():
+                f.write(json.dumps({'t': round(t, 4), 'cmd': cmd}) + '\n')
+        print(f"[+] Wrote {path}")
+
+
+# Synthetic clients
+
+def percentile(samples, fraction):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class ClientRun:
+    """One synthetic phone replaying traces over a WebSocket"""
+
+    def __init__(self, index, url, traces, duration, probe_hz, binary):
+        self.index = index
+        self.url = url
+        self.traces = traces
+        self.duration = duration
+        self.probe_hz = probe_hz
+        self.binary = binary
+        self.sent = 0
+        self.probes = {}
+
+    def encode(self, cmd):
+        if self.binary:
+            frame = protocol.encode(cmd)
+            if frame is not None:
+                return frame
+        return json.dumps(cmd)
+
+    async def run(self):
+        subprotocols = [protocol.SUBPROTOCOL_BINARY] if self.binary else None
+        async with websockets.connect(self.url, subprotocols=subprotocols) as ws:
+            start = time.monotonic()
+            probes = asyncio.ensure_future(self.send_probes(ws))
+            trace_index = self.index
+            while time.monotonic() - start < self.duration:
+                trace = self.traces[trace_index % len(self.traces)]
+                trace_index += 1
+                base = time.monotonic()
+                for t, cmd in trace:
+                    if time.monotonic() - start >= self.duration:
+                        break
+                    delay = base + t - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await ws.send(self.encode(cmd))
+                    self.sent += 1
+                await asyncio.sleep(0.1)
+            probes.cancel()
+
+    async def send_probes(self, ws):
+        if self.probe_hz <= 0:
+            return
+        count = 0
+        while True:
+            await asyncio.sleep(1.0 / self.probe_hz)
+            key = f'{PROBE_PREFIX}{self.index}-{count}'
+            count += 1
+            self.probes[key] = time.monotonic()
+            await ws.send(json.dumps({'type': 'key', 'key': key}))
+            self.sent += 1
+
+
+def run_clients_in_thread(clients):
+    """Run the synthetic clients on their own event loop so they don't share the server's"""
+    errors = []
+
+    def target():
+        async def run_all():
+            results = await asyncio.gather(*(c.run() for c in clients), return_exceptions=True)
+            errors.extend(r for r in results if isinstance(r, Exception))
+        asyncio.run(run_all())
+
+    thread = threading.Thread(target=target, name='bench-clients')
+    thread.start()
+    return thread, errors
+
+
+async def monitor_loop_lag(samples, interval=0.005):
+    """Record how late the server's event loop wakes from short sleeps"""
+    while True:
+        start = time.monotonic()
+        await asyncio.sleep(interval)
+        samples.append(time.monotonic() - start - interval)
+
+
+# Benchmark
+
+async def bench(args):
+    server.setup_input('fake', args.move_hz, args.max_rate)
+    server.backend.delay = args.inject_delay / 1000.0
+    runner, ws_server = await server.start_servers('127.0.0.1', 0, 0)
+    ws_port = ws_server.sockets[0].getsockname()[1]
+    url = f'ws://127.0.0.1:{ws_port}'
+
+    if args.trace:
+        traces = [load_trace(path) for path in args.trace]
+    else:
+        traces = [make() for make in BUILTIN_TRACES.values()]
+    if args.batch:
+        traces = [batch_trace(trace, args.batch) for trace in traces]
+
+    lag_samples = []
+    lag_task = asyncio.ensure_future(monitor_loop_lag(lag_samples))
+    clients = [ClientRun(i, url, traces, args.duration, args.probe_hz, args.binary)
+               for i in range(args.clients)]
+    received_before = metrics.MESSAGES.value()
+    waits_before = injector.BACKPRESSURE_WAITS.value()
+    dropped_before = sum(injector.FRAMES_DROPPED._values.values())
+
+    started = time.monotonic()
+    thread, errors = run_clients_in_thread(clients)
+    while thread.is_alive():
+        await asyncio.sleep(0.05)
+    # Let the injector drain what is still queued
+    await asyncio.sleep(0.5)
+    elapsed = time.monotonic() - started
+
+    lag_task.cancel()
+    server.injector.stop()
+    ws_server.close()
+    await runner.cleanup()
+
+    calls = server.backend.take()
+    executed = {args_[0]: t for t, method, args_ in calls
+                if method == 'key_down' and str(args_[0]).startswith(PROBE_PREFIX)}
+    latencies = []
+    lost = 0
+    for client in clients:
+        for key, sent_at in client.probes.items():
+            if key in executed:
+                latencies.append(executed[key] - sent_at)
+            else:
+                lost += 1
+    sent = sum(c.sent for c in clients)
+    received = metrics.MESSAGES.value() - received_before
+    moves = sum(1 for _, method, _ in calls if method == 'move_rel')
+    waits = injector.BACKPRESSURE_WAITS.value() - waits_before
+    dropped = sum(injector.FRAMES_DROPPED._values.values()) - dropped_before
+
+    print("\n" + "=" * 50)
+    print("LOAD BENCHMARK")
+    print("=" * 50)
+    print(f"Clients:            {args.clients} ({'binary' if args.binary else 'JSON'} frames)")
+    print(f"Duration:           {elapsed:.1f} s")
+    print(f"Frames sent:        {sent} ({sent / elapsed:.0f}/s)")
+    print(f"Frames received:    {received} ({received / elapsed:.0f}/s)")
+    print(f"Backend calls:      {len(calls)} ({len(calls) / elapsed:.0f}/s, {moves} moves)")
+    ms = 1000.0
+    print(f"Shed / backpressure: {dropped} scroll steps dropped, {waits} read pauses")
+    print(f"Dispatch latency:   p50 {percentile(latencies, 0.5) * ms:.2f} ms   "
+          f"p99 {percentile(latencies, 0.99) * ms:.2f} ms   "
+          f"max {max(latencies, default=float('nan')) * ms:.2f} ms   "
+          f"({len(latencies)} probes, {lost} lost)")
+    print(f"Event-loop lag:     p50 {percentile(lag_samples, 0.5) * ms:.2f} ms   "
+          f"p99 {percentile(lag_samples, 0.99) * ms:.2f} ms   "
+          f"max {max(lag_samples, default=float('nan')) * ms:.2f} ms")
+    if errors:
+        print(f"Client errors:      {len(errors)} (first: {errors[0]!r})")
+    print("=" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for server.py")
+    parser.add_argument('--clients', type=int, default=4, help="number of synthetic phones")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of traffic per client")
+    parser.add_argument('--trace', nargs='+', help="JSON-lines trace files to replay instead of the built-ins")
+    parser.add_argument('--save-traces', metavar='DIR', help="write the built-in traces to DIR and exit")
+    parser.add_argument('--binary', action='store_true', help="send binary frames where possible")
+    parser.add_argument('--batch', type=float, metavar='FPS', default=0,
+                        help="batch motion per animation frame at FPS, like latest.html")
+    parser.add_argument('--probe-hz', type=float, default=20.0, help="latency probes per second per client")
+    parser.add_argument('--inject-delay', type=float, default=0.0,
+                        help="simulated cost of each backend call in ms")
+    parser.add_argument('--move-hz', type=float, default=server.DEFAULT_MOVE_HZ)
+    parser.add_argument('--max-rate', type=float, default=server.DEFAULT_MAX_RATE,
+                        help="per-client message rate limit (0 = unlimited)")
+    args = parser.parse_args()
+
+    if args.save_traces:
+        save_traces(args.save_traces)
+        return
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Launches a server script repeatedly and measures how long it takes from
+process start until the HTTP port accepts connections and until it serves
+its first page. Run it before and after a change, e.g. against a checkout
+of the previous version with --root:
+
+    python bench_startup.py --runs 10
+    python bench_startup.py --script working_server.py
+    python bench_startup.py --root ../old-checkout --args "--backend fake"
+
+Port 8080 must be free, or the times would be measured against whatever
+already listens there; the benchmark refuses to start if it isn't. The
+server is stopped after each run.
+"""
+
+import argparse
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+HTTP_PORT = 8080
+
+
+def port_in_use(port):
+    """True if something already accepts connections on port"""
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+            return True
+    except OSError:
+        return False
+
+
+def wait_for_port(port, deadline, process):
+    """Seconds until port accepts a connection, or None if the process died first"""
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return None
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.05):
+                return time.monotonic()
+        except OSError:
+            time.sleep(0.002)
+    return None
+
+
+def run_once(root, script, args, timeout):
+    """(seconds to listening, seconds to first page) for one launch"""
+    if port_in_use(HTTP_PORT):
+        raise RuntimeError(f"port {HTTP_PORT} is already in use; stop the server running there first")
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', PYTHONUNBUFFERED='1')
+    start = time.monotonic()
+    process = subprocess.Popen([sys.executable, script] + args, cwd=root, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        listening = wait_for_port(HTTP_PORT, start + timeout, process)
+        if listening is None:
+            raise RuntimeError(f"{script} did not start listening on port {HTTP_PORT}")
+        with urllib.request.urlopen(f'http://127.0.0.1:{HTTP_PORT}/', timeout=timeout) as response:
+            response.read()
+        served = time.monotonic()
+        return listening - start, served - start
+    finally:
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server cold-start time")
+    parser.add_argument('--script', default='server.py', help="server script to launch")
+    parser.add_argument('--args', default='', help="extra arguments for the server")
+    parser.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="directory containing the server (e.g. an older checkout)")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    listen_times = []
+    page_times = []
+    for _ in range(args.runs):
+        try:
+            listening, served = run_once(args.root, args.script, shlex.split(args.args), args.timeout)
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+        listen_times.append(listening)
+        page_times.append(served)
+        # Let the port close before the next launch
+        time.sleep(0.3)
+
+    ms = 1000.0
+    print("\n" + "=" * 50)
+    print("STARTUP BENCHMARK")
+    print("=" * 50)
+    print(f"Server:        {args.script} {args.args} ({args.root})")
+    print(f"Runs:          {args.runs}")
+    print(f"Listening:     median {statistics.median(listen_times) * ms:7.1f} ms   "
+          f"max {max(listen_times) * ms:7.1f} ms")
+    print(f"First page:    median {statistics.median(page_times) * ms:7.1f} ms   "
+          f"max {max(page_times) * ms:7.1f} ms")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
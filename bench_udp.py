@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+UDP Motion Benchmark
+Streams the same pointer motion to an in-process server.py (fake input
+backend) over the WebSocket and over the UDP motion channel, and compares
+motion latency: the time from sending a delta until the backend has applied
+all motion up to and including it.
+
+Loopback doesn't lose packets, so loss is emulated on the client side:
+
+    WebSocket   a "lost" frame stalls it and everything after it for --rto
+                (TCP retransmission), then they are delivered in a burst
+    UDP         a "lost" datagram is simply not sent; the next one carries
+                its motion in the absolute totals
+
+For real loss, run with --loss 0 under netem instead, e.g.
+    sudo tc qdisc add dev lo root netem loss 2%
+
+    python bench_udp.py --loss 0.02 --duration 10
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import random
+import socket
+import time
+
+import websockets
+
+import protocol
+import server
+import udp_motion
+from bench_load import percentile, run_clients_in_thread
+
+
+class MotionRun:
+    """One synthetic phone sending a steady horizontal drag"""
+
+    def __init__(self, url, transport, duration, rate, loss, rto, seed=1):
+        self.url = url
+        self.transport = transport
+        self.duration = duration
+        self.rate = rate
+        self.loss = loss
+        self.rto = rto
+        self.rng = random.Random(seed)
+        # (send time, total x after this delta)
+        self.sent = []
+
+    async def run(self):
+        async with websockets.connect(self.url, subprotocols=[protocol.SUBPROTOCOL_BINARY]) as ws:
+            if self.transport == 'udp':
+                await self.run_udp(ws)
+            else:
+                await self.run_ws(ws)
+
+    async def ticks(self):
+        """Yield (index, scheduled time) at the motion rate"""
+        start = time.monotonic()
+        count = int(self.duration * self.rate)
+        for i in range(1, count + 1):
+            delay = start + i / self.rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield i
+
+    async def run_ws(self, ws):
+        frame = protocol.encode({'type': 'mouse_move', 'dx': 1, 'dy': 0})
+        blocked_until = 0.0
+        held = 0
+        async for total in self.ticks():
+            now = time.monotonic()
+            self.sent.append((now, total))
+            if self.rng.random() < self.loss:
+                blocked_until = max(blocked_until, now + self.rto)
+            if now < blocked_until:
+                held += 1
+                continue
+            for _ in range(held + 1):
+                await ws.send(frame)
+            held = 0
+        if held:
+            await asyncio.sleep(max(0.0, blocked_until - time.monotonic()))
+            for _ in range(held):
+                await ws.send(frame)
+        await asyncio.sleep(0.2)
+
+    async def run_udp(self, ws):
+        await ws.send(json.dumps({'type': 'udp_hello'}))
+        while True:
+            reply = json.loads(await ws.recv())
+            if reply.get('type') == 'udp':
+                break
+        token = bytes.fromhex(reply['token'])
+        host = self.url.split('//')[1].split(':')[0]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            seq = 0
+            async for total in self.ticks():
+                self.sent.append((time.monotonic(), total))
+                seq += 1
+                if self.rng.random() < self.loss:
+                    continue
+                sock.sendto(udp_motion.pack_datagram(token, seq, total, 0, 0), (host, reply['port']))
+            # Final datagram so a trailing loss doesn't leave motion behind
+            sock.sendto(udp_motion.pack_datagram(token, seq + 1, total, 0, 0), (host, reply['port']))
+        finally:
+            sock.close()
+        await asyncio.sleep(0.2)
+
+
+def motion_latencies(sent, calls):
+    """Per-delta latency until the applied total x reaches the sent total"""
+    times = []
+    totals = []
+    applied = 0
+    for t, method, args in calls:
+        if method == 'move_rel':
+            applied += args[0]
+            times.append(t)
+            totals.append(applied)
+    latencies = []
+    for sent_at, total in sent:
+        index = bisect.bisect_left(totals, total)
+        if index < len(totals):
+            latencies.append(times[index] - sent_at)
+    return latencies, len(sent) - len(latencies)
+
+
+async def bench(args):
+    server.setup_input('fake', args.move_hz, udp_motion=True)
+    runner, ws_server = await server.start_servers('127.0.0.1', 0, 0, 0)
+    url = f'ws://127.0.0.1:{ws_server.sockets[0].getsockname()[1]}'
+
+    results = {}
+    for transport in ('websocket', 'udp'):
+        run = MotionRun(url, transport, args.duration, args.rate, args.loss, args.rto / 1000.0)
+        server.backend.take()
+        thread, errors = run_clients_in_thread([run])
+        while thread.is_alive():
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.1)
+        if errors:
+            raise errors[0]
+        results[transport] = motion_latencies(run.sent, server.backend.take())
+
+    server.injector.stop()
+    server.motion_channel.close()
+    ws_server.close()
+    await runner.cleanup()
+
+    ms = 1000.0
+    print("\n" + "=" * 50)
+    print("UDP MOTION BENCHMARK")
+    print("=" * 50)
+    print(f"Motion:     {args.rate:g} deltas/s for {args.duration:g} s, "
+          f"{args.loss * 100:g}% emulated loss, RTO {args.rto:g} ms")
+    for transport, (latencies, missing) in results.items():
+        print(f"{transport:<11} p50 {percentile(latencies, 0.5) * ms:7.2f} ms   "
+              f"p99 {percentile(latencies, 0.99) * ms:7.2f} ms   "
+              f"max {max(latencies, default=float('nan')) * ms:7.2f} ms"
+              + (f"   ({missing} never applied)" if missing else ""))
+    print("=" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare motion latency over WebSocket and UDP")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds of motion per transport")
+    parser.add_argument('--rate', type=float, default=120.0, help="motion deltas per second")
+    parser.add_argument('--loss', type=float, default=0.02, help="emulated packet loss (0-1)")
+    parser.add_argument('--rto', type=float, default=200.0,
+                        help="emulated TCP retransmission stall in ms")
+    parser.add_argument('--move-hz', type=float, default=server.DEFAULT_MOVE_HZ)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
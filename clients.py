@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Remote Clients
+Per-connection state for a connected phone: its metrics, its input lane and
+the buttons and keys it holds. Command handlers receive the client so they
+can queue into its own lane.
+"""
+
+import asyncio
+import json
+
+import injector
+import metrics
+from input_state import InputStateTracker, DEFAULT_MAX_HOLD, DEFAULT_HEARTBEAT_TIMEOUT
+
+
+class RemoteClient:
+    """A connected phone: WebSocket, metrics, command lane and held input"""
+
+    def __init__(self, websocket, input_injector, max_hold=DEFAULT_MAX_HOLD,
+                 heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT):
+        self.websocket = websocket
+        self.address = websocket.remote_address[0] if websocket.remote_address else "unknown"
+        self.stats = metrics.ClientStats(self.address)
+        self.lane = input_injector.open_lane(self.address)
+        # Server-side gesture recognizer, created on the first touch event
+        self.gestures = None
+        # Kinetic scroll engine, created on the first scroll_touch
+        self.scroller = None
+        # Token for the UDP motion channel, if the client asked for one
+        self.udp_token = None
+        # Set by the session manager
+        self.session_id = None
+        self.last_input = 0.0
+        # Buttons and keys pressed and not yet released
+        self.input_state = InputStateTracker(self, max_hold, heartbeat_timeout)
+        # Ping/pong RTT monitor, if the server runs one
+        self.link = None
+
+    def on_message(self):
+        """Count a received message; also tells the watchdog the phone is alive"""
+        self.stats.on_message()
+        self.input_state.on_message()
+
+    async def throttle(self):
+        """Pause reading while the client's lane is full or over its rate limit"""
+        delay = self.lane.backpressure_delay()
+        while delay:
+            injector.BACKPRESSURE_WAITS.inc()
+            await asyncio.sleep(delay)
+            delay = self.lane.backpressure_delay()
+
+    def status(self):
+        """Connection summary for /status"""
+        return {
+            'address': self.address,
+            'id': self.session_id,
+            'holding': self.input_state.holding,
+            'queued': len(self.lane._items),
+            'link': self.link.status() if self.link is not None else None,
+        }
+
+    def send_event(self, data):
+        """Send a JSON message to the phone without waiting for it"""
+        asyncio.ensure_future(self._send(json.dumps(data)))
+
+    def notify_gesture(self, name):
+        """Tell the phone which gesture was recognized, for on-screen feedback"""
+        self.send_event({'type': 'gesture', 'gesture': name})
+
+    async def _send(self, message):
+        try:
+            await self.websocket.send(message)
+        except Exception:
+            # Closing; the read loop will notice
+            pass
+
+    def release_input(self, reason):
+        """Abandon gestures and coasting, and release held buttons and keys"""
+        if self.gestures is not None:
+            self.gestures.cancel()
+        if self.scroller is not None:
+            self.scroller.stop()
+        self.input_state.release_all(reason)
+
+    def close(self):
+        """Release held buttons and keys, the client's lane and metrics"""
+        self.release_input('disconnect')
+        if self.link is not None:
+            self.link.stop()
+        self.lane.close()
+        self.stats.close()
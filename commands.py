@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Command Registry
+Maps command names (JSON 'type') and binary opcodes to pre-bound handlers.
+Every command validates its own arguments, so a malformed frame is rejected
+with a lookup and a few type checks instead of a raised exception.
+"""
+
+import json
+import math
+
+import ballistics
+import gestures
+import metrics
+import monitors
+import protocol
+import scrolling
+from text_input import TextInput, DEFAULT_PASTE_THRESHOLD
+
+
+class Command:
+    """A registered command: handler plus argument parsers for both wire formats"""
+
+    __slots__ = ('name', 'handler', 'parse', 'opcode', 'size', 'unpack', 'input')
+
+    def __init__(self, name, handler, parse, opcode=None, size=0, unpack=None, input=True):
+        self.name = name
+        self.input = input
+        self.handler = handler
+        self.parse = parse
+        self.opcode = opcode
+        self.size = size
+        self.unpack = unpack
+
+
+class CommandRegistry:
+    """O(1) dispatch of JSON and binary command frames to handlers"""
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_opcode = [None] * 256
+        # Session manager deciding who may inject; None lets everyone
+        self.arbiter = None
+        # Event journal recording every accepted message (journal.py); None for none
+        self.journal = None
+
+    def register(self, name, handler, parse, opcode=None, input=True):
+        """Register a command
+
+        handler(client, *args) is called with the sending client. parse(data)
+        turns a JSON command dict into the handler's positional arguments,
+        or returns None if the arguments are invalid. Commands with
+        an opcode also accept the matching binary frame from protocol.py.
+        Input commands (input=True) are dropped when the arbiter says the
+        client doesn't have control; settings commands always run.
+        """
+        size, unpack = protocol.FRAMES[opcode][2:] if opcode is not None else (0, None)
+        command = Command(name, handler, parse, opcode, size, unpack, input)
+        self._by_name[name] = command
+        if opcode is not None:
+            self._by_opcode[opcode] = command
+        return command
+
+    def names(self):
+        """Names of all registered commands"""
+        return list(self._by_name)
+
+    def dispatch_message(self, message, client):
+        """Dispatch a raw WebSocket message from a client; returns False if it was rejected
+
+        The client's stats receive the optional sequence number and timestamp
+        through stats.on_timing(seq, ts).
+        """
+        if isinstance(message, (bytes, bytearray)):
+            return self.dispatch_frame(message, client)
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return False
+        return self.dispatch(data, client, message)
+
+    def _parse(self, data):
+        """(command, args) for a decoded JSON command, or None if it is invalid"""
+        if not isinstance(data, dict):
+            return None
+        kind = data.get('type')
+        command = self._by_name.get(kind) if isinstance(kind, str) else None
+        if command is None:
+            return None
+        args = command.parse(data)
+        if args is None:
+            return None
+        return command, args
+
+    def _unpack(self, frame):
+        """(command, args) for a binary frame without trailer, or None if it is invalid"""
+        command = self._by_opcode[frame[0]]
+        if command is None:
+            return None
+        args = command.unpack(frame)
+        if args is None:
+            return None
+        return command, args
+
+    def dispatch(self, data, client, message=None):
+        """Dispatch a decoded JSON command; returns False if it was rejected
+
+        message is the text it was decoded from, journaled as is.
+        """
+        if isinstance(data, dict) and data.get('type') == 'batch':
+            events = data.get('events')
+            if not isinstance(events, list) or not events or len(events) > protocol.MAX_BATCH:
+                return False
+            parsed = [self._parse(event) for event in events]
+        else:
+            parsed = [self._parse(data)]
+        if None in parsed:
+            return False
+        seq = ts = None
+        if 'seq' in data or 'ts' in data:
+            seq = data.get('seq')
+            ts = data.get('ts')
+            seq = seq if isinstance(seq, int) else None
+            ts = ts if _is_number(ts) else None
+            client.stats.on_timing(seq, ts)
+        slot = -1
+        if self.journal is not None:
+            if message is None:
+                # Not from the wire (tools): serializing here is off the hot path
+                message = json.dumps(data, separators=(',', ':'))
+            slot = self.journal.append(client, message.encode('utf-8'), False, seq, ts)
+        self._apply(parsed, client, slot)
+        return True
+
+    def dispatch_frame(self, frame, client):
+        """Dispatch a binary frame; returns False if it was rejected"""
+        if not frame:
+            return False
+        if frame[0] == protocol.OP_BATCH:
+            parts = protocol.split_batch(frame)
+            if parts is None or not parts[0]:
+                return False
+            frames, trailer = parts
+            parsed = [self._unpack(part) for part in frames]
+            if None in parsed:
+                return False
+            if trailer is not None:
+                client.stats.on_timing(*trailer)
+            slot = -1
+            if self.journal is not None:
+                seq, ts = trailer if trailer is not None else (None, None)
+                slot = self.journal.append(client, frame, True, seq, ts)
+            self._apply(parsed, client, slot)
+            return True
+        command = self._by_opcode[frame[0]]
+        if command is None:
+            return False
+        trailer = (None, None)
+        body = frame
+        if len(frame) == command.size + protocol.TRAILER_SIZE:
+            trailer = protocol.unpack_trailer(frame, command.size)
+            client.stats.on_timing(*trailer)
+            body = frame[:command.size]
+        args = command.unpack(body)
+        if args is None:
+            return False
+        slot = -1
+        if self.journal is not None:
+            slot = self.journal.append(client, frame, True, *trailer)
+        self._apply([(command, args)], client, slot)
+        return True
+
+    def _apply(self, parsed, client, slot=-1):
+        """Run the handlers; slot is the message's journal index, -1 if not journaled"""
+        if self.arbiter is not None and any(command.input for command, _ in parsed):
+            if not self.arbiter.allow(client):
+                # Valid but not this client's turn: drop the input, keep the settings
+                parsed = [item for item in parsed if not item[0].input]
+                if not parsed:
+                    return
+        lane = client.lane
+        lane.journal_slot = slot
+        try:
+            if len(parsed) == 1:
+                command, args = parsed[0]
+                command.handler(client, *args)
+                return
+            # Queue the whole batch before the injector sees any of it
+            metrics.BATCH_SIZE.observe(len(parsed))
+            with lane.batch():
+                for command, args in parsed:
+                    command.handler(client, *args)
+        finally:
+            lane.journal_slot = -1
+
+
+# Argument parsers: JSON command dict -> handler args, or None if invalid
+
+# Largest int accepted as a number; anything bigger can't round-trip through a float
+_MAX_INT = 2 ** 53
+
+
+def _is_number(value):
+    """True for a finite int or float; bools, NaN and infinities are rejected"""
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, int) and not isinstance(value, bool) and -_MAX_INT <= value <= _MAX_INT
+
+
+def _parse_move(data):
+    dx = data.get('dx')
+    dy = data.get('dy')
+    if _is_number(dx) and _is_number(dy):
+        return dx, dy
+    return None
+
+
+def _parse_mouse_abs(data):
+    x = data.get('x')
+    y = data.get('y')
+    monitor = data.get('monitor', -1)
+    if (_is_number(x) and _is_number(y) and isinstance(monitor, int)
+            and not isinstance(monitor, bool) and monitor >= -1):
+        return x, y, monitor
+    return None
+
+
+def _parse_click(data):
+    button = data.get('button', 'left')
+    if not isinstance(button, str) or button not in protocol.BUTTON_CODES:
+        return None
+    return button, bool(data.get('double'))
+
+
+def _parse_button(data):
+    button = data.get('button')
+    if not isinstance(button, str) or button not in protocol.BUTTON_CODES:
+        return None
+    return (button,)
+
+
+def _parse_scroll(data):
+    dy = data.get('dy')
+    if _is_number(dy):
+        return (dy,)
+    return None
+
+
+def _parse_key(data):
+    key = data.get('key')
+    if isinstance(key, str) and key:
+        return (key,)
+    return None
+
+
+def _parse_combo(data):
+    keys = data.get('keys')
+    if isinstance(keys, list) and keys and all(isinstance(k, str) for k in keys):
+        return tuple(keys)
+    return None
+
+
+def _parse_text(data):
+    text = data.get('text')
+    if isinstance(text, str):
+        return (text,)
+    return None
+
+
+def _parse_touch(data):
+    phase = data.get('phase')
+    pointer = data.get('id', 0)
+    x = data.get('x')
+    y = data.get('y')
+    t = data.get('t')
+    # type() rather than isinstance(): True and False are not pointer ids
+    if (isinstance(phase, str) and phase in protocol.TOUCH_PHASE_CODES and type(pointer) is int
+            and _is_number(x) and _is_number(y) and _is_number(t)):
+        return phase, pointer, x, y, int(t)
+    return None
+
+
+def _parse_scroll_touch(data):
+    phase = data.get('phase')
+    x = data.get('x', 0)
+    y = data.get('y', 0)
+    if isinstance(phase, str) and phase in protocol.SCROLL_PHASE_CODES and _is_number(x) and _is_number(y):
+        return phase, x, y
+    return None
+
+
+def _parse_touch_config(data):
+    sensitivity = data.get('sensitivity')
+    double_tap = data.get('double_tap')
+    if sensitivity is not None and not (_is_number(sensitivity) and 0 < sensitivity <= 20):
+        return None
+    if double_tap is not None and (not isinstance(double_tap, str)
+                                   or double_tap not in gestures.DOUBLE_TAP_MODES):
+        return None
+    return sensitivity, double_tap
+
+
+def _parse_pointer_config(data):
+    profile = data.get('profile') or None
+    if profile is not None and (not isinstance(profile, str) or profile not in ballistics.PROFILES):
+        return None
+    return (profile,)
+
+
+def _parse_pong(data):
+    # 'id', not 'seq': seq is the optional per-frame timing field
+    ping = data.get('id')
+    if isinstance(ping, int) and not isinstance(ping, bool):
+        return (ping,)
+    return None
+
+
+def _parse_none(data):
+    return ()
+
+
+def create_registry(backend, motion_channel=None, paste_threshold=DEFAULT_PASTE_THRESHOLD,
+                    layout=monitors.layout):
+    """Registry with the standard remote-control commands, bound to a backend
+
+    Handlers queue into the sending client's lane: motion is coalesced,
+    scroll may be shed under load, everything else is always delivered.
+    If a UDP motion channel is given, clients can ask for it with udp_hello.
+    Text of paste_threshold characters or more is pasted instead of typed.
+    Absolute positions are mapped onto the cached monitor layout.
+    """
+    registry = CommandRegistry()
+    text_input = TextInput(backend, paste_threshold)
+    # Bind once: lanes only merge moves that share the same callable
+    move_rel = backend.move_rel
+    move_to = backend.move_to
+
+    def move(client, dx, dy):
+        client.lane.submit_move(move_rel, dx, dy)
+
+    def mouse_abs(client, x, y, monitor):
+        pixels = layout.to_pixels(x, y, monitor)
+        # None while the first layout query is still running; the next position will do
+        if pixels is not None:
+            client.lane.submit_position(move_to, *pixels)
+
+    def monitor_layout(client):
+        layout.when_ready(lambda: client.send_event(layout.describe()))
+
+    def _stop_scrolling(client):
+        if client.scroller is not None:
+            client.scroller.stop()
+
+    def click(client, button, double):
+        _stop_scrolling(client)
+        client.lane.submit('click', backend.click, button, double)
+
+    def mousedown(client, button):
+        _stop_scrolling(client)
+        client.input_state.press_button(backend, button)
+
+    def mouseup(client, button):
+        client.input_state.release_button(backend, button)
+
+    def scroll(client, dy):
+        client.lane.submit_droppable('scroll', backend.scroll, dy)
+
+    def key(client, name):
+        client.lane.submit('key', backend.press, name)
+
+    def keydown(client, name):
+        client.input_state.press_key(backend, name)
+
+    def keyup(client, name):
+        client.input_state.release_key(backend, name)
+
+    def heartbeat(client):
+        client.input_state.heartbeat()
+
+    def pong(client, ping):
+        # A phone answering pings will keep talking, so silence means trouble
+        client.input_state.heartbeat()
+        if client.link is not None:
+            client.link.on_pong(ping)
+
+    def combo(client, *keys):
+        client.lane.submit('combo', backend.hotkey, *keys)
+
+    def type_text(client, text):
+        client.lane.submit('type', text_input.type_text, text)
+
+    def _gestures(client):
+        if client.gestures is None:
+            client.gestures = gestures.GestureRecognizer(client, backend, move_rel)
+        return client.gestures
+
+    def touch(client, phase, pointer, x, y, t):
+        if phase == 'down':
+            # A new touch anywhere stops coasting
+            _stop_scrolling(client)
+        _gestures(client).on_touch(phase, pointer, x, y, t)
+
+    def scroll_touch(client, phase, x, y):
+        if client.scroller is None:
+            client.scroller = scrolling.ScrollEngine(client, backend)
+        client.scroller.on_scroll_touch(phase, x, y)
+
+    def touch_config(client, sensitivity, double_tap):
+        _gestures(client).configure(sensitivity, double_tap)
+
+    def pointer_config(client, profile):
+        client.lane.set_pointer_profile(profile)
+
+    def take_control(client):
+        if registry.arbiter is not None:
+            registry.arbiter.request(client)
+
+    def release_control(client):
+        if registry.arbiter is not None:
+            registry.arbiter.release(client)
+
+    registry.register('mouse_move', move, _parse_move, protocol.OP_MOUSE_MOVE)
+    registry.register('mouse_abs', mouse_abs, _parse_mouse_abs, protocol.OP_MOUSE_ABS)
+    registry.register('click', click, _parse_click, protocol.OP_CLICK)
+    registry.register('mousedown', mousedown, _parse_button, protocol.OP_MOUSEDOWN)
+    registry.register('mouseup', mouseup, _parse_button, protocol.OP_MOUSEUP)
+    registry.register('scroll', scroll, _parse_scroll, protocol.OP_SCROLL)
+    registry.register('key', key, _parse_key)
+    registry.register('keydown', keydown, _parse_key)
+    registry.register('keyup', keyup, _parse_key)
+    registry.register('combo', combo, _parse_combo)
+    registry.register('type', type_text, _parse_text)
+    registry.register('touch', touch, _parse_touch, protocol.OP_TOUCH)
+    registry.register('scroll_touch', scroll_touch, _parse_scroll_touch, protocol.OP_SCROLL_TOUCH)
+    registry.register('touch_config', touch_config, _parse_touch_config, input=False)
+    registry.register('pointer_config', pointer_config, _parse_pointer_config, input=False)
+    registry.register('heartbeat', heartbeat, _parse_none, input=False)
+    registry.register('pong', pong, _parse_pong, input=False)
+    registry.register('monitors', monitor_layout, _parse_none, input=False)
+    registry.register('take_control', take_control, _parse_none, input=False)
+    registry.register('release_control', release_control, _parse_none, input=False)
+
+    if motion_channel is not None:
+        def udp_hello(client):
+            token = motion_channel.open_session(client)
+            client.send_event({'type': 'udp', 'port': motion_channel.port, 'token': token.hex()})
+
+        registry.register('udp_hello', udp_hello, _parse_none, input=False)
+    return registry
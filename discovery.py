@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Server Discovery
+Finds this PC's LAN addresses and makes the server easy to find from a phone.
+
+    local_addresses()   IPv4 addresses of the network interfaces, read from
+                        the interfaces themselves instead of guessing from the
+                        route to 8.8.8.8, so offline and multi-homed machines
+                        list every address a phone might reach
+    MdnsResponder       answers multicast DNS on the asyncio loop, so phones
+                        open http://phone-remote.local:8080 without typing an
+                        IP, and advertises the pages over DNS-SD
+                        (_phone-remote._tcp and _http._tcp)
+    DiscoveryResponder  answers a "PRC_DISCOVER" UDP datagram (broadcast to
+                        DISCOVERY_PORT) with the same JSON the /discover page
+                        serves: name, addresses and ports
+
+Browsers can't send UDP, so the web interfaces use mDNS and /discover; the
+UDP responder is for native clients (`python discovery.py` lists servers).
+Every answer lists the address on the asker's subnet first.
+"""
+
+import asyncio
+import ipaddress
+import json
+import socket
+import struct
+import sys
+import time
+
+MDNS_GROUP = '224.0.0.251'
+MDNS_PORT = 5353
+DEFAULT_NAME = 'phone-remote'
+SERVICE_TYPES = ('_phone-remote._tcp.local', '_http._tcp.local')
+# Seconds phones may cache the records
+RECORD_TTL = 120
+
+DISCOVERY_PORT = 8767
+DISCOVERY_REQUEST = b'PRC_DISCOVER'
+
+# Interfaces of containers and VMs, which phones can't reach (Linux names)
+_VIRTUAL_PREFIXES = ('docker', 'veth', 'br-', 'virbr', 'vmnet', 'vboxnet', 'lxc', 'tun', 'tap')
+_SIOCGIFADDR = 0x8915
+
+_TYPE_A = 1
+_TYPE_PTR = 12
+_TYPE_TXT = 16
+_TYPE_SRV = 33
+_TYPE_ANY = 255
+_CLASS_IN = 1
+_CACHE_FLUSH = 0x8000
+_UNICAST_RESPONSE = 0x8000
+
+
+def _interface_addresses():
+    """(interface name, address) pairs of the IPv4 interfaces, on Linux"""
+    import fcntl
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _, name in socket.if_nameindex():
+            try:
+                request = struct.pack('256s', name.encode('utf-8')[:15])
+                reply = fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, request)
+            except OSError:
+                # No IPv4 address on this interface
+                continue
+            yield name, socket.inet_ntoa(reply[20:24])
+
+
+def local_addresses():
+    """IPv4 addresses phones can reach, private LAN addresses first"""
+    found = {}
+    if sys.platform.startswith('linux'):
+        for name, address in _interface_addresses():
+            if not name.startswith(_VIRTUAL_PREFIXES):
+                found[address] = name
+    else:
+        # Windows and macOS resolve their own host name to every adapter's address
+        try:
+            for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET):
+                found[info[4][0]] = None
+        except OSError:
+            pass
+    usable = []
+    for address in found:
+        ip = ipaddress.IPv4Address(address)
+        if not (ip.is_loopback or ip.is_link_local or ip.is_unspecified):
+            usable.append(address)
+    return sorted(usable, key=lambda a: (not ipaddress.IPv4Address(a).is_private,
+                                         ipaddress.IPv4Address(a)))
+
+
+def closest_first(addresses, peer):
+    """addresses ordered by how many leading bits they share with peer"""
+    try:
+        peer = int(ipaddress.IPv4Address(peer))
+    except ValueError:
+        return list(addresses)
+    return sorted(addresses, key=lambda a: -_common_bits(int(ipaddress.IPv4Address(a)), peer))
+
+
+def _common_bits(a, b):
+    return 32 - (a ^ b).bit_length()
+
+
+def server_info(name, addresses, http_port, ws_port=None, udp_port=None):
+    """What /discover and the discovery responder tell clients"""
+    return {
+        'name': name,
+        'host': f'{name}.local',
+        'addresses': list(addresses),
+        'http': http_port,
+        'ws': ws_port,
+        'udp': udp_port,
+    }
+
+
+# --- DNS messages ---
+
+def _encode_name(name):
+    out = bytearray()
+    for label in name.rstrip('.').split('.'):
+        data = label.encode('utf-8')
+        out.append(len(data))
+        out += data
+    out.append(0)
+    return bytes(out)
+
+
+def _read_name(data, offset):
+    """(lowercase name, offset after it), following compression pointers"""
+    labels = []
+    end = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return '.'.join(labels).lower(), end if end is not None else offset
+        labels.append(data[offset:offset + length].decode('utf-8', 'replace'))
+        offset += length
+    raise ValueError("DNS name loops")
+
+
+def parse_message(data):
+    """(id, flags, questions, answers) of a DNS message
+
+    questions are (name, type, unicast) and answers (name, type, rdata).
+    """
+    ident, flags, qdcount, ancount, _, _ = struct.unpack_from('!6H', data)
+    offset = 12
+    questions = []
+    for _ in range(qdcount):
+        name, offset = _read_name(data, offset)
+        qtype, qclass = struct.unpack_from('!HH', data, offset)
+        offset += 4
+        questions.append((name, qtype, bool(qclass & _UNICAST_RESPONSE)))
+    answers = []
+    for _ in range(ancount):
+        name, offset = _read_name(data, offset)
+        rtype, _, _, length = struct.unpack_from('!HHIH', data, offset)
+        offset += 10
+        answers.append((name, rtype, data[offset:offset + length]))
+        offset += length
+    return ident, flags, questions, answers
+
+
+def _record(name, rtype, rdata, ttl, unique):
+    rclass = _CLASS_IN | (_CACHE_FLUSH if unique else 0)
+    return _encode_name(name) + struct.pack('!HHIH', rtype, rclass, ttl, len(rdata)) + rdata
+
+
+def _message(ident, answers, additional=(), questions=()):
+    header = struct.pack('!6H', ident, 0x8400, len(questions), len(answers), 0, len(additional))
+    body = b''.join(_encode_name(name) + struct.pack('!HH', qtype, _CLASS_IN)
+                    for name, qtype in questions)
+    return header + body + b''.join(answers) + b''.join(additional)
+
+
+def _query(name, qtype):
+    return struct.pack('!6H', 0, 0, 1, 0, 0, 0) + _encode_name(name) + struct.pack('!HH', qtype, _CLASS_IN)
+
+
+class MdnsResponder(asyncio.DatagramProtocol):
+    """Multicast DNS responder for <name>.local and the server's DNS-SD services"""
+
+    def __init__(self, name, http_port, addresses, path='/latest'):
+        self.name = name
+        self.http_port = http_port
+        self.addresses = list(addresses)
+        self.path = path
+        self.transport = None
+        self._conflict = False
+        # Queries go unanswered until the name is ours (RFC 6762 8.1)
+        self._probing = True
+        self._task = None
+
+    @property
+    def host(self):
+        return f'{self.name}.local'
+
+    async def start(self):
+        """Join the mDNS group on every interface; returns False if port 5353 is unavailable"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            # Share the port with the OS responder (Bonjour, Avahi, Windows)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(('', MDNS_PORT))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+            joined = 0
+            for address in self.addresses:
+                try:
+                    membership = socket.inet_aton(MDNS_GROUP) + socket.inet_aton(address)
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+                    joined += 1
+                except OSError:
+                    pass
+            if not joined:
+                raise OSError("could not join the mDNS group on any interface")
+        except OSError as e:
+            sock.close()
+            print(f"[!] mDNS unavailable: {e}")
+            return False
+        await asyncio.get_running_loop().create_datagram_endpoint(lambda: self, sock=sock)
+        self._task = asyncio.ensure_future(self._announce())
+        return True
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def stop(self, goodbye=True):
+        """Leave the group; with goodbye, tell phones to forget the records"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.transport is None:
+            return
+        if goodbye:
+            self._multicast(_message(0, self._all_records(0)))
+        self.transport.close()
+        self.transport = None
+
+    async def _announce(self):
+        # Probe for the name first; another PC may already use it (RFC 6762 8.1)
+        base = self.name
+        for attempt in range(2, 10):
+            self._conflict = False
+            for _ in range(3):
+                self._multicast(_query(self.host, _TYPE_ANY))
+                await asyncio.sleep(0.25)
+            if not self._conflict:
+                break
+            taken, self.name = self.host, f'{base}-{attempt}'
+            print(f"[!] {taken} is taken on this network, using {self.host}")
+        self._probing = False
+        print(f"[+] Advertising http://{self.host}:{self.http_port} over mDNS")
+        # Announce twice, a second apart (RFC 6762 8.3)
+        for _ in range(2):
+            self._multicast(_message(0, self._all_records(RECORD_TTL)))
+            await asyncio.sleep(1.0)
+
+    def _multicast(self, packet):
+        if self.transport is None:
+            return
+        sock = self.transport.get_extra_info('socket')
+        for address in self.addresses:
+            try:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(address))
+                self.transport.sendto(packet, (MDNS_GROUP, MDNS_PORT))
+            except OSError:
+                pass
+
+    def _address_records(self, ttl, peer=None):
+        addresses = closest_first(self.addresses, peer) if peer else self.addresses
+        return [_record(self.host, _TYPE_A, socket.inet_aton(a), ttl, True) for a in addresses]
+
+    def _instance(self, service):
+        return f'{self.name}.{service}'
+
+    def _service_records(self, service, ttl):
+        """(PTR, SRV, TXT) of one DNS-SD service"""
+        instance = self._instance(service)
+        txt = f'path={self.path}'.encode('utf-8')
+        return (
+            _record(service, _TYPE_PTR, _encode_name(instance), ttl, False),
+            _record(instance, _TYPE_SRV, struct.pack('!HHH', 0, 0, self.http_port) + _encode_name(self.host),
+                    ttl, True),
+            _record(instance, _TYPE_TXT, bytes([len(txt)]) + txt, ttl, True),
+        )
+
+    def _all_records(self, ttl):
+        records = self._address_records(ttl)
+        for service in SERVICE_TYPES:
+            records.extend(self._service_records(service, ttl))
+        return records
+
+    def _answer(self, name, qtype, peer):
+        """(answers, additional) for one question, or None if it isn't ours"""
+        def wants(rtype):
+            return qtype in (rtype, _TYPE_ANY)
+
+        if name == self.host:
+            if wants(_TYPE_A):
+                return self._address_records(RECORD_TTL, peer), []
+            return None
+        if name == '_services._dns-sd._udp.local' and wants(_TYPE_PTR):
+            return [_record(name, _TYPE_PTR, _encode_name(service), RECORD_TTL, False)
+                    for service in SERVICE_TYPES], []
+        for service in SERVICE_TYPES:
+            ptr, srv, txt = self._service_records(service, RECORD_TTL)
+            if name == service and wants(_TYPE_PTR):
+                return [ptr], [srv, txt] + self._address_records(RECORD_TTL, peer)
+            if name == self._instance(service):
+                answers = ([srv] if wants(_TYPE_SRV) else []) + ([txt] if wants(_TYPE_TXT) else [])
+                return (answers, self._address_records(RECORD_TTL, peer)) if answers else None
+        return None
+
+    def datagram_received(self, data, addr):
+        try:
+            ident, flags, questions, answers = parse_message(data)
+        except (ValueError, IndexError, struct.error):
+            return
+        if flags & 0x8000:
+            # A response: someone else answering for our name is a conflict
+            for name, rtype, rdata in answers:
+                if (name == self.host and rtype == _TYPE_A and len(rdata) == 4
+                        and socket.inet_ntoa(rdata) not in self.addresses):
+                    self._conflict = True
+            return
+        if self._probing:
+            return
+        answer, additional, unicast = [], [], False
+        for name, qtype, wants_unicast in questions:
+            found = self._answer(name, qtype, addr[0])
+            if found is not None:
+                answer.extend(found[0])
+                additional.extend(found[1])
+                unicast = unicast or wants_unicast
+        if not answer:
+            return
+        if addr[1] != MDNS_PORT:
+            # Legacy unicast query (RFC 6762 6.7): echo the id and questions
+            packet = _message(ident, answer, additional, [(n, t) for n, t, _ in questions])
+            self.transport.sendto(packet, addr)
+        elif unicast:
+            self.transport.sendto(_message(0, answer, additional), addr)
+        else:
+            self._multicast(_message(0, answer, additional))
+
+
+class DiscoveryResponder(asyncio.DatagramProtocol):
+    """Answers discovery datagrams with server_info() as JSON"""
+
+    def __init__(self, info):
+        # Called for every request, so the reply reflects the current ports
+        self.info = info
+        self.transport = None
+
+    async def start(self, port=DISCOVERY_PORT, sock=None):
+        """Listen on all interfaces, or on an already bound sock"""
+        loop = asyncio.get_running_loop()
+        if sock is not None:
+            await loop.create_datagram_endpoint(lambda: self, sock=sock)
+        else:
+            await loop.create_datagram_endpoint(lambda: self, local_addr=('0.0.0.0', port),
+                                                allow_broadcast=True)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if data.strip() != DISCOVERY_REQUEST:
+            return
+        info = self.info()
+        info['addresses'] = closest_first(info['addresses'], addr[0])
+        self.transport.sendto(json.dumps(info).encode('utf-8'), addr)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+
+def find_servers(timeout=1.0, port=DISCOVERY_PORT, target='255.255.255.255'):
+    """Broadcast a discovery request and collect the replies"""
+    servers = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.sendto(DISCOVERY_REQUEST, (target, port))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, addr = sock.recvfrom(4096)
+            except socket.timeout:
+                break
+            try:
+                info = json.loads(data)
+            except ValueError:
+                continue
+            info['from'] = addr[0]
+            servers.append(info)
+    return servers
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="List Phone Remote Control servers on the network")
+    parser.add_argument('--timeout', type=float, default=1.0)
+    parser.add_argument('--target', default='255.255.255.255',
+                        help="broadcast (or server) address to ask")
+    args = parser.parse_args()
+    print(f"Local addresses: {', '.join(local_addresses()) or 'none'}")
+    servers = find_servers(args.timeout, target=args.target)
+    if not servers:
+        print("No servers found")
+    for info in servers:
+        print(f"{info['host']} ({info['from']}): http://{info['addresses'][0] if info['addresses'] else info['from']}"
+              f":{info['http']}  addresses {', '.join(info['addresses'])}")
+
+
+if __name__ == "__main__":
+    main()
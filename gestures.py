@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Gesture Recognizer
+Turns raw touchpad events from the phone into clicks, drags and motion on
+the server, so a tap no longer waits on the phone for a double-tap timeout
+before it is sent.
+
+    tap                    left click, issued on the first tap-up
+    tap, tap               still one click (or a double-click, see below)
+    tap, tap-and-hold      left-button drag until the finger lifts
+    hold                   right click
+    two-finger tap         right click
+
+The click on the first tap-up is speculative: it is sent at once instead of
+after the double-tap window. A clicked item can't be un-clicked, so a
+following gesture is only ever interpreted on top of it: a second tap is
+absorbed ('click' mode, the old phone-side behaviour) or completes an OS
+double-click ('double' mode), and a drag's button press comes a full hold
+time after the click, late enough not to be read as a double-click.
+
+Timing decisions use the phone's own event timestamps (milliseconds), so
+network jitter doesn't turn a tap into a hold. Only the hold timer itself
+runs on the server clock, since no event arrives while a finger rests.
+"""
+
+import asyncio
+
+# Longest touch that still counts as a tap (ms)
+TAP_TIME = 300
+# Second tap must start within this long of the first tap's release (ms)
+DOUBLE_TAP_TIME = 300
+# Resting this long without moving is a hold (seconds)
+HOLD_TIME = 0.5
+# Movement from the touch-down point that makes a touch a swipe (CSS px)
+MOVE_SLOP = 5
+
+DOUBLE_TAP_MODES = ('click', 'double')
+
+
+def _elapsed(later, earlier):
+    """Milliseconds between two wrapping 32-bit client timestamps"""
+    return (later - earlier) & 0xFFFFFFFF
+
+
+class GestureRecognizer:
+    """Per-client touch state machine; events arrive on the event loop"""
+
+    def __init__(self, client, backend, move_rel, sensitivity=2.0, double_tap='click'):
+        self.client = client
+        self.backend = backend
+        self.move_rel = move_rel
+        self.sensitivity = sensitivity
+        self.double_tap = double_tap
+        self._pointers = {}
+        self._start = None
+        self._start_t = 0
+        self._moved = False
+        self._multi = False
+        self._second_tap = False
+        self._last_tap_up = None
+        self._held = False
+        self._dragging = False
+        self._hold_timer = None
+
+    def configure(self, sensitivity=None, double_tap=None):
+        if sensitivity is not None:
+            self.sensitivity = sensitivity
+        if double_tap is not None:
+            self.double_tap = double_tap
+
+    def on_touch(self, phase, pointer, x, y, t):
+        t &= 0xFFFFFFFF
+        if phase == 'down':
+            self._down(pointer, x, y, t)
+        elif phase == 'move':
+            self._move(pointer, x, y)
+        elif phase == 'up':
+            self._up(pointer, t)
+        else:
+            self.cancel()
+
+    def _down(self, pointer, x, y, t):
+        self._pointers[pointer] = (x, y)
+        if len(self._pointers) > 1:
+            self._multi = True
+            self._cancel_hold()
+            return
+        self._start = (x, y)
+        self._start_t = t
+        self._moved = False
+        self._multi = False
+        self._held = False
+        self._second_tap = (self._last_tap_up is not None
+                            and _elapsed(t, self._last_tap_up) < DOUBLE_TAP_TIME)
+        self._cancel_hold()
+        self._hold_timer = asyncio.get_running_loop().call_later(HOLD_TIME, self._on_hold)
+
+    def _move(self, pointer, x, y):
+        last = self._pointers.get(pointer)
+        if last is None:
+            return
+        self._pointers[pointer] = (x, y)
+        if self._multi:
+            return
+        if not self._moved and (abs(x - self._start[0]) > MOVE_SLOP or abs(y - self._start[1]) > MOVE_SLOP):
+            self._moved = True
+            self._cancel_hold()
+        dx = (x - last[0]) * self.sensitivity
+        dy = (y - last[1]) * self.sensitivity
+        if dx or dy:
+            self.client.lane.submit_move(self.move_rel, dx, dy)
+
+    def _up(self, pointer, t):
+        if self._pointers.pop(pointer, None) is None:
+            return
+        if self._pointers:
+            # Wait for the last finger of a multi-finger gesture
+            return
+        self._cancel_hold()
+        tap = not self._moved and _elapsed(t, self._start_t) < TAP_TIME
+        self._last_tap_up = None
+        if self._dragging:
+            self._dragging = False
+            self.client.input_state.release_button(self.backend, 'left')
+            self.client.notify_gesture('Drag End')
+        elif self._held or not tap:
+            pass
+        elif self._multi:
+            self._click('right', 'Right Click')
+        elif self._second_tap:
+            # The first tap already clicked
+            if self.double_tap == 'double':
+                self._click('left', 'Double Click')
+        else:
+            self._click('left', 'Click')
+            self._last_tap_up = t
+
+    def _on_hold(self):
+        self._hold_timer = None
+        if len(self._pointers) != 1 or self._moved or self._multi:
+            return
+        self._held = True
+        if self._second_tap:
+            self._dragging = True
+            self.client.input_state.press_button(self.backend, 'left')
+            self.client.notify_gesture('Drag Start')
+        else:
+            self._click('right', 'Right Click (Hold)')
+
+    def _click(self, button, label):
+        self.client.lane.submit('click', self.backend.click, button, False)
+        self.client.notify_gesture(label)
+
+    def _cancel_hold(self):
+        if self._hold_timer is not None:
+            self._hold_timer.cancel()
+            self._hold_timer = None
+
+    def cancel(self):
+        """Abandon the current gesture, releasing a drag in progress"""
+        self._cancel_hold()
+        self._pointers.clear()
+        self._last_tap_up = None
+        if self._dragging:
+            self._dragging = False
+            self.client.input_state.release_button(self.backend, 'left')
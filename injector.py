@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Input Injection Worker
+Runs blocking OS input calls on a dedicated thread so the asyncio event loop
+only parses and enqueues commands.
+
+Each connected client gets its own lane: a bounded command queue with a
+per-command-class policy and a message rate limit. The worker serves lanes
+round-robin, so one flooding phone can't starve the others.
+
+    motion      coalesced into one pending move, applied once per tick
+                through the lane's pointer ballistics (gain curve)
+    position    absolute moves: only the newest position is kept, applied
+                once per tick like motion
+    scroll      dropped when the lane is full, over its rate, or stale
+    everything  never dropped; a full or over-rate lane asks its connection
+    else        to stop reading (backpressure) until it drains
+"""
+
+import collections
+import math
+import threading
+import time
+
+import metrics
+from ballistics import PointerBallistics, DEFAULT_PROFILE
+
+# Default rate at which coalesced mouse motion is applied (per second)
+DEFAULT_MOVE_HZ = 120
+# Default per-client message rate limit (per second, 0 = unlimited)
+DEFAULT_MAX_RATE = 500
+# Commands queued per lane before droppable commands are shed
+DEFAULT_LANE_SIZE = 64
+# Scroll steps older than this are dropped instead of injected (seconds)
+SCROLL_STALE_AFTER = 0.25
+
+FRAMES_DROPPED = metrics.registry.counter(
+    'prc_frames_dropped_total', 'Commands dropped by lane policy, by command and reason',
+    ('command', 'reason'))
+FRAMES_COALESCED = metrics.registry.counter(
+    'prc_frames_coalesced_total', 'Mouse moves merged into an already pending move')
+BACKPRESSURE_WAITS = metrics.registry.counter(
+    'prc_backpressure_waits_total', 'Times a connection paused reading for a full or over-rate lane')
+
+# Lane item flags
+_KEEP = 0
+_DROPPABLE = 1
+_MOVE = 2
+_POSITION = 3
+
+
+def _ballistic_move(ballistics, func, dx, dy, now):
+    """Apply a lane's gain curve and sub-pixel carry, then move by whatever whole pixels remain"""
+    dx, dy = ballistics.apply(dx, dy, now)
+    if dx or dy:
+        func(dx, dy)
+
+
+class InputLane:
+    """One client's command queue; submit methods are called from the event loop"""
+
+    def __init__(self, injector, name, maxsize, max_rate, pointer_profile=DEFAULT_PROFILE):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_rate = max_rate
+        self._injector = injector
+        self._items = collections.deque()
+        self._pending_move = None
+        self._next_move = 0.0
+        self.ballistics = PointerBallistics(pointer_profile)
+        self._tokens = float(max_rate)
+        self._last_refill = time.monotonic()
+        self.closed = False
+        # Journal index of the command being handled (journal.py), -1 for none
+        self.journal_slot = -1
+        # Called before queueing motion; returning False discards it (sessions.py)
+        self.motion_gate = None
+
+    def _refill(self, now):
+        self._tokens = min(self.max_rate, self._tokens + (now - self._last_refill) * self.max_rate)
+        self._last_refill = now
+
+    def _take_token(self, now):
+        """Consume one message token; returns False if the lane is over its rate"""
+        if not self.max_rate:
+            return True
+        self._refill(now)
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def submit(self, name, func, *args, **kwargs):
+        """Queue a command that must never be dropped"""
+        now = time.monotonic()
+        if not self._take_token(now):
+            # Accept anyway, but go into debt so the connection pauses reading
+            self._tokens -= 1
+        with self._injector._cond:
+            self._items.append((name, func, args, kwargs, now, _KEEP, self.journal_slot))
+            # Later moves must land after this command
+            self._pending_move = None
+            self._injector._cond.notify()
+        return True
+
+    def submit_droppable(self, name, func, *args, **kwargs):
+        """Queue a command that may be shed under load; returns False if dropped"""
+        now = time.monotonic()
+        with self._injector._cond:
+            # Checked under the lock the worker pops with, so the size can't change in between
+            if len(self._items) >= self.maxsize:
+                FRAMES_DROPPED.inc(1, name, 'full')
+                return False
+            if not self._take_token(now):
+                FRAMES_DROPPED.inc(1, name, 'rate')
+                return False
+            self._items.append((name, func, args, kwargs, now, _DROPPABLE, self.journal_slot))
+            self._pending_move = None
+            self._injector._cond.notify()
+        return True
+
+    def submit_move(self, func, dx, dy):
+        """Queue a relative move, merging it into the pending move if there is one"""
+        if not (math.isfinite(dx) and math.isfinite(dy)):
+            FRAMES_DROPPED.inc(1, 'mouse_move', 'invalid')
+            return False
+        if self.motion_gate is not None and not self.motion_gate():
+            return False
+        now = time.monotonic()
+        if not self._take_token(now):
+            self._tokens -= 1
+        with self._injector._cond:
+            pending = self._pending_move
+            if pending is not None and pending[0] is func:
+                pending[1] += dx
+                pending[2] += dy
+                FRAMES_COALESCED.inc()
+                return True
+            pending = [func, dx, dy]
+            self._items.append(('mouse_move', None, (pending,), {}, now, _MOVE, self.journal_slot))
+            self._pending_move = pending
+            self._injector._cond.notify()
+        return True
+
+    def submit_position(self, func, x, y):
+        """Queue an absolute move, replacing the pending position if there is one"""
+        if not (math.isfinite(x) and math.isfinite(y)):
+            FRAMES_DROPPED.inc(1, 'mouse_abs', 'invalid')
+            return False
+        if self.motion_gate is not None and not self.motion_gate():
+            return False
+        now = time.monotonic()
+        if not self._take_token(now):
+            self._tokens -= 1
+        with self._injector._cond:
+            pending = self._pending_move
+            if pending is not None and pending[0] is func:
+                pending[1] = x
+                pending[2] = y
+                FRAMES_COALESCED.inc()
+                return True
+            pending = [func, x, y]
+            self._items.append(('mouse_abs', None, (pending,), {}, now, _POSITION, self.journal_slot))
+            self._pending_move = pending
+            self._injector._cond.notify()
+        return True
+
+    def set_pointer_profile(self, profile=None):
+        """Switch the lane to a ballistics profile (see ballistics.PROFILES), None for the default"""
+        with self._injector._cond:
+            self.ballistics = PointerBallistics(profile or self._injector.pointer_profile)
+
+    def batch(self):
+        """Context manager holding the lane lock, so a batch of submits reaches the worker together"""
+        return self._injector._cond
+
+    def backpressure_delay(self):
+        """Seconds the connection should wait before reading more, 0 if none"""
+        if len(self._items) >= self.maxsize:
+            return 0.005
+        if self.max_rate:
+            self._refill(time.monotonic())
+            if self._tokens < 0:
+                return -self._tokens / self.max_rate
+        return 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def close(self):
+        """Stop accepting work; the lane is removed once its queue drains"""
+        with self._injector._cond:
+            self.closed = True
+            self._injector._cond.notify()
+
+
+class InputInjector:
+    """Single worker thread executing queued input calls
+
+    Commands from one lane run in arrival order. Consecutive mouse moves in
+    a lane are merged into one pending move; any other command closes it, so
+    motion never jumps ahead of a click or button change. Each lane applies
+    its merged motion at most once per tick.
+    """
+
+    def __init__(self, move_hz=DEFAULT_MOVE_HZ, max_rate=DEFAULT_MAX_RATE,
+                 lane_size=DEFAULT_LANE_SIZE, pointer_profile=DEFAULT_PROFILE):
+        self._cond = threading.Condition()
+        self._lanes = []
+        self._next_lane = 0
+        self._move_interval = 0.0
+        self._thread = None
+        self._stopping = False
+        self.max_rate = max_rate
+        self.lane_size = lane_size
+        # Ballistics profile for new lanes
+        self.pointer_profile = pointer_profile
+        self.set_move_rate(move_hz)
+        # Lane for commands that don't come from a client connection
+        self._server_lane = self.open_lane('server', max_rate=0)
+        # Journal to stamp with the time each command runs (journal.py)
+        self.journal = None
+
+    def set_move_rate(self, move_hz):
+        """Set the motion tick in Hz; 0 applies moves as soon as the worker is free"""
+        self._move_interval = 1.0 / move_hz if move_hz > 0 else 0.0
+
+    def open_lane(self, name, max_rate=None):
+        """Create a command lane for a client"""
+        lane = InputLane(self, name, self.lane_size,
+                         self.max_rate if max_rate is None else max_rate, self.pointer_profile)
+        with self._cond:
+            self._lanes.append(lane)
+        return lane
+
+    def start(self):
+        """Start the worker thread"""
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='input-injector', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Let queued commands finish, then stop the worker thread"""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, name, func, *args, **kwargs):
+        """Queue a server-originated input call"""
+        return self._server_lane.submit(name, func, *args, **kwargs)
+
+    def submit_move(self, func, dx, dy):
+        """Queue a server-originated relative move"""
+        return self._server_lane.submit_move(func, dx, dy)
+
+    def _next_item(self, now):
+        """Pick the next runnable item round-robin; returns (item, wait seconds)"""
+        wait = None
+        count = len(self._lanes)
+        for offset in range(count):
+            index = (self._next_lane + offset) % count
+            lane = self._lanes[index]
+            items = lane._items
+            while items:
+                name, func, args, kwargs, queued, flag, slot = items[0]
+                if flag == _DROPPABLE and name == 'scroll' and now - queued > SCROLL_STALE_AFTER:
+                    items.popleft()
+                    FRAMES_DROPPED.inc(1, name, 'stale')
+                    continue
+                if flag == _MOVE or flag == _POSITION:
+                    due = lane._next_move - now
+                    if due > 0:
+                        # Leave the move open so more deltas can join it
+                        wait = due if wait is None else min(wait, due)
+                        break
+                    items.popleft()
+                    pending = args[0]
+                    if lane._pending_move is pending:
+                        lane._pending_move = None
+                    func, dx, dy = pending
+                    lane._next_move = now + self._move_interval
+                    if flag == _POSITION:
+                        # Absolute: the position is applied as is
+                        args = (dx, dy)
+                    else:
+                        if not (dx or dy):
+                            continue
+                        # Ballistics run with the move, outside the lock and inside the error guard
+                        args = (lane.ballistics, func, dx, dy, now)
+                        func = _ballistic_move
+                else:
+                    items.popleft()
+                self._next_lane = (index + 1) % count
+                return (name, func, args, kwargs, queued, slot), None
+        # Drop closed lanes that have drained
+        self._lanes = [lane for lane in self._lanes if lane._items or not lane.closed]
+        self._next_lane = 0
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    item, wait = self._next_item(time.monotonic())
+                    if item is not None:
+                        break
+                    if self._stopping and wait is None:
+                        return
+                    self._cond.wait(wait)
+            name, func, args, kwargs, queued, slot = item
+            start = time.monotonic()
+            metrics.QUEUE_DELAY.observe(start - queued, name)
+            if slot >= 0 and self.journal is not None:
+                self.journal.mark_dispatched(slot, start)
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"[ERROR] Error processing '{name}' command: {e}")
+            metrics.INJECT_DURATION.observe(time.monotonic() - start, name)
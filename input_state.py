@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Input State Tracking
+Remembers which mouse buttons and keys a phone holds down, so they can be
+released for it when it can't do so itself. Everything a phone holds is
+released:
+
+    on disconnect
+    on heartbeat timeout    once a phone has sent a heartbeat, it must keep
+                            sending messages while it holds anything; a
+                            phone that dropped off Wi-Fi mid-drag is noticed
+                            in seconds instead of when TCP gives up
+    after the max hold time a last resort for phones that don't send
+                            heartbeats (older pages)
+
+Pressing and releasing are dictionary updates; the watchdog timer only runs
+while something is held. Every forced release is counted in the metrics.
+"""
+
+import asyncio
+import time
+
+import metrics
+
+# Seconds a button or key may stay down before it is released (0 = no limit)
+DEFAULT_MAX_HOLD = 60.0
+# Seconds without a message from a phone that sends heartbeats (0 = never)
+DEFAULT_HEARTBEAT_TIMEOUT = 3.0
+# Watchdog check interval while something is held (seconds)
+CHECK_INTERVAL = 0.5
+
+FORCED_RELEASES = metrics.registry.counter(
+    'prc_forced_releases_total', 'Buttons and keys released by the server, by kind and reason',
+    ('kind', 'reason'))
+
+
+class InputStateTracker:
+    """Held buttons and keys of one client, with the watchdog that releases them"""
+
+    def __init__(self, client, max_hold=DEFAULT_MAX_HOLD, heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT):
+        self.client = client
+        self.max_hold = max_hold
+        self.heartbeat_timeout = heartbeat_timeout
+        # (kind, name) -> (release function, time pressed)
+        self._held = {}
+        self._heartbeats = False
+        self._messages = 0
+        self._seen_messages = 0
+        self._last_seen = time.monotonic()
+        self._timer = None
+
+    @property
+    def holding(self):
+        """True while any button or key is held"""
+        return bool(self._held)
+
+    @property
+    def holding_button(self):
+        """True while any mouse button is held"""
+        return any(kind == 'button' for kind, _ in self._held)
+
+    def on_message(self):
+        """Note that the phone is alive; called for every received message"""
+        self._messages += 1
+
+    def heartbeat(self):
+        """The phone sends heartbeats, so its silence can be trusted as a timeout"""
+        self._heartbeats = True
+
+    def press_button(self, backend, button):
+        """Queue a button press and remember to release it"""
+        self._press('button', button, backend.mouse_up)
+        self.client.lane.submit('mousedown', backend.mouse_down, button)
+
+    def release_button(self, backend, button):
+        """Queue a button release"""
+        self._held.pop(('button', button), None)
+        self.client.lane.submit('mouseup', backend.mouse_up, button)
+
+    def press_key(self, backend, key):
+        """Queue a key press (usually a modifier) and remember to release it"""
+        self._press('key', key, backend.key_up)
+        self.client.lane.submit('keydown', backend.key_down, key)
+
+    def release_key(self, backend, key):
+        """Queue a key release"""
+        self._held.pop(('key', key), None)
+        self.client.lane.submit('keyup', backend.key_up, key)
+
+    def _press(self, kind, name, release):
+        if (kind, name) not in self._held:
+            self._held[(kind, name)] = (release, time.monotonic())
+        if self._timer is None and (self.max_hold or self.heartbeat_timeout):
+            self._last_seen = time.monotonic()
+            self._seen_messages = self._messages
+            self._timer = asyncio.get_running_loop().call_later(CHECK_INTERVAL, self._check)
+
+    def release_all(self, reason):
+        """Release everything held, counting each release under reason"""
+        held, self._held = self._held, {}
+        for (kind, name), (release, _) in held.items():
+            self._force_release(kind, name, release, reason)
+        self._cancel_timer()
+
+    def _force_release(self, kind, name, release, reason):
+        print(f"[~] Releasing {name} {kind} held by {self.client.address} ({reason})")
+        FORCED_RELEASES.inc(1, kind, reason)
+        self.client.lane.submit('mouseup' if kind == 'button' else 'keyup', release, name)
+        self.client.send_event({'type': 'released', 'kind': kind, 'name': name, 'reason': reason})
+
+    def _check(self):
+        self._timer = None
+        now = time.monotonic()
+        if self._messages != self._seen_messages:
+            self._seen_messages = self._messages
+            self._last_seen = now
+        if self._heartbeats and self.heartbeat_timeout and now - self._last_seen > self.heartbeat_timeout:
+            self.release_all('heartbeat')
+            return
+        if self.max_hold:
+            for key, (release, since) in list(self._held.items()):
+                if now - since > self.max_hold:
+                    del self._held[key]
+                    self._force_release(key[0], key[1], release, 'max_hold')
+        if self._held:
+            self._timer = asyncio.get_running_loop().call_later(CHECK_INTERVAL, self._check)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
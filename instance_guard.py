@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Single-Instance Guard
+Makes sure only one copy of a server runs, without scanning the process
+list. Each server name owns a loopback control port; holding it bound is
+the lock, and the OS releases it when the process dies, however it dies.
+
+A new instance that finds the port taken can take over from the old one
+without closing the listening sockets, so phones are never refused:
+
+    new -> old   "handover <name> <pid> <unix socket path or -> <key>"
+    old          passes its listening sockets to the new process: as file
+                 descriptors over the Unix socket (send_fds), or on Windows
+                 with socket.share(pid) in the reply
+    old -> new   "bye {"names": [...]}" or "bye {"shared": {name: hex}}",
+                 naming each socket "tcp:<port>" or "udp:<port>"
+    old          stops accepting, closes its phones' connections with 1012
+                 (service restart) so they reconnect at once, drains queued
+                 input, releases held buttons and exits
+    new          serves on the inherited sockets and takes the lock once the
+                 old instance lets go of it
+
+Only the same user may take over: the running instance keeps a random key
+in a file only its user can read (runtime_dir()), and ignores requests
+without it. On Linux it also checks that the Unix socket the descriptors go
+to belongs to the requesting process of the same user (SO_PEERCRED).
+"""
+
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import socket
+import struct
+import sys
+import time
+import zlib
+
+HOST = '127.0.0.1'
+# Control ports are derived from the server name within this range
+PORT_BASE = 47000
+PORT_RANGE = 1000
+
+
+def control_port(name):
+    """Loopback control port for a server name"""
+    return PORT_BASE + zlib.crc32(name.encode('utf-8')) % PORT_RANGE
+
+
+def runtime_dir():
+    """Per-user directory, private to the user, for handover keys and sockets"""
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if not base:
+        if sys.platform == 'win32':
+            base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        else:
+            base = os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'phone-remote')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if sys.platform != 'win32':
+        os.chmod(path, 0o700)
+    return path
+
+
+def listen(host, port, inherited=None):
+    """Listening TCP socket for port: the one handed over by the old instance, or a new one"""
+    sock = inherited.pop(f'tcp:{port}', None) if inherited else None
+    if sock is None:
+        # What socket.create_server does, which needs Python 3.8
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            if sys.platform != 'win32':
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+            sock.listen(128)
+        except OSError:
+            sock.close()
+            raise
+    return sock
+
+
+def socket_name(sock):
+    """Handover name of a bound socket: 'tcp:<port>' or 'udp:<port>'"""
+    kind = 'udp' if sock.type == socket.SOCK_DGRAM else 'tcp'
+    return f'{kind}:{sock.getsockname()[1]}'
+
+
+class InstanceGuard:
+    """Holds the control port of one server name"""
+
+    def __init__(self, name):
+        self.name = name
+        self.port = control_port(name)
+        # Sockets handed over by the previous instance: name -> socket
+        self.inherited = {}
+        self._sock = None
+        self._server = None
+        # Key a new instance must present to take over, once we hold the lock
+        self._key = None
+
+    def _key_path(self):
+        return os.path.join(runtime_dir(), f'prc-{self.name}.key')
+
+    def _write_key(self):
+        """Publish a fresh handover key, readable only by this user"""
+        key = secrets.token_hex(16)
+        try:
+            path = self._key_path()
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+            with os.fdopen(fd, 'w') as file:
+                if hasattr(os, 'fchmod'):
+                    os.fchmod(file.fileno(), 0o600)
+                file.write(key)
+        except OSError as e:
+            print(f"[!] No handover key ({e}); --replace won't be able to take over")
+            return
+        self._key = key
+
+    def _read_key(self):
+        try:
+            fd = os.open(self._key_path(), os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+            with os.fdopen(fd) as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if sys.platform == 'win32':
+            # Without this, another process could bind the same port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        else:
+            # Still exclusive for listening; only skips TIME_WAIT after a handover
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((HOST, self.port))
+            sock.listen(4)
+        except OSError:
+            sock.close()
+            return None
+        return sock
+
+    def acquire(self, replace=False, timeout=5.0):
+        """Take the lock; with replace, take over from a running instance first
+
+        Returns True if this process now holds the lock. Sockets handed
+        over by the old instance are left in self.inherited.
+        """
+        self._sock = self._bind()
+        if self._sock is not None:
+            self._write_key()
+            return True
+        if not replace:
+            return False
+        if not self._request_handover(timeout):
+            print(f"[!] Port {self.port} is held by something else, not a running '{self.name}' "
+                  f"of this user")
+            return False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._sock = self._bind()
+            if self._sock is not None:
+                self._write_key()
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _request_handover(self, timeout):
+        key = self._read_key()
+        if not key:
+            return False
+        receiver = None
+        path = '-'
+        if hasattr(socket, 'recv_fds'):
+            path = os.path.join(runtime_dir(), f'prc-{self.name}-{os.getpid()}.sock')
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            receiver.bind(path)
+            receiver.listen(1)
+            receiver.settimeout(timeout)
+        try:
+            with socket.create_connection((HOST, self.port), timeout=timeout) as conn:
+                conn.sendall(f"handover {self.name} {os.getpid()} {path} {key}\n".encode('utf-8'))
+                reply = conn.makefile('rb').readline().decode('utf-8', 'replace')
+            if not reply.startswith('bye'):
+                return False
+            info = json.loads(reply[3:].strip() or '{}')
+            if 'names' in info and receiver is not None:
+                unix, _ = receiver.accept()
+                with unix:
+                    _, fds, _, _ = socket.recv_fds(unix, 1024, len(info['names']))
+                for name, fd in zip(info['names'], fds):
+                    self.inherited[name] = socket.socket(fileno=fd)
+            for name, shared in info.get('shared', {}).items():
+                self.inherited[name] = socket.fromshare(bytes.fromhex(shared))
+        except (OSError, ValueError):
+            return False
+        finally:
+            if receiver is not None:
+                receiver.close()
+                os.unlink(path)
+        print(f"[!] Took over from the running '{self.name}' instance "
+              f"({len(self.inherited)} socket(s) inherited)")
+        return True
+
+    def _hand_over(self, sockets, pid, path):
+        """Give the sockets (name -> socket) to process pid; returns the reply info"""
+        names = list(sockets)
+        if not names:
+            return {}
+        if path != '-' and hasattr(socket, 'send_fds'):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as unix:
+                unix.connect(path)
+                _check_peer(unix, pid)
+                socket.send_fds(unix, [b'prc'], [sockets[name].fileno() for name in names])
+            return {'names': names}
+        if hasattr(socket.socket, 'share'):
+            return {'shared': {name: sockets[name].share(pid).hex() for name in names}}
+        return {}
+
+    async def serve(self, on_handover, sockets=None):
+        """Answer handover requests on the running loop
+
+        sockets lists the bound sockets to pass to the new instance;
+        on_handover() then starts this instance's shutdown.
+        """
+        async def handle(reader, writer):
+            try:
+                line = await asyncio.wait_for(reader.readline(), 2.0)
+                parts = line.decode('utf-8', 'replace').split()
+                if len(parts) != 5 or parts[0] != 'handover' or parts[1] != self.name:
+                    return
+                key = parts[4].encode('utf-8')
+                if self._key is None or not hmac.compare_digest(key, self._key.encode('utf-8')):
+                    print("[!] Ignored a handover request without the right key")
+                    return
+                named = {socket_name(sock): sock for sock in sockets or ()}
+                info = self._hand_over(named, int(parts[2]), parts[3])
+                print("[!] Another instance is taking over, shutting down")
+                # The new instance owns the lock from here on
+                self.release()
+                on_handover()
+                writer.write(f"bye {json.dumps(info)}\n".encode('utf-8'))
+                await writer.drain()
+            except (asyncio.TimeoutError, OSError, ValueError) as e:
+                print(f"[!] Handover failed: {e}")
+            finally:
+                writer.close()
+
+        self._server = await asyncio.start_server(handle, sock=self._sock)
+
+    def release(self):
+        """Give up the lock"""
+        if self._key is not None:
+            # Before the lock goes, so the next holder's key is never removed
+            self._key = None
+            try:
+                os.unlink(self._key_path())
+            except OSError:
+                pass
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def _check_peer(unix, pid):
+    """Refuse to pass descriptors to a Unix socket not owned by pid of this user"""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return
+    creds = unix.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    peer_pid, peer_uid, _ = struct.unpack('3i', creds)
+    if peer_uid != os.getuid() or peer_pid != pid:
+        raise PermissionError(f"handover socket belongs to pid {peer_pid}, uid {peer_uid}")
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Event Journal
+Always-on record of what the phones sent, for reports like "the cursor
+lagged and then jumped". Every accepted message is appended to a
+memory-mapped ring file as it came off the wire: the binary frame or the
+JSON text, in one fixed-size record (plus continuations for long ones).
+Nothing is serialized on the hot path; the tools below decode the records.
+Appending is a struct.pack_into on the event loop, with no syscall or flush.
+The injector thread stamps the dispatch time into the same record when it
+runs the command. The OS writes the pages back, so the journal survives a
+crash of the server.
+
+Header (64 bytes, little-endian):
+
+    magic       4 bytes  b'PRCJ'
+    version     uint16
+    record size uint16   RECORD_SIZE
+    capacity    uint32   records in the ring
+    next        uint64   index of the next record (slot = index % capacity)
+    origin      float64  wall-clock time when the ring was created
+    origin_ns   uint64   time.monotonic_ns() at that moment (same clock as
+                         the records, only meaningful until the PC reboots)
+
+Record (64 bytes):
+
+    recv_ns     uint64   time.monotonic_ns() when the command arrived
+    dispatch_ns uint64   when the injector ran it (for a batch, the last of
+                         its commands to run); 0 if it never did (merged
+                         into an earlier move, dropped, denied, or a command
+                         that doesn't inject)
+    client_ts   uint32   the phone's timestamp (timing trailer), 0 if none
+    seq         uint16   the phone's sequence number, 0 if none
+    client      uint16   session id of the phone
+    address     16 bytes IPv6 address of the phone (IPv4 as ::ffff:a.b.c.d)
+    kind        uint8    1 binary frame, 2 JSON text, 3 continuation of the
+                         previous record's payload
+    length      uint8    payload bytes used
+    payload     22 bytes the message (protocol.py frame or JSON)
+
+One process writes a ring at a time: the file is locked while open. A server
+started with --replace waits for the instance it replaces to finish and
+then continues the ring. Commands that arrive over the UDP motion channel
+are not journaled. The text of type commands is stored masked (one '*' per
+character), and the file is created readable only by its owner.
+
+    python journal.py dump prc.journal [--trace]   # records, or a bench_load.py trace
+    python journal.py stalls prc.journal --top 10  # slowest arrival-to-injection
+    python journal.py replay prc.journal --speed 4 # rerun against the fake backend
+"""
+
+import asyncio
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+import protocol
+
+MAGIC = b'PRCJ'
+VERSION = 2
+RECORD_SIZE = 64
+# Records in a new ring (4 MiB)
+DEFAULT_CAPACITY = 65536
+
+
+def _state_dir():
+    """Per-user directory for journals, so other accounts can't read them"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(base, 'phone-remote')
+
+
+DEFAULT_PATH = os.path.join(_state_dir(), 'phone-remote.journal')
+# Typed text is journaled as this character repeated, keeping only its length
+REDACTED = '*'
+
+KIND_BINARY = 1
+KIND_JSON = 2
+KIND_MORE = 3
+
+_HEADER = struct.Struct('<4sHHIQdQ')
+_NEXT_OFFSET = 12
+HEADER_SIZE = 64
+_RECORD = struct.Struct('<QQIHH16sBB')
+_DISPATCH_OFFSET = 8
+PAYLOAD_SIZE = RECORD_SIZE - _RECORD.size
+_NO_ADDRESS = bytes(16)
+# Byte locked on Windows, past the end of any journal so it never covers the mapping
+_LOCK_OFFSET = 1 << 40
+# Seconds between attempts to lock a journal another process has open
+_LOCK_POLL = 0.05
+
+
+class Journal:
+    """Ring of fixed-size command records in a memory-mapped file
+
+    Opening waits up to wait seconds for another process to close the file,
+    then raises BlockingIOError.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, capacity=DEFAULT_CAPACITY, wait=0.0):
+        self.path = path
+        size = HEADER_SIZE + capacity * RECORD_SIZE
+        self._file = _open_private(path)
+        try:
+            _lock(self._file, wait)
+        except OSError:
+            self._file.close()
+            raise
+        self._file.seek(0, os.SEEK_END)
+        existing = self._file.tell()
+        if existing != size:
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        header = _HEADER.unpack_from(self._map, 0)
+        if (existing == size and header[:4] == (MAGIC, VERSION, RECORD_SIZE, capacity)
+                and header[6] <= time.monotonic_ns()):
+            # Keep appending to the ring a previous instance left (since the last reboot)
+            self.next = header[4]
+        else:
+            _HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD_SIZE, capacity, 0,
+                              time.time(), time.monotonic_ns())
+            self.next = 0
+        self.capacity = capacity
+        self._addresses = {}
+
+    def append(self, client, payload, binary, seq=None, ts=None):
+        """Record one message (bytes); returns its index for mark_dispatched
+
+        The text of type commands is masked (see _redact).
+        """
+        index = self.next
+        if not binary and b'"text"' in payload:
+            payload = _redact(payload)
+        address = self._addresses.get(client.address)
+        if address is None:
+            address = self._addresses[client.address] = _pack_address(client.address)
+        kind = KIND_BINARY if binary else KIND_JSON
+        recv_ns = time.monotonic_ns()
+        client_id = (client.session_id or 0) & 0xFFFF
+        seq = (seq or 0) & 0xFFFF
+        ts = int(ts or 0) & 0xFFFFFFFF
+        mapping = self._map
+        while True:
+            offset = HEADER_SIZE + (self.next % self.capacity) * RECORD_SIZE
+            chunk = payload[:PAYLOAD_SIZE]
+            _RECORD.pack_into(mapping, offset, recv_ns, 0, ts, seq, client_id, address, kind, len(chunk))
+            start = offset + _RECORD.size
+            mapping[start:start + len(chunk)] = chunk
+            self.next += 1
+            payload = payload[PAYLOAD_SIZE:]
+            if not payload:
+                break
+            kind = KIND_MORE
+        struct.pack_into('<Q', mapping, _NEXT_OFFSET, self.next)
+        return index
+
+    def mark_dispatched(self, index, monotonic):
+        """Stamp the injection time (time.monotonic() seconds) into record index"""
+        mapping = self._map
+        if mapping is None or index < self.next - self.capacity:
+            # Closed, or the record was overwritten already
+            return
+        offset = HEADER_SIZE + (index % self.capacity) * RECORD_SIZE + _DISPATCH_OFFSET
+        try:
+            struct.pack_into('<Q', mapping, offset, int(monotonic * 1e9))
+        except ValueError:
+            # Closed by the event loop since the check above
+            pass
+
+    def close(self):
+        """Unmap the ring and let another process open it"""
+        if self._map is not None:
+            mapping, self._map = self._map, None
+            mapping.flush()
+            mapping.close()
+            # Closing the file drops the lock
+            self._file.close()
+
+
+def _open_private(path):
+    """Open or create a journal readable only by this user, refusing links"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0) | getattr(os, 'O_BINARY', 0)
+    fd = os.open(path, flags, 0o600)
+    try:
+        if hasattr(os, 'getuid'):
+            status = os.fstat(fd)
+            if status.st_uid != os.getuid() or status.st_nlink != 1:
+                raise PermissionError(f"{path} belongs to another user or is a hard link")
+            # An existing file may predate the 0600 default
+            os.fchmod(fd, 0o600)
+        return os.fdopen(fd, 'r+b')
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+def _redact(payload):
+    """JSON message (bytes) with the text of its type commands masked"""
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        return payload
+    events = [message]
+    if isinstance(message, dict) and message.get('type') == 'batch' and isinstance(message.get('events'), list):
+        events = message['events']
+    for event in events:
+        if isinstance(event, dict) and isinstance(event.get('text'), str):
+            event['text'] = REDACTED * len(event['text'])
+    return json.dumps(message, separators=(',', ':')).encode('utf-8')
+
+
+def _lock(file, wait):
+    """Lock an open journal for this process, waiting up to wait seconds"""
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            if sys.platform == 'win32':
+                import msvcrt
+                file.seek(_LOCK_OFFSET)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise BlockingIOError(f"{file.name} is open in another process")
+        time.sleep(_LOCK_POLL)
+
+
+def _pack_address(address):
+    """16-byte form of an IPv4 or IPv6 address string; zeros if it isn't one"""
+    try:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+    except ValueError:
+        return _NO_ADDRESS
+    if ip.version == 4:
+        ip = ipaddress.IPv6Address('::ffff:' + str(ip))
+    return ip.packed
+
+
+def _unpack_address(packed):
+    ip = ipaddress.IPv6Address(packed)
+    return str(ip.ipv4_mapped or ip)
+
+
+def read_journal(path):
+    """(header dict, commands) of a journal file, oldest command first
+
+    Each command is a dict with recv_ns, dispatch_ns, client, address,
+    seq, ts, message (as received: bytes for a binary frame, else str) and
+    cmd (the message decoded into a JSON command, a batch for several).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, record_size, capacity, next_index, origin, origin_ns = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"{path} is not a journal this version can read")
+    header = {'capacity': capacity, 'records': next_index, 'origin': origin, 'origin_ns': origin_ns}
+    commands = []
+    current = None
+    for index in range(max(0, next_index - capacity), next_index):
+        offset = HEADER_SIZE + (index % capacity) * RECORD_SIZE
+        recv_ns, dispatch_ns, ts, seq, client, address, kind, length = _RECORD.unpack_from(data, offset)
+        payload = data[offset + _RECORD.size:offset + _RECORD.size + length]
+        if kind == KIND_MORE:
+            if current is not None:
+                current['payload'] += payload
+            continue
+        current = {'recv_ns': recv_ns, 'dispatch_ns': dispatch_ns, 'client': client,
+                   'address': _unpack_address(address), 'seq': seq, 'ts': ts,
+                   'kind': kind, 'payload': payload}
+        commands.append(current)
+    for command in commands:
+        payload = command.pop('payload')
+        try:
+            if command.pop('kind') == KIND_BINARY:
+                command['message'] = payload
+                command['cmd'] = protocol.decode(payload)
+            else:
+                command['message'] = payload.decode('utf-8')
+                command['cmd'] = json.loads(command['message'])
+        except ValueError:
+            # The start of a long command was overwritten by the ring
+            command['cmd'] = None
+    return header, [command for command in commands if command['cmd'] is not None]
+
+
+def _wall_time(header, recv_ns):
+    return header['origin'] + (recv_ns - header['origin_ns']) / 1e9
+
+
+def dump(args):
+    header, commands = read_journal(args.journal)
+    if not commands:
+        return
+    first = commands[0]['recv_ns']
+    for command in commands:
+        t = (command['recv_ns'] - first) / 1e9
+        if args.trace:
+            # bench_load.py --trace format
+            print(json.dumps({'t': round(t, 6), 'cmd': command['cmd']}))
+            continue
+        delay = (command['dispatch_ns'] - command['recv_ns']) / 1e6 if command['dispatch_ns'] else None
+        stamp = time.strftime('%H:%M:%S', time.localtime(_wall_time(header, command['recv_ns'])))
+        print(f"{stamp} +{t:10.4f}s  {command['address']:>15} #{command['client']:<3} "
+              f"{'     -' if delay is None else f'{delay:6.1f}'} ms  {json.dumps(command['cmd'])}")
+
+
+def stalls(args):
+    header, commands = read_journal(args.journal)
+    dispatched = [c for c in commands if c['dispatch_ns']]
+    dispatched.sort(key=lambda c: c['dispatch_ns'] - c['recv_ns'], reverse=True)
+    print(f"{len(commands)} commands, {len(dispatched)} injected")
+    for command in dispatched[:args.top]:
+        delay = (command['dispatch_ns'] - command['recv_ns']) / 1e6
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_wall_time(header, command['recv_ns'])))
+        print(f"  {delay:8.1f} ms  {stamp}  {command['address']} #{command['client']}  "
+              f"{json.dumps(command['cmd'])}")
+
+
+class _ReplayConnection:
+    """Stands in for a phone's WebSocket during a replay"""
+
+    def __init__(self, address):
+        self.remote_address = (address, 0)
+
+    async def send(self, message):
+        pass
+
+
+async def _replay(commands, speed, registry, input_injector):
+    from clients import RemoteClient
+
+    replay_clients = {}
+    start = time.monotonic()
+    first = commands[0]['recv_ns']
+    for command in commands:
+        if speed > 0:
+            due = start + (command['recv_ns'] - first) / 1e9 / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        key = (command['address'], command['client'])
+        client = replay_clients.get(key)
+        if client is None:
+            client = replay_clients[key] = RemoteClient(_ReplayConnection(command['address']), input_injector)
+            client.session_id = command['client']
+        registry.dispatch_message(command['message'], client)
+    for client in replay_clients.values():
+        client.lane.close()
+    return time.monotonic() - start
+
+
+def _delays(commands):
+    """Arrival-to-injection delays in ms, sorted"""
+    return sorted((c['dispatch_ns'] - c['recv_ns']) / 1e6 for c in commands if c['dispatch_ns'])
+
+
+def _summary(delays):
+    if not delays:
+        return "nothing injected"
+    p50 = delays[len(delays) // 2]
+    p99 = delays[min(len(delays) - 1, int(len(delays) * 0.99))]
+    return f"p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   max {delays[-1]:7.1f} ms"
+
+
+def replay(args):
+    """Feed a journal through the command registry and injector with the fake backend
+
+    The replay is journaled too (to --out, or a temporary file), so its
+    arrival-to-injection delays can be compared with the recording.
+    """
+    from backends import RecordingBackend
+    from commands import create_registry
+    from injector import InputInjector
+    from monitors import layout
+
+    _, commands = read_journal(args.journal)
+    if not commands:
+        print("Journal is empty")
+        return
+    out = args.out or os.path.join(_state_dir(), f'replay-{os.getpid()}.journal')
+    replay_journal = Journal(out, max(DEFAULT_CAPACITY, len(commands) * 2))
+    backend = RecordingBackend(delay=args.delay)
+    input_injector = InputInjector(move_hz=args.move_hz)
+    input_injector.journal = replay_journal
+    registry = create_registry(backend)
+    registry.journal = replay_journal
+    # Absolute moves need the layout; the servers query it in the background
+    layout.ensure()
+    input_injector.start()
+    span = (commands[-1]['recv_ns'] - commands[0]['recv_ns']) / 1e9
+    try:
+        elapsed = asyncio.run(_replay(commands, args.speed, registry, input_injector))
+        input_injector.stop(timeout=60.0)
+    finally:
+        replay_journal.close()
+    _, replayed = read_journal(out)
+    if not args.out:
+        os.unlink(out)
+    print(f"Replayed {len(commands)} commands ({span:.2f} s recorded) in {elapsed:.2f} s "
+          f"at {'full speed' if args.speed <= 0 else f'{args.speed:g}x'}")
+    print(f"Backend calls:  {len(backend.take())}")
+    print("Arrival to injection:")
+    print(f"  recorded      {_summary(_delays(commands))}")
+    print(f"  replayed      {_summary(_delays(replayed))}")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or replay a phone remote control journal")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    parser_dump = subcommands.add_parser('dump', help="print the journaled commands")
+    parser_dump.add_argument('journal', nargs='?', default=DEFAULT_PATH)
+    parser_dump.add_argument('--trace', action='store_true',
+                             help="print a bench_load.py --trace file instead")
+    parser_stalls = subcommands.add_parser('stalls', help="commands that waited longest to be injected")
+    parser_stalls.add_argument('journal', nargs='?', default=DEFAULT_PATH)
+    parser_stalls.add_argument('--top', type=int, default=10)
+    parser_replay = subcommands.add_parser('replay', help="replay against the fake input backend")
+    parser_replay.add_argument('journal', nargs='?', default=DEFAULT_PATH)
+    parser_replay.add_argument('--speed', type=float, default=1.0,
+                               help="replay speed relative to the recording (0 = as fast as possible)")
+    parser_replay.add_argument('--delay', type=float, default=0.0,
+                               help="simulated cost of each input call in seconds")
+    parser_replay.add_argument('--move-hz', type=float, default=120,
+                               help="rate at which coalesced motion is applied, as on the server")
+    parser_replay.add_argument('--out', help="keep the replay's own journal in this file")
+    args = parser.parse_args()
+    {'dump': dump, 'stalls': stalls, 'replay': replay}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Link Monitor
+Application-level ping/pong on the control WebSocket. The server sends
+
+    {"type": "ping", "id": n, "rtt": ms, "jitter": ms}
+
+every PING_INTERVAL, and the phone answers {"type": "pong", "id": n}.
+Round-trip samples feed a smoothed RTT and a jitter estimate (RFC 6298
+SRTT/RTTVAR), reported back in the next ping so the phone can adapt: above
+its lag threshold it drops stale motion instead of queueing it behind a
+slow link. Pings also let the phone notice a dead connection in seconds.
+
+Pongs count as heartbeats for the stuck-input watchdog (input_state.py).
+Per-client link stats are served on /status and in /metrics.
+"""
+
+import asyncio
+import time
+
+import metrics
+
+# Seconds between pings
+PING_INTERVAL = 1.0
+# Unanswered pings kept for matching late pongs
+MAX_OUTSTANDING = 8
+
+RTT = metrics.registry.histogram(
+    'prc_rtt_seconds', 'Control channel round-trip time from ping/pong')
+CLIENT_RTT = metrics.registry.gauge(
+    'prc_client_rtt_ms', 'Smoothed round-trip time per connection', ('client',))
+CLIENT_JITTER = metrics.registry.gauge(
+    'prc_client_jitter_ms', 'Round-trip time variation per connection', ('client',))
+PINGS_LOST = metrics.registry.counter(
+    'prc_pings_lost_total', 'Pings that were never answered')
+
+
+class LinkMonitor:
+    """Pings one client and keeps its RTT and jitter estimates"""
+
+    def __init__(self, client, interval=PING_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self.srtt = None
+        self.rttvar = None
+        self.last_rtt = None
+        self.pings = 0
+        self.pongs = 0
+        self.lost = 0
+        self._seq = 0
+        self._outstanding = {}
+        self._task = None
+
+    def start(self):
+        """Start pinging on the running loop"""
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        CLIENT_RTT.remove(self.client.address)
+        CLIENT_JITTER.remove(self.client.address)
+
+    async def _run(self):
+        while True:
+            self._seq = (self._seq + 1) & 0xFFFFFFFF
+            self._outstanding[self._seq] = time.monotonic()
+            if len(self._outstanding) > MAX_OUTSTANDING:
+                del self._outstanding[next(iter(self._outstanding))]
+                self.lost += 1
+                PINGS_LOST.inc()
+            self.pings += 1
+            self.client.send_event({'type': 'ping', 'id': self._seq,
+                                    'rtt': _ms(self.srtt), 'jitter': _ms(self.rttvar)})
+            await asyncio.sleep(self.interval)
+
+    def on_pong(self, seq):
+        """Match a pong to its ping and update the estimates"""
+        sent = self._outstanding.pop(seq, None)
+        if sent is None:
+            return
+        rtt = time.monotonic() - sent
+        self.pongs += 1
+        self.last_rtt = rtt
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        RTT.observe(rtt)
+        CLIENT_RTT.set(_ms(self.srtt), self.client.address)
+        CLIENT_JITTER.set(_ms(self.rttvar), self.client.address)
+
+    def status(self):
+        """Link stats for /status"""
+        return {
+            'rtt_ms': _ms(self.srtt),
+            'jitter_ms': _ms(self.rttvar),
+            'last_rtt_ms': _ms(self.last_rtt),
+            'pings': self.pings,
+            'pongs': self.pongs,
+            'lost': self.lost,
+            'unanswered': len(self._outstanding),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000.0, 1)
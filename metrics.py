@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Latency Metrics
+Minimal thread-safe counters, gauges and histograms rendered in the
+Prometheus text format for the /metrics route. Samples come from the event
+loop (frame receipt) and the injector thread (queue delay, injection time).
+"""
+
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 255)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def remove(self, *labels):
+        """Drop the series for these label values"""
+        with self._lock:
+            self._values.pop(labels, None)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_series(labels, value))
+        return lines
+
+    def _render_series(self, labels, value):
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {value}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, labels, series):
+        counts, total, count = series
+        names = self.labelnames + ('le',)
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}')
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_text} {total}')
+        lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        return self._add(Histogram(name, help_text, buckets, labelnames))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition of all metrics"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+QUEUE_DELAY = registry.histogram(
+    'prc_queue_delay_seconds', 'Time from enqueue to injection start, by command',
+    labelnames=('command',))
+INJECT_DURATION = registry.histogram(
+    'prc_inject_duration_seconds', 'Time spent in the input backend, by command',
+    labelnames=('command',))
+# Counters aren't labelled by client: addresses come and go, series would pile up
+MESSAGES = registry.counter(
+    'prc_messages_total', 'Command frames received')
+INVALID_MESSAGES = registry.counter(
+    'prc_invalid_messages_total', 'Command frames rejected as malformed or unknown')
+CLIENT_RATE = registry.histogram(
+    'prc_client_messages_per_second', 'Per-client message rate, sampled each second',
+    RATE_BUCKETS)
+CLIENT_CURRENT_RATE = registry.gauge(
+    'prc_client_current_messages_per_second', 'Message rate over the last full second, by client',
+    ('client',))
+CLIENT_DELAY = registry.histogram(
+    'prc_client_delay_seconds', 'Client timestamp to receipt, above the lowest delay seen for that client')
+BATCH_SIZE = registry.histogram(
+    'prc_batch_events', 'Events per batch frame', SIZE_BUCKETS)
+SEQUENCE_GAPS = registry.counter(
+    'prc_client_sequence_gaps_total', 'Frames that arrived with an unexpected sequence number')
+
+
+def render():
+    """Prometheus text exposition of the default registry"""
+    return registry.render()
+
+
+class ClientStats:
+    """Per-connection message rate and client timing bookkeeping"""
+
+    def __init__(self, client):
+        self.client = client
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._last_seq = None
+        self._min_offset = None
+
+    def on_message(self):
+        """Count one received frame"""
+        MESSAGES.inc()
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            rate = self._window_count / (now - self._window_start)
+            CLIENT_RATE.observe(rate)
+            CLIENT_CURRENT_RATE.set(round(rate, 1), self.client)
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+
+    def on_timing(self, seq, ts):
+        """Record the optional client sequence number and timestamp (ms) of a frame
+
+        Client and server clocks aren't synchronised, so delay is reported
+        relative to the smallest clock offset seen on this connection.
+        """
+        if seq is not None:
+            seq &= 0xFFFF
+            if self._last_seq is not None and seq != (self._last_seq + 1) & 0xFFFF:
+                SEQUENCE_GAPS.inc()
+            self._last_seq = seq
+        if ts is not None:
+            # 32-bit wrapping millisecond difference
+            offset = (int(time.time() * 1000) - int(ts)) & 0xFFFFFFFF
+            if offset >= 0x80000000:
+                offset -= 0x100000000
+            if self._min_offset is None or offset < self._min_offset:
+                self._min_offset = offset
+            CLIENT_DELAY.observe((offset - self._min_offset) / 1000.0)
+
+    def close(self):
+        CLIENT_CURRENT_RATE.remove(self.client)
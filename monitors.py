@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Monitor Layout
+The PC's monitor rectangles, for absolute pointer mode. Phones send a
+position within the touchpad (0..1 on each axis) and the server maps it onto
+one monitor or the whole virtual desktop, then sets the cursor there with a
+single call: no cursor-position read per move, and no error building up
+over a long drag the way it does with relative motion.
+
+The layout is queried in the background, off the event loop and the input
+thread, and only while it is needed: once when a phone first asks for it,
+then every REFRESH_INTERVAL seconds while absolute positions keep arriving,
+telling listeners (the servers, which tell the phones) when it changed, e.g.
+after plugging in a monitor. After IDLE_STOP seconds without one the queries
+stop, and the next position restarts them. Mapping a position only reads
+the cache; until the first query has finished there is nothing to map onto.
+
+    Windows     EnumDisplayMonitors (primary monitor first)
+    Linux/X11   xrandr --listmonitors
+    otherwise   pyautogui.size() as a single monitor
+"""
+
+import asyncio
+import collections
+import math
+import re
+import subprocess
+import sys
+import time
+
+# Seconds between layout checks while absolute mode is in use
+REFRESH_INTERVAL = 3.0
+# Stop checking this long after the last absolute position (seconds)
+IDLE_STOP = 30.0
+# Used when nothing can be queried
+DEFAULT_SIZE = (1920, 1080)
+
+Monitor = collections.namedtuple('Monitor', 'x y width height primary')
+
+_XRANDR_MONITOR = re.compile(r'^\s*\d+:\s+\+?(\*?)\S*\s+(\d+)/\d+x(\d+)/\d+([+-]\d+)([+-]\d+)')
+
+
+def _query_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class MONITORINFO(ctypes.Structure):
+        _fields_ = [('cbSize', wintypes.DWORD), ('rcMonitor', wintypes.RECT),
+                    ('rcWork', wintypes.RECT), ('dwFlags', wintypes.DWORD)]
+
+    user32 = ctypes.windll.user32
+    monitors = []
+    callback_type = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HMONITOR, wintypes.HDC,
+                                       ctypes.POINTER(wintypes.RECT), wintypes.LPARAM)
+
+    def callback(handle, hdc, rect, data):
+        info = MONITORINFO()
+        info.cbSize = ctypes.sizeof(MONITORINFO)
+        if user32.GetMonitorInfoW(handle, ctypes.byref(info)):
+            r = info.rcMonitor
+            # MONITORINFOF_PRIMARY
+            monitors.append(Monitor(r.left, r.top, r.right - r.left, r.bottom - r.top,
+                                    bool(info.dwFlags & 1)))
+        return True
+
+    user32.EnumDisplayMonitors(None, None, callback_type(callback), 0)
+    return monitors
+
+
+def _query_xrandr():
+    output = subprocess.run(['xrandr', '--listmonitors'], capture_output=True, text=True,
+                            timeout=2.0).stdout
+    monitors = []
+    for line in output.splitlines():
+        match = _XRANDR_MONITOR.match(line)
+        if match:
+            primary, width, height, x, y = match.groups()
+            monitors.append(Monitor(int(x), int(y), int(width), int(height), primary == '*'))
+    return monitors
+
+
+def _query_pyautogui():
+    import pyautogui
+    width, height = pyautogui.size()
+    return [Monitor(0, 0, width, height, True)]
+
+
+def query_monitors():
+    """Current monitor rectangles, primary first; never empty"""
+    queries = [_query_windows] if sys.platform == 'win32' else [_query_xrandr]
+    queries.append(_query_pyautogui)
+    for query in queries:
+        try:
+            monitors = query()
+        except Exception:
+            continue
+        if monitors:
+            return sorted(monitors, key=lambda m: not m.primary)
+    return [Monitor(0, 0, DEFAULT_SIZE[0], DEFAULT_SIZE[1], True)]
+
+
+def bounding_rect(monitors):
+    """The virtual desktop: smallest rectangle containing every monitor"""
+    left = min(m.x for m in monitors)
+    top = min(m.y for m in monitors)
+    right = max(m.x + m.width for m in monitors)
+    bottom = max(m.y + m.height for m in monitors)
+    return Monitor(left, top, right - left, bottom - top, False)
+
+
+class MonitorLayout:
+    """Cached monitor layout with change notification"""
+
+    def __init__(self, query=query_monitors):
+        self._query = query
+        self.monitors = ()
+        self.desktop = None
+        self._listeners = []
+        self._waiting = []
+        self._loop = None
+        self._interval = REFRESH_INTERVAL
+        self._task = None
+        self._last_used = 0.0
+
+    @property
+    def ready(self):
+        """True once the layout has been queried"""
+        return self.desktop is not None
+
+    def refresh(self):
+        """Query the layout again; returns True if it changed"""
+        monitors = tuple(self._query())
+        if monitors == self.monitors:
+            return False
+        # Replace both at once; the input thread reads them without locking
+        self.monitors, self.desktop = monitors, bounding_rect(monitors)
+        return True
+
+    def ensure(self):
+        """Query the layout if it hasn't been yet; blocks, so only for tools and startup"""
+        if self.desktop is None:
+            self.refresh()
+        return self
+
+    def rect(self, monitor=-1):
+        """Rectangle of monitor (index into monitors); the whole desktop for -1 or out of range
+
+        None until the layout is ready.
+        """
+        monitors = self.monitors
+        if 0 <= monitor < len(monitors):
+            return monitors[monitor]
+        return self.desktop
+
+    def to_pixels(self, x, y, monitor=-1):
+        """Desktop pixel for position (x, y) in 0..1 on a monitor, or None until the layout is ready
+
+        Keeps the background refresh going once start() has been called
+        (call it on the event loop then).
+        """
+        self._last_used = time.monotonic()
+        self._wake()
+        rect = self.rect(monitor)
+        if rect is None:
+            return None
+        return (rect.x + int(round(_unit(x) * (rect.width - 1))),
+                rect.y + int(round(_unit(y) * (rect.height - 1))))
+
+    def describe(self):
+        """The layout as sent to phones; only meaningful once ready"""
+        return {
+            'type': 'monitors',
+            'monitors': [m._asdict() for m in self.monitors],
+            'desktop': self.desktop._asdict() if self.desktop is not None else None,
+        }
+
+    def when_ready(self, callback):
+        """Call callback() once the layout is known: now, or after the first background query"""
+        if self.ready:
+            callback()
+        else:
+            self._waiting.append(callback)
+            self._wake()
+
+    def on_change(self, callback):
+        """Call callback() on the event loop whenever the layout changes"""
+        self._listeners.append(callback)
+
+    def start(self, interval=REFRESH_INTERVAL):
+        """Refresh in the background on the running loop when the layout is used"""
+        self._loop = asyncio.get_running_loop()
+        self._interval = interval
+
+    def stop(self):
+        self._loop = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _wake(self):
+        if self._task is None and self._loop is not None:
+            self._task = self._loop.create_task(self._watch())
+
+    async def _watch(self):
+        try:
+            while True:
+                # xrandr and EnumDisplayMonitors block; keep them off the loop and the input thread
+                if await self._loop.run_in_executor(None, self.refresh):
+                    sizes = ', '.join(f'{m.width}x{m.height}' for m in self.monitors)
+                    print(f"[~] Monitor layout: {sizes}")
+                    for callback in self._listeners:
+                        callback()
+                waiting, self._waiting = self._waiting, []
+                for callback in waiting:
+                    callback()
+                if time.monotonic() - self._last_used > IDLE_STOP:
+                    break
+                await asyncio.sleep(self._interval)
+        finally:
+            self._task = None
+
+
+def _unit(value):
+    """Clamp to 0..1; NaN counts as 0"""
+    if not math.isfinite(value):
+        return 0.0 if math.isnan(value) else float(value > 0)
+    return min(max(value, 0.0), 1.0)
+
+
+# Shared by the servers and the backends that need the desktop size
+layout = MonitorLayout()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Page Cache
+Keeps the interface pages in memory with precompressed gzip (and brotli, if
+the 'brotli' package is installed) bodies and strong ETags. Pages are sent
+with Cache-Control: no-cache, so the phone revalidates on every load and
+gets a 304 while the page is unchanged, but never keeps running an old
+interface after the server is updated. File-backed pages can be polled and reloaded when they change.
+"""
+
+import asyncio
+import gzip
+import hashlib
+from pathlib import Path
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Default Cache-Control max-age for pages (seconds); 0 sends no-cache
+DEFAULT_MAX_AGE = 0
+
+
+class CachedPage:
+    """One page body with its precompressed variants and ETag"""
+
+    def __init__(self, body, content_type, path=None):
+        self.content_type = content_type
+        self.path = path
+        self.mtime = path.stat().st_mtime if path is not None else None
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # encoding -> (body, etag); each representation gets its own strong ETag
+        self.variants = {'identity': (body, f'"{digest}"')}
+        self.variants['gzip'] = (gzip.compress(body, 9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names any representation of this page"""
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag in self.etags:
+                return True
+        return False
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PageCache:
+    """In-memory HTML pages served with ETag, 304 and content-encoding negotiation"""
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self._pages = {}
+
+    def add_text(self, name, text, content_type='text/html'):
+        """Cache an in-memory page"""
+        self._pages[name] = CachedPage(text.encode('utf-8'), content_type)
+
+    def add_file(self, name, path, content_type='text/html'):
+        """Cache a page read from disk; returns False if the file doesn't exist"""
+        path = Path(path)
+        try:
+            self._pages[name] = CachedPage(path.read_bytes(), content_type, path)
+            return True
+        except FileNotFoundError:
+            self._pages.pop(name, None)
+            return False
+
+    def get(self, name):
+        return self._pages.get(name)
+
+    def reload_changed(self):
+        """Re-read file-backed pages whose modification time changed; returns their names"""
+        reloaded = []
+        for name, page in list(self._pages.items()):
+            if page.path is None:
+                continue
+            try:
+                mtime = page.path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime != page.mtime and self.add_file(name, page.path, page.content_type):
+                reloaded.append(name)
+        return reloaded
+
+    async def watch(self, interval=1.0):
+        """Poll file-backed pages and reload them when they change"""
+        while True:
+            await asyncio.sleep(interval)
+            for name in self.reload_changed():
+                print(f"[~] Reloaded {self._pages[name].path.name}")
+
+    def response(self, request, name):
+        """Build the response for a cached page, or None if it isn't cached"""
+        page = self._pages.get(name)
+        if page is None:
+            return None
+        encoding = 'identity'
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        if 'br' in accepted and 'br' in page.variants:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        body, etag = page.variants[encoding]
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={self.max_age}' if self.max_age > 0 else 'no-cache',
+            'Vary': 'Accept-Encoding',
+        }
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and page.matches(if_none_match):
+            return web.Response(status=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return web.Response(body=body, content_type=page.content_type, charset='utf-8',
+                            headers=headers)
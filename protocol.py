@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Binary Wire Protocol
+Compact fixed-size frames for the high-rate commands, negotiated with the
+'prc.bin.v1' WebSocket subprotocol. JSON text frames remain valid on every
+connection, so clients that don't speak binary keep working.
+
+Frame layout (little-endian), first byte is the opcode:
+    0x01 mouse_move   int16 dx, int16 dy           5 bytes
+    0x02 click        uint8 button, uint8 double   3 bytes
+    0x03 mousedown    uint8 button                 2 bytes
+    0x04 mouseup      uint8 button                 2 bytes
+    0x05 scroll       int16 dy                     3 bytes
+    0x06 touch        uint8 phase, uint8 pointer,  11 bytes
+                      int16 x, int16 y, uint32 t
+    0x07 batch        uint8 count, then count      2 + frames
+                      frames of the other types
+    0x08 scroll_touch uint8 phase, int16 x,        6 bytes
+                      int16 y
+    0x09 mouse_abs    int8 monitor, uint16 x,      6 bytes
+                      uint16 y
+
+A batch is applied as a unit: either every frame in it is valid and all are
+queued together, or the whole batch is rejected.
+
+Any frame may carry an optional 6-byte timing trailer: uint16 sequence
+number and uint32 client timestamp in milliseconds (wrapping).
+"""
+
+import struct
+
+SUBPROTOCOL_BINARY = 'prc.bin.v1'
+SUBPROTOCOL_JSON = 'prc.json.v1'
+SUBPROTOCOLS = [SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON]
+
+OP_MOUSE_MOVE = 0x01
+OP_CLICK = 0x02
+OP_MOUSEDOWN = 0x03
+OP_MOUSEUP = 0x04
+OP_SCROLL = 0x05
+OP_TOUCH = 0x06
+OP_BATCH = 0x07
+OP_SCROLL_TOUCH = 0x08
+OP_MOUSE_ABS = 0x09
+
+# Most events in one batch (binary count is a uint8)
+MAX_BATCH = 255
+
+BUTTONS = ('left', 'right', 'middle')
+BUTTON_CODES = {name: code for code, name in enumerate(BUTTONS)}
+TOUCH_PHASES = ('down', 'move', 'up', 'cancel')
+TOUCH_PHASE_CODES = {name: code for code, name in enumerate(TOUCH_PHASES)}
+# scroll_touch: x, y are the finger delta (px) for move, release velocity (px/s) for end
+SCROLL_PHASES = ('start', 'move', 'end')
+SCROLL_PHASE_CODES = {name: code for code, name in enumerate(SCROLL_PHASES)}
+# mouse_abs: x, y are 0..1 across the monitor (index, -1 = whole desktop);
+# binary frames carry them scaled to 0..ABS_SCALE
+ABS_SCALE = 65535
+
+_MOVE = struct.Struct('<Bhh')
+_CLICK = struct.Struct('<BBB')
+_BUTTON = struct.Struct('<BB')
+_SCROLL = struct.Struct('<Bh')
+_TOUCH = struct.Struct('<BBBhhI')
+_SCROLL_TOUCH = struct.Struct('<BBhh')
+_MOUSE_ABS = struct.Struct('<BbHH')
+_BATCH = struct.Struct('<BB')
+_TRAILER = struct.Struct('<HI')
+TRAILER_SIZE = _TRAILER.size
+
+
+def select_subprotocol(first, second):
+    """Pick our preferred subprotocol, or none if the client offered none of ours
+
+    Passed to websockets.serve so clients that offer no subprotocol are still
+    accepted (newer websockets releases reject them by default). Works with
+    both callback signatures: (connection, offered) and legacy
+    (offered, server_subprotocols).
+    """
+    offered = first if isinstance(first, (list, tuple)) else second
+    for subprotocol in SUBPROTOCOLS:
+        if subprotocol in offered:
+            return subprotocol
+    return None
+
+
+def unpack_move(frame):
+    """(dx, dy) from a mouse_move frame, or None if malformed"""
+    if len(frame) != _MOVE.size:
+        return None
+    return _MOVE.unpack(frame)[1:]
+
+
+def unpack_click(frame):
+    """(button, double) from a click frame, or None if malformed"""
+    if len(frame) != _CLICK.size or frame[1] >= len(BUTTONS):
+        return None
+    return BUTTONS[frame[1]], bool(frame[2])
+
+
+def unpack_button(frame):
+    """(button,) from a mousedown/mouseup frame, or None if malformed"""
+    if len(frame) != _BUTTON.size or frame[1] >= len(BUTTONS):
+        return None
+    return (BUTTONS[frame[1]],)
+
+
+def unpack_scroll(frame):
+    """(dy,) from a scroll frame, or None if malformed"""
+    if len(frame) != _SCROLL.size:
+        return None
+    return _SCROLL.unpack(frame)[1:]
+
+
+def unpack_touch(frame):
+    """(phase, pointer, x, y, t) from a touch frame, or None if malformed"""
+    if len(frame) != _TOUCH.size or frame[1] >= len(TOUCH_PHASES):
+        return None
+    _, phase, pointer, x, y, t = _TOUCH.unpack(frame)
+    return TOUCH_PHASES[phase], pointer, x, y, t
+
+
+def unpack_scroll_touch(frame):
+    """(phase, x, y) from a scroll_touch frame, or None if malformed"""
+    if len(frame) != _SCROLL_TOUCH.size or frame[1] >= len(SCROLL_PHASES):
+        return None
+    _, phase, x, y = _SCROLL_TOUCH.unpack(frame)
+    return SCROLL_PHASES[phase], x, y
+
+
+def unpack_mouse_abs(frame):
+    """(x, y, monitor) from a mouse_abs frame, or None if malformed"""
+    if len(frame) != _MOUSE_ABS.size:
+        return None
+    _, monitor, x, y = _MOUSE_ABS.unpack(frame)
+    return x / ABS_SCALE, y / ABS_SCALE, monitor
+
+
+def unpack_trailer(frame, size):
+    """(seq, ts) from the timing trailer of a frame whose body is size bytes"""
+    return _TRAILER.unpack_from(frame, size)
+
+
+# opcode -> (command name, argument names, frame size, unpacker)
+FRAMES = {
+    OP_MOUSE_MOVE: ('mouse_move', ('dx', 'dy'), _MOVE.size, unpack_move),
+    OP_CLICK: ('click', ('button', 'double'), _CLICK.size, unpack_click),
+    OP_MOUSEDOWN: ('mousedown', ('button',), _BUTTON.size, unpack_button),
+    OP_MOUSEUP: ('mouseup', ('button',), _BUTTON.size, unpack_button),
+    OP_SCROLL: ('scroll', ('dy',), _SCROLL.size, unpack_scroll),
+    OP_TOUCH: ('touch', ('phase', 'id', 'x', 'y', 't'), _TOUCH.size, unpack_touch),
+    OP_SCROLL_TOUCH: ('scroll_touch', ('phase', 'x', 'y'), _SCROLL_TOUCH.size, unpack_scroll_touch),
+    OP_MOUSE_ABS: ('mouse_abs', ('x', 'y', 'monitor'), _MOUSE_ABS.size, unpack_mouse_abs),
+}
+
+
+def split_batch(frame):
+    """(frames, trailer) from a batch frame, or None if malformed
+
+    frames are the contained frames as memoryview slices; trailer is
+    (seq, ts) if the batch ends with a timing trailer, else None.
+    """
+    if len(frame) < _BATCH.size:
+        return None
+    count = frame[1]
+    view = memoryview(frame)
+    offset = _BATCH.size
+    frames = []
+    for _ in range(count):
+        if offset >= len(frame):
+            return None
+        entry = FRAMES.get(frame[offset])
+        if entry is None:
+            return None
+        size = entry[2]
+        if offset + size > len(frame):
+            return None
+        frames.append(view[offset:offset + size])
+        offset += size
+    trailer = None
+    if len(frame) - offset == TRAILER_SIZE:
+        trailer = unpack_trailer(frame, offset)
+    elif offset != len(frame):
+        return None
+    return frames, trailer
+
+
+def decode(frame):
+    """Decode one binary frame into the equivalent JSON command dict"""
+    if not frame:
+        raise ValueError("empty binary frame")
+    if frame[0] == OP_BATCH:
+        parts = split_batch(frame)
+        if parts is None:
+            raise ValueError("malformed batch frame")
+        command = {'type': 'batch', 'events': [decode(bytes(part)) for part in parts[0]]}
+        if parts[1] is not None:
+            command['seq'], command['ts'] = parts[1]
+        return command
+    entry = FRAMES.get(frame[0])
+    if entry is None:
+        raise ValueError(f"unknown opcode 0x{frame[0]:02x}")
+    name, fields, size, unpack = entry
+    trailer = None
+    if len(frame) == size + TRAILER_SIZE:
+        trailer = unpack_trailer(frame, size)
+        frame = frame[:size]
+    args = unpack(frame)
+    if args is None:
+        raise ValueError(f"malformed {name} frame")
+    command = dict(zip(fields, args))
+    command['type'] = name
+    if trailer is not None:
+        command['seq'], command['ts'] = trailer
+    return command
+
+
+def encode(command):
+    """Encode a command dict as a binary frame, or None if it has no binary form"""
+    kind = command.get('type')
+    if kind == 'batch':
+        frames = [encode(event) for event in command['events']]
+        if None in frames or len(frames) > MAX_BATCH:
+            return None
+        return _BATCH.pack(OP_BATCH, len(frames)) + b''.join(frames)
+    if kind == 'mouse_move':
+        return _MOVE.pack(OP_MOUSE_MOVE, _clamp(command['dx']), _clamp(command['dy']))
+    if kind == 'click':
+        button = BUTTON_CODES[command.get('button', 'left')]
+        return _CLICK.pack(OP_CLICK, button, 1 if command.get('double') else 0)
+    if kind == 'mousedown':
+        return _BUTTON.pack(OP_MOUSEDOWN, BUTTON_CODES[command['button']])
+    if kind == 'mouseup':
+        return _BUTTON.pack(OP_MOUSEUP, BUTTON_CODES[command['button']])
+    if kind == 'scroll':
+        return _SCROLL.pack(OP_SCROLL, _clamp(command['dy']))
+    if kind == 'touch':
+        return _TOUCH.pack(OP_TOUCH, TOUCH_PHASE_CODES[command['phase']], command.get('id', 0) & 0xFF,
+                           _clamp(command['x']), _clamp(command['y']), int(command['t']) & 0xFFFFFFFF)
+    if kind == 'scroll_touch':
+        return _SCROLL_TOUCH.pack(OP_SCROLL_TOUCH, SCROLL_PHASE_CODES[command['phase']],
+                                  _clamp(command.get('x', 0)), _clamp(command.get('y', 0)))
+    if kind == 'mouse_abs':
+        return _MOUSE_ABS.pack(OP_MOUSE_ABS, max(-1, min(127, int(command.get('monitor', -1)))),
+                               _scale(command['x']), _scale(command['y']))
+    return None
+
+
+def _scale(value):
+    return max(0, min(ABS_SCALE, int(round(value * ABS_SCALE))))
+
+
+def _clamp(value):
+    return max(-32768, min(32767, int(round(value))))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Screen Streaming
+Captures the desktop with Pillow, downscales it, encodes JPEG (or WebP) and
+pushes frames to the phone over a separate WebSocket (/screen), so preview
+traffic never queues in front of input commands.
+
+The phone acknowledges every frame it has drawn. At most MAX_IN_FLIGHT
+frames are unacknowledged at a time, so the frame rate falls to what the
+network and phone can absorb instead of building a backlog. The ack round
+trip also drives the picture: quality and resolution step down while it is
+above TARGET_LATENCY and creep back up while it stays well below.
+
+Frame layout (little-endian): frame id (u32), width (u16), height (u16),
+format (u8: 0 JPEG, 1 WebP), then the encoded image.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import struct
+import time
+
+import metrics
+
+FORMAT_JPEG = 0
+FORMAT_WEBP = 1
+FORMATS = {'jpeg': FORMAT_JPEG, 'webp': FORMAT_WEBP}
+
+DEFAULT_MAX_FPS = 10
+# Unacknowledged frames allowed on the wire
+MAX_IN_FLIGHT = 2
+# Ack round trip above which the picture is made cheaper (seconds)
+TARGET_LATENCY = 0.25
+# A frame not acknowledged within this long is written off (seconds)
+ACK_TIMEOUT = 2.0
+
+MIN_QUALITY = 30
+MAX_QUALITY = 80
+QUALITY_STEP = 10
+MIN_WIDTH = 320
+MAX_WIDTH = 1280
+WIDTH_STEP = 0.8
+
+_HEADER = struct.Struct('<IHHB')
+
+SCREEN_FRAMES = metrics.registry.counter(
+    'prc_screen_frames_total', 'Screen preview frames sent')
+SCREEN_BYTES = metrics.registry.counter(
+    'prc_screen_bytes_total', 'Screen preview bytes sent')
+SCREEN_ENCODE = metrics.registry.histogram(
+    'prc_screen_encode_seconds', 'Time to capture, scale and encode one preview frame')
+SCREEN_RTT = metrics.registry.histogram(
+    'prc_screen_ack_seconds', 'Time from sending a preview frame to its acknowledgement')
+
+
+def _image_grab():
+    """Import Pillow's screen grabber lazily; it is only needed while someone is watching"""
+    try:
+        from PIL import ImageGrab
+    except ImportError:
+        raise RuntimeError("Screen streaming requires Pillow: pip install Pillow")
+    return ImageGrab
+
+
+class AdaptiveQuality:
+    """Picks JPEG quality and frame width from the ack round-trip time"""
+
+    def __init__(self, quality=60, width=960, max_width=MAX_WIDTH):
+        self.quality = quality
+        self.max_width = max_width
+        self.width = min(width, max_width)
+        self.rtt = None
+        self._fast_acks = 0
+
+    def set_max_width(self, max_width):
+        self.max_width = max(MIN_WIDTH, min(MAX_WIDTH, int(max_width)))
+        self.width = min(self.width, self.max_width)
+
+    def on_ack(self, rtt):
+        """Fold one round-trip sample in and step the picture up or down"""
+        self.rtt = rtt if self.rtt is None else self.rtt * 0.7 + rtt * 0.3
+        if self.rtt > TARGET_LATENCY:
+            self._fast_acks = 0
+            # Quality first: it is cheap to win back and costs less detail
+            if self.quality > MIN_QUALITY:
+                self.quality = max(MIN_QUALITY, self.quality - QUALITY_STEP)
+            else:
+                self.width = max(MIN_WIDTH, int(self.width * WIDTH_STEP))
+        elif self.rtt < TARGET_LATENCY / 3:
+            self._fast_acks += 1
+            if self._fast_acks >= 5:
+                self._fast_acks = 0
+                if self.width < self.max_width:
+                    self.width = min(self.max_width, int(self.width / WIDTH_STEP))
+                elif self.quality < MAX_QUALITY:
+                    self.quality = min(MAX_QUALITY, self.quality + QUALITY_STEP // 2)
+        else:
+            self._fast_acks = 0
+
+
+class FrameEncoder:
+    """Screen capture, downscale and encode; runs on an executor thread"""
+
+    def __init__(self, image_format=FORMAT_JPEG):
+        self._grab = _image_grab().grab
+        self.format = image_format
+        self._last = None
+
+    def encode(self, width, quality):
+        """Capture and encode a frame; returns (width, height, data), or None if nothing changed"""
+        from PIL import Image
+        image = self._grab()
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.BILINEAR, reducing_gap=2.0)
+        image = image.convert('RGB')
+        # Skip the encode and the send if the picture is unchanged
+        key = (hashlib.blake2b(image.tobytes(), digest_size=16).digest(), image.size, quality)
+        if key == self._last:
+            return None
+        self._last = key
+        out = io.BytesIO()
+        if self.format == FORMAT_WEBP:
+            image.save(out, 'WEBP', quality=quality, method=0)
+        else:
+            image.save(out, 'JPEG', quality=quality, optimize=False)
+        return image.width, image.height, out.getvalue()
+
+
+class ScreenStream:
+    """Streams the screen to one viewer until the connection closes"""
+
+    def __init__(self, websocket, max_fps=DEFAULT_MAX_FPS, image_format=FORMAT_JPEG):
+        self.websocket = websocket
+        self.interval = 1.0 / max_fps
+        self.encoder = FrameEncoder(image_format)
+        self.adapt = AdaptiveQuality()
+        self._sent = {}
+        self._acked = asyncio.Event()
+        self._next_id = 0
+
+    async def run(self):
+        """Send frames while reading acks; returns when the viewer disconnects"""
+        sender = asyncio.ensure_future(self._send_frames())
+        try:
+            async for message in self.websocket:
+                self._on_message(message)
+        finally:
+            sender.cancel()
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                # Usually a send racing the viewer's disconnect
+                print(f"[!] Screen stream stopped: {e!r}")
+
+    def _on_message(self, message):
+        try:
+            data = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+        if data.get('type') == 'ack':
+            frame = data.get('frame')
+            if not isinstance(frame, int):
+                # Lists and dicts aren't hashable
+                return
+            sent_at = self._sent.pop(frame, None)
+            if sent_at is not None:
+                rtt = time.monotonic() - sent_at
+                SCREEN_RTT.observe(rtt)
+                self.adapt.on_ack(rtt)
+                self._acked.set()
+        elif data.get('type') == 'view':
+            # Viewport width in device pixels; no point sending more than that
+            width = data.get('width')
+            if isinstance(width, (int, float)) and not isinstance(width, bool) and 0 < width < float('inf'):
+                self.adapt.set_max_width(width)
+
+    async def _wait_for_window(self):
+        """Wait until fewer than MAX_IN_FLIGHT frames are unacknowledged"""
+        while len(self._sent) >= MAX_IN_FLIGHT:
+            self._acked.clear()
+            oldest = min(self._sent.values())
+            timeout = oldest + ACK_TIMEOUT - time.monotonic()
+            if timeout <= 0:
+                # Lost or ignored: write it off and treat it as a very slow ack
+                frame_id = min(self._sent, key=self._sent.get)
+                del self._sent[frame_id]
+                self.adapt.on_ack(ACK_TIMEOUT)
+                continue
+            try:
+                await asyncio.wait_for(self._acked.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send_frames(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wait_for_window()
+            start = time.monotonic()
+            try:
+                frame = await loop.run_in_executor(None, self.encoder.encode,
+                                                   self.adapt.width, self.adapt.quality)
+            except Exception as e:
+                # e.g. no display to grab from, or an image Pillow can't encode
+                print(f"[ERROR] Screen capture failed: {e!r}")
+                await self.websocket.close(1011, 'screen capture failed')
+                return
+            if frame is not None:
+                width, height, data = frame
+                SCREEN_ENCODE.observe(time.monotonic() - start)
+                self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+                self._sent[self._next_id] = time.monotonic()
+                await self.websocket.send(_HEADER.pack(self._next_id, width, height,
+                                                       self.encoder.format) + data)
+                SCREEN_FRAMES.inc()
+                SCREEN_BYTES.inc(len(data) + _HEADER.size)
+            delay = start + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
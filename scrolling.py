@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Scroll Engine
+Kinetic scrolling for the scroll area. The phone streams finger movement
+while it touches the scroll area and its release velocity when it lets go;
+the server scrolls along with the finger and then coasts with exponential
+friction at a fixed tick, so a flick keeps scrolling without any further
+messages from the phone.
+
+Scrolling is sent in fractional wheel notches, so backends with
+high-resolution wheels (SendInput, uinput) scroll smoothly instead of in
+three-notch jumps. Horizontal finger movement scrolls horizontally.
+
+The viewport follows the finger: swiping up scrolls up, as the scroll area
+always has. Any new touch stops the coasting at once.
+"""
+
+import asyncio
+import math
+
+# Finger movement per wheel notch (CSS px)
+PIXELS_PER_NOTCH = 30.0
+# Coasting tick (Hz)
+TICK_HZ = 60
+# Velocity decays by 1/e every TAU seconds while coasting
+TAU = 0.35
+# Release speeds below this don't coast; coasting stops below MIN_SPEED (px/s)
+MIN_FLING = 250.0
+MIN_SPEED = 15.0
+# Release velocity cap (px/s)
+MAX_FLING = 8000.0
+
+
+class ScrollEngine:
+    """Per-client direct and inertial scrolling; runs on the event loop"""
+
+    def __init__(self, client, backend):
+        self.client = client
+        self.backend = backend
+        self._coast = None
+
+    def on_scroll_touch(self, phase, a, b):
+        """start, move (a, b = finger delta px) or end (a, b = release velocity px/s)"""
+        if phase == 'start':
+            self.stop()
+        elif phase == 'move':
+            self.stop()
+            self._scroll_px(a, b)
+        elif phase == 'end':
+            self.stop()
+            speed = math.hypot(a, b)
+            if speed >= MIN_FLING:
+                scale = min(1.0, MAX_FLING / speed)
+                self._coast = asyncio.ensure_future(self._run_coast(a * scale, b * scale))
+
+    def _scroll_px(self, dx, dy):
+        # Finger up (negative y) moves the viewport up (positive wheel)
+        self.client.lane.submit_droppable('scroll', self.backend.scroll_smooth,
+                                          dx / PIXELS_PER_NOTCH, -dy / PIXELS_PER_NOTCH)
+
+    async def _run_coast(self, vx, vy):
+        interval = 1.0 / TICK_HZ
+        decay = math.exp(-interval / TAU)
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while math.hypot(vx, vy) >= MIN_SPEED:
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self._scroll_px(vx * interval, vy * interval)
+            vx *= decay
+            vy *= decay
+        self._coast = None
+
+    @property
+    def coasting(self):
+        return self._coast is not None
+
+    def stop(self):
+        """Cancel coasting immediately"""
+        if self._coast is not None:
+            self._coast.cancel()
+            self._coast = None
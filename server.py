@@ -4,19 +4,32 @@ Phone Remote Control Server
 Control your PC using your phone as a wireless mouse and keyboard
 """
 
+import argparse
 import asyncio
-import websockets
-import json
-import pyautogui
-import socket
 import os
 import sys
 from pathlib import Path
 from aiohttp import web
-
-# Configure pyautogui for remote control
-pyautogui.FAILSAFE = False
-pyautogui.PAUSE = 0.01
+from injector import InputInjector, DEFAULT_MOVE_HZ, DEFAULT_MAX_RATE
+from commands import create_registry
+from clients import RemoteClient
+from backends import create_backend, BACKEND_NAMES
+import protocol
+import metrics
+from page_cache import PageCache, DEFAULT_MAX_AGE
+from aiohttp_ws import websocket_route
+import screen_stream
+import monitors
+from journal import Journal, DEFAULT_PATH as DEFAULT_JOURNAL, DEFAULT_CAPACITY as DEFAULT_JOURNAL_SIZE
+from udp_motion import MotionChannel
+from text_input import DEFAULT_PASTE_THRESHOLD
+from ballistics import PROFILES, DEFAULT_PROFILE
+from instance_guard import InstanceGuard, listen
+from input_state import DEFAULT_MAX_HOLD, DEFAULT_HEARTBEAT_TIMEOUT
+from link_monitor import LinkMonitor, PING_INTERVAL
+from sessions import SessionManager, MODES as SESSION_MODES, DEFAULT_MODE as DEFAULT_SESSION_MODE, DEFAULT_GRACE
+from discovery import (local_addresses, server_info, MdnsResponder, DiscoveryResponder,
+                       DEFAULT_NAME as DEFAULT_MDNS_NAME, DISCOVERY_PORT)
 
 # Check for admin privileges on Windows
 if sys.platform == 'win32':
@@ -30,81 +43,8 @@ if sys.platform == 'win32':
     except:
         pass
 
-# Store connected clients
-clients = set()
-
-async def handle_websocket(websocket):
-    """Handle WebSocket connections from phones"""
-    clients.add(websocket)
-    client_ip = websocket.remote_address[0] if websocket.remote_address else "unknown"
-    print(f"[+] Phone connected from {client_ip}")
-    
-    try:
-        async for message in websocket:
-            try:
-                data = json.loads(message)
-                
-                if data['type'] == 'mouse_move':
-                    pyautogui.moveRel(data['dx'], data['dy'])
-                
-                elif data['type'] == 'click':
-                    button = data.get('button', 'left')
-                    if data.get('double'):
-                        pyautogui.doubleClick(button=button)
-                    else:
-                        pyautogui.click(button=button)
-                
-                elif data['type'] == 'mousedown':
-                    pyautogui.mouseDown(button=data['button'])
-                
-                elif data['type'] == 'mouseup':
-                    pyautogui.mouseUp(button=data['button'])
-                
-                elif data['type'] == 'scroll':
-                    pyautogui.scroll(data['dy'])
-                
-                elif data['type'] == 'key':
-                    pyautogui.press(data['key'])
-                
-                elif data['type'] == 'combo':
-                    pyautogui.hotkey(*data['keys'])
-                
-                elif data['type'] == 'type':
-                    pyautogui.write(data['text'])
-                
-            except Exception as e:
-                print(f"[ERROR] Error processing command: {e}")
-                
-    except websockets.exceptions.ConnectionClosed:
-        pass
-    finally:
-        clients.remove(websocket)
-        print(f"[-] Phone disconnected from {client_ip}")
-
-async def serve_interface(request):
-    """Serve the HTML interface"""
-    # Determine which version to serve
-    path = request.path.strip('/')
-    
-    if path == 'stable':
-        file_name = 'stable.html'
-    elif path == '' or path == 'latest':
-        file_name = 'latest.html'
-    else:
-        return web.Response(text="Not Found", status=404)
-    
-    # Read and serve the HTML file
-    try:
-        file_path = Path(__file__).parent / file_name
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return web.Response(text=content, content_type='text/html')
-    except FileNotFoundError:
-        return web.Response(text=f"Interface file '{file_name}' not found", status=404)
-
-async def serve_home(request):
-    """Serve a home page with version selection"""
-    home_html = """
+# Home page with version selection
+HOME_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -190,57 +130,451 @@ async def serve_home(request):
     </body>
     </html>
     """
-    return web.Response(text=home_html, content_type='text/html')
 
-def get_local_ip():
-    """Get the local IP address"""
+# Interface pages, cached in memory with precompressed bodies
+pages = PageCache()
+
+def load_pages():
+    """Load the interface pages into the page cache"""
+    pages.add_text('home', HOME_HTML)
+    for file_name in ('latest.html', 'stable.html'):
+        if not pages.add_file(file_name, Path(__file__).parent / file_name):
+            print(f"[!] Interface file '{file_name}' not found")
+
+# Connected phones (RemoteClient)
+clients = set()
+# websockets is imported only when the legacy listener starts (start_servers);
+# until then no handler can see its ConnectionClosed
+ConnectionClosed = ()
+
+# Input calls run on their own thread, off the event loop
+injector = InputInjector()
+backend = None
+registry = None
+# Optional UDP side-channel for motion (--udp-port)
+motion_channel = None
+# Who may inject input (--session-mode)
+sessions = SessionManager()
+# Stuck button/key watchdog (--max-hold, --heartbeat-timeout)
+max_hold = DEFAULT_MAX_HOLD
+heartbeat_timeout = DEFAULT_HEARTBEAT_TIMEOUT
+# Seconds between application-level pings (--ping-interval)
+ping_interval = PING_INTERVAL
+# What /discover and the UDP discovery responder report (set in main)
+discovery_info = None
+# mDNS responder; its name can change if another PC already uses it
+mdns = None
+# Record of every command the phones sent (--journal)
+journal = None
+
+def setup_input(backend_name, move_hz=DEFAULT_MOVE_HZ, max_rate=DEFAULT_MAX_RATE, udp_motion=False,
+                paste_threshold=DEFAULT_PASTE_THRESHOLD, pointer_profile=DEFAULT_PROFILE,
+                session_mode=DEFAULT_SESSION_MODE, takeover_grace=DEFAULT_GRACE):
+    """Create the input backend and command registry, and start the injector"""
+    global backend, registry, motion_channel, sessions
+    # pyautogui/native load on a background thread while the listeners start
+    backend = create_backend(backend_name, deferred=True)
+    motion_channel = MotionChannel(backend) if udp_motion else None
+    registry = create_registry(backend, motion_channel, paste_threshold)
+    sessions = SessionManager(session_mode, takeover_grace)
+    registry.arbiter = sessions
+    if motion_channel is not None:
+        motion_channel.arbiter = sessions
+    injector.set_move_rate(move_hz)
+    injector.max_rate = max_rate
+    injector.pointer_profile = pointer_profile
+    injector.start()
+
+# Seconds to wait for a replaced instance to close the journal
+JOURNAL_WAIT = 5.0
+
+async def open_journal(path, capacity=DEFAULT_JOURNAL_SIZE):
+    """Start journaling commands to path; the server runs on without it if that fails
+
+    After a --replace the old instance is still draining into the journal;
+    wait for it off the loop, and use a file of our own if it takes too long.
+    """
+    global journal
+    loop = asyncio.get_running_loop()
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return "127.0.0.1"
+        try:
+            opened = await loop.run_in_executor(None, Journal, path, capacity, JOURNAL_WAIT)
+        except BlockingIOError:
+            root, ext = os.path.splitext(path)
+            opened = Journal(f'{root}-{os.getpid()}{ext}', capacity)
+    except (OSError, ValueError) as e:
+        print(f"[!] Journal unavailable: {e}")
+        return
+    journal = opened
+    registry.journal = journal
+    injector.journal = journal
+    print(f"[IN] Journal: {journal.path} (last {journal.capacity} records)")
 
-async def main():
-    """Main server function"""
-    local_ip = get_local_ip()
-    http_port = 8080
-    ws_port = 8765
+async def handle_websocket(websocket):
+    """Handle WebSocket connections from phones"""
+    client = RemoteClient(websocket, injector, max_hold, heartbeat_timeout)
+    clients.add(client)
+    print(f"[+] Phone connected from {client.address}")
+    sessions.join(client)
+    if ping_interval > 0:
+        client.link = LinkMonitor(client, ping_interval)
+        client.link.start()
+    
+    try:
+        async for message in websocket:
+            client.on_message()
+            try:
+                if not registry.dispatch_message(message, client):
+                    metrics.INVALID_MESSAGES.inc()
+                    print(f"[ERROR] Invalid command: {message[:80]!r}")
+            except Exception as e:
+                # A bad command must not cost the phone its connection
+                print(f"[ERROR] Error processing command: {e}")
+            # Stop reading while this phone's lane is full or over its rate
+            await client.throttle()
+    
+    except ConnectionClosed:
+        pass
+    finally:
+        clients.remove(client)
+        sessions.leave(client)
+        if motion_channel is not None:
+            motion_channel.close_session(client)
+        client.close()
+        print(f"[-] Phone disconnected from {client.address}")
+
+# Screen preview settings (--screen-fps, --screen-format); off unless asked for
+screen_fps = 0
+screen_format = screen_stream.FORMAT_JPEG
+
+async def handle_screen(websocket):
+    """Stream the desktop to a phone's preview view"""
+    client_ip = websocket.remote_address[0] if websocket.remote_address else "unknown"
+    try:
+        stream = screen_stream.ScreenStream(websocket, screen_fps, screen_format)
+    except RuntimeError as e:
+        print(f"[!] Screen preview unavailable: {e}")
+        await websocket.close(1011, 'screen capture unavailable')
+        return
+    print(f"[+] Screen preview opened from {client_ip}")
+    try:
+        await stream.run()
+    except ConnectionClosed:
+        pass
+    finally:
+        print(f"[-] Screen preview closed from {client_ip}")
+
+async def serve_interface(request):
+    """Serve the HTML interface"""
+    # Determine which version to serve
+    path = request.path.strip('/')
     
-    # Create HTTP server
+    if path == 'stable':
+        file_name = 'stable.html'
+    elif path == '' or path == 'latest':
+        file_name = 'latest.html'
+    else:
+        return web.Response(text="Not Found", status=404)
+    
+    # Pages are read once at startup and served from memory
+    response = pages.response(request, file_name)
+    if response is None:
+        return web.Response(text=f"Interface file '{file_name}' not found", status=404)
+    return response
+
+async def serve_home(request):
+    """Serve a home page with version selection"""
+    return pages.response(request, 'home')
+
+async def serve_metrics(request):
+    """Serve latency and throughput metrics in Prometheus text format"""
+    return web.Response(body=metrics.render().encode('utf-8'),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def serve_status(request):
+    """Serve connected phones and their link stats as JSON"""
+    return web.json_response({
+        'backend': backend.name if backend is not None else None,
+        'session_mode': sessions.mode,
+        'controller': sessions.controller.session_id if sessions.controller is not None else None,
+        'clients': [client.status() for client in clients],
+    })
+
+def broadcast_monitors():
+    """Send every phone the new monitor layout (absolute pointer mode)"""
+    layout = monitors.layout.describe()
+    for client in clients:
+        client.send_event(layout)
+
+def current_discovery_info():
+    """Name, addresses and ports of this server for discovery clients"""
+    info = dict(discovery_info) if discovery_info else server_info(DEFAULT_MDNS_NAME, local_addresses(), 8080)
+    if mdns is not None:
+        info['name'] = mdns.name
+        info['host'] = mdns.host
+    return info
+
+async def serve_discover(request):
+    """Serve the server's name, addresses and ports for the setup screen
+
+    Pages opened from a file or another host fetch this by mDNS name, so
+    cross-origin reads are allowed.
+    """
+    return web.json_response(current_discovery_info(), headers={'Access-Control-Allow-Origin': '*'})
+
+def parse_args():
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description="Phone Remote Control Server")
+    parser.add_argument('--move-hz', type=float, default=DEFAULT_MOVE_HZ,
+                        help="rate at which coalesced mouse motion is applied, "
+                             "e.g. your display refresh rate (0 = no tick)")
+    parser.add_argument('--backend', choices=BACKEND_NAMES, default='pyautogui',
+                        help="input injection backend: pyautogui (default), native "
+                             "(SendInput on Windows, uinput on Linux) or fake (records only)")
+    parser.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE,
+                        help="per-phone message rate limit in messages/s (0 = unlimited)")
+    parser.add_argument('--cache-max-age', type=int, default=DEFAULT_MAX_AGE,
+                        help="let phones use the interface pages this many seconds without "
+                             "asking again (default 0: revalidate with the ETag on every load)")
+    parser.add_argument('--watch', action='store_true',
+                        help="reload latest.html/stable.html when they change on disk")
+    parser.add_argument('--no-legacy-ws', action='store_true',
+                        help="don't open the separate WebSocket port 8765 (clients use /ws on port 8080)")
+    parser.add_argument('--pointer-profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="pointer acceleration curve for phones that don't choose one "
+                             "(linear = no acceleration)")
+    parser.add_argument('--paste-threshold', type=int, default=DEFAULT_PASTE_THRESHOLD,
+                        help="paste typed text of this many characters or more through the "
+                             "clipboard instead of typing it (0 = always type)")
+    parser.add_argument('--udp-port', type=int,
+                        help="also accept motion and scroll as UDP datagrams on this port "
+                             "(native clients; browsers can't send UDP)")
+    parser.add_argument('--session-mode', choices=SESSION_MODES, default=DEFAULT_SESSION_MODE,
+                        help="who may control the PC when several phones are connected: "
+                             "shared (everyone), exclusive (first phone) or takeover "
+                             "(another phone takes over once the controller is idle)")
+    parser.add_argument('--takeover-grace', type=float, default=DEFAULT_GRACE,
+                        help="seconds the controller must be idle before another phone "
+                             "can take over (takeover mode)")
+    parser.add_argument('--max-hold', type=float, default=DEFAULT_MAX_HOLD,
+                        help="release a mouse button or key held longer than this many seconds "
+                             "(0 = no limit)")
+    parser.add_argument('--heartbeat-timeout', type=float, default=DEFAULT_HEARTBEAT_TIMEOUT,
+                        help="release everything a phone holds when it has been silent this many "
+                             "seconds (phones that send heartbeats; 0 = off)")
+    parser.add_argument('--ping-interval', type=float, default=PING_INTERVAL,
+                        help="seconds between pings used to measure each phone's round-trip "
+                             "time (0 = no pings)")
+    parser.add_argument('--mdns-name', default=DEFAULT_MDNS_NAME,
+                        help="advertise the server as <name>.local over mDNS")
+    parser.add_argument('--no-mdns', action='store_true',
+                        help="don't answer mDNS queries or advertise the server")
+    parser.add_argument('--discovery-port', type=int, default=DISCOVERY_PORT,
+                        help="answer UDP discovery broadcasts from native clients on this port "
+                             "(0 = off)")
+    parser.add_argument('--journal', nargs='?', const=DEFAULT_JOURNAL, default='',
+                        help="record every command the phones send (typed text masked) in a "
+                             "ring file for 'python journal.py'; default file: %(const)s")
+    parser.add_argument('--journal-size', type=int, default=DEFAULT_JOURNAL_SIZE,
+                        help="records kept in the journal (64 bytes each)")
+    parser.add_argument('--replace', action='store_true',
+                        help="take over from an already running server without dropping "
+                             "connections (restart/upgrade)")
+    parser.add_argument('--screen-fps', type=float, default=0,
+                        help="serve a screen preview at up to this frame rate, e.g. %d; it has "
+                             "no authentication (default 0 = no preview)" % screen_stream.DEFAULT_MAX_FPS)
+    parser.add_argument('--screen-format', choices=sorted(screen_stream.FORMATS), default='jpeg',
+                        help="image format for the screen preview")
+    return parser.parse_args()
+
+def create_app():
+    """Create the HTTP application"""
+    load_pages()
     app = web.Application()
     app.router.add_get('/', serve_home)
     app.router.add_get('/latest', serve_interface)
     app.router.add_get('/stable', serve_interface)
+    app.router.add_get('/metrics', serve_metrics)
+    app.router.add_get('/status', serve_status)
+    app.router.add_get('/discover', serve_discover)
+    # Control channel on the HTTP port, same origin as the pages
+    app.router.add_get('/ws', websocket_route(handle_websocket))
+    if screen_fps > 0:
+        app.router.add_get('/screen', websocket_route(handle_screen))
+    return app
+
+# Bound sockets, handed to a new instance started with --replace
+listeners = []
+
+async def start_servers(host='0.0.0.0', http_port=8080, ws_port=8765, udp_port=None, inherited=None):
+    """Start the HTTP and WebSocket listeners; returns (runner, ws_server)
+
+    The control channel is always served at /ws on the HTTP port. The
+    separate WebSocket listener on ws_port is kept for older clients;
+    pass ws_port=None to skip it (ws_server is then None). The UDP motion
+    channel, if set up, listens on udp_port. Sockets handed over by a
+    previous instance (inherited, see instance_guard.py) are used instead
+    of binding new ones.
+    """
+    global ConnectionClosed
+    if motion_channel is not None:
+        udp_sock = inherited.pop(f'udp:{udp_port}', None) if inherited and udp_port else None
+        await motion_channel.start(host, udp_port or 0, udp_sock)
+        listeners.append(motion_channel.transport.get_extra_info('socket'))
+
+    # Start HTTP server
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    http_sock = listen(host, http_port, inherited)
+    site = web.SockSite(runner, http_sock)
+    await site.start()
+    listeners.append(http_sock)
     
-    # Start WebSocket server
-    ws_server = await websockets.serve(handle_websocket, '0.0.0.0', ws_port)
+    # Start legacy WebSocket server
+    ws_server = None
+    if ws_port is not None:
+        import websockets
+        ConnectionClosed = websockets.ConnectionClosed
+        ws_sock = listen(host, ws_port, inherited)
+        ws_server = await websockets.serve(handle_websocket, sock=ws_sock,
+                                           subprotocols=protocol.SUBPROTOCOLS,
+                                           select_subprotocol=protocol.select_subprotocol)
+        listeners.append(ws_sock)
+    return runner, ws_server
+
+async def start_discovery(addresses, name, http_port, discovery_port, inherited=None):
+    """Start the mDNS and UDP discovery responders; returns the UDP responder
+
+    mDNS is skipped when name is empty and left off when port 5353 can't be
+    used; the responder is None when discovery_port is 0 or taken. The
+    discovery socket is handed over on restart like the other listeners.
+    """
+    global mdns
+    if name and addresses:
+        mdns = MdnsResponder(name, http_port, addresses)
+        if not await mdns.start():
+            mdns = None
+    responder = None
+    if discovery_port:
+        responder = DiscoveryResponder(current_discovery_info)
+        sock = inherited.pop(f'udp:{discovery_port}', None) if inherited else None
+        try:
+            await responder.start(discovery_port, sock)
+            listeners.append(responder.transport.get_extra_info('socket'))
+        except OSError as e:
+            print(f"[!] UDP discovery unavailable on port {discovery_port}: {e}")
+            responder = None
+    return responder
+
+async def stop_servers(runner, ws_server, timeout=2.0):
+    """Stop accepting, send phones off to reconnect and drain their input
+
+    Phones get close code 1012 (service restart), which the latest
+    interface answers by reconnecting at once, to the new instance.
+    Disconnecting releases each phone's held buttons and keys.
+    """
+    if ws_server is not None:
+        ws_server.close(close_connections=False)
+    # The new instance appends to the journal from now on
+    if registry is not None:
+        registry.journal = None
+    for site in list(runner.sites):
+        await site.stop()
+    await asyncio.gather(*(client.websocket.close(1012, 'server restart') for client in list(clients)),
+                         return_exceptions=True)
+    deadline = asyncio.get_running_loop().time() + timeout
+    while clients and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    if motion_channel is not None:
+        motion_channel.close()
+    await runner.cleanup()
+    # Let queued input finish before exiting
+    injector.stop(timeout)
+    injector.journal = None
+    if journal is not None:
+        journal.close()
+
+async def main(args, guard):
+    """Main server function; returns when another instance asks it to exit"""
+    global screen_fps, screen_format, max_hold, heartbeat_timeout, ping_interval, discovery_info
+    addresses = local_addresses()
+    local_ip = addresses[0] if addresses else '127.0.0.1'
+    setup_input(args.backend, args.move_hz, args.max_rate, args.udp_port is not None,
+                args.paste_threshold, args.pointer_profile, args.session_mode, args.takeover_grace)
+    if args.journal:
+        asyncio.ensure_future(open_journal(args.journal, args.journal_size))
+    pages.max_age = args.cache_max_age
+    screen_fps = args.screen_fps
+    screen_format = screen_stream.FORMATS[args.screen_format]
+    max_hold = args.max_hold
+    heartbeat_timeout = args.heartbeat_timeout
+    ping_interval = args.ping_interval
+    http_port = 8080
+    ws_port = None if args.no_legacy_ws else 8765
+    
+    runner, ws_server = await start_servers('0.0.0.0', http_port, ws_port, args.udp_port, guard.inherited)
+    discovery_info = server_info(args.mdns_name, addresses, http_port, ws_port,
+                                 motion_channel.port if motion_channel is not None else None)
+    responder = await start_discovery(addresses, None if args.no_mdns else args.mdns_name,
+                                            http_port, args.discovery_port, guard.inherited)
+    stop = asyncio.Event()
+    await guard.serve(stop.set, listeners)
     
     print("\n" + "="*50)
     print("PHONE REMOTE CONTROL SERVER")
     print("="*50)
     print(f"\n[OK] Server running at: http://{local_ip}:{http_port}")
-    print(f"[WS] WebSocket port: {ws_port}")
+    for address in addresses[1:]:
+        print(f"     Also reachable at: http://{address}:{http_port}")
+    if mdns is not None:
+        print(f"[OK] By name: http://{mdns.host}:{http_port}")
+    if not addresses:
+        print("[!] No network interface is up; only this PC can connect")
+    print(f"[WS] WebSocket: ws://{local_ip}:{http_port}/ws")
+    if ws_port is not None:
+        print(f"[WS] Legacy WebSocket port: {ws_port}")
+    if motion_channel is not None:
+        print(f"[UDP] Motion datagrams: udp://{local_ip}:{motion_channel.port}")
+    if responder is not None:
+        print(f"[UDP] Discovery: port {args.discovery_port}")
+    print(f"[IN] Input backend: {backend.name}")
+    print(f"[IN] Session mode: {sessions.mode}")
     print(f"\nDirect links:")
     print(f"   Latest: http://{local_ip}:{http_port}/latest")
     print(f"   Stable: http://{local_ip}:{http_port}/stable")
+    print(f"   Metrics: http://{local_ip}:{http_port}/metrics")
+    print(f"   Status: http://{local_ip}:{http_port}/status")
+    if screen_fps > 0:
+        print(f"   Screen preview: ws://{local_ip}:{http_port}/screen (up to {screen_fps:g} fps)")
     print("\n" + "="*50)
     print("Press Ctrl+C to stop")
     print("="*50 + "\n")
     
-    # Start HTTP server
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', http_port)
-    await site.start()
+    if args.watch:
+        asyncio.ensure_future(pages.watch())
+    # Query the monitors when a phone needs them, and watch for changes while in use
+    monitors.layout.on_change(broadcast_monitors)
+    monitors.layout.start()
     
-    # Keep server running
-    await asyncio.Future()
+    # Keep server running until a new instance takes over
+    await stop.wait()
+    # No goodbye: the new instance answers for the same name and addresses
+    if mdns is not None:
+        mdns.stop(goodbye=False)
+    if responder is not None:
+        responder.close()
+    await stop_servers(runner, ws_server)
+    guard.release()
 
 if __name__ == "__main__":
+    args = parse_args()
+    guard = InstanceGuard('server')
+    if not guard.acquire(replace=args.replace):
+        print("[ERROR] The server is already running (start with --replace to restart it)")
+        sys.exit(1)
     try:
-        asyncio.run(main())
+        asyncio.run(main(args, guard))
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
     except KeyboardInterrupt:
         print("\n\nServer stopped.")
\ No newline at end of file
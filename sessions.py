@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Session Arbitration
+Decides which connected phones may inject input. Without it every phone
+injects at once, and two people interleaving mousedown/mouseup break each
+other's drags.
+
+    shared      everyone controls. Each phone has its own lane and the
+                injector serves lanes round-robin, so a busy phone can't
+                starve the others. A phone holding a mouse button has the
+                pointer to itself until it lets go, so drags stay intact:
+                other phones' motion is discarded, their clicks, keys and
+                scrolling still go through.
+    exclusive   the first phone controls; the others watch until it
+                disconnects or releases control, then the longest-waiting
+                phone takes over
+    takeover    like exclusive, but another phone takes control by sending
+                input once the controller has been idle for the grace
+                period (and holds no buttons or keys)
+
+Every phone gets a {"type": "session", ...} message whenever the controller
+or the set of phones changes. A phone's held buttons and keys are released
+by its InputStateTracker (input_state.py) when it disconnects or loses
+control.
+"""
+
+import functools
+import itertools
+import time
+
+import metrics
+
+MODES = ('shared', 'exclusive', 'takeover')
+DEFAULT_MODE = 'shared'
+# Controller idle time after which takeover mode lets another phone take over (seconds)
+DEFAULT_GRACE = 3.0
+
+INPUT_DENIED = metrics.registry.counter(
+    'prc_input_denied_total', 'Input commands dropped because the phone did not have control',
+    ('mode',))
+
+
+class SessionManager:
+    """Tracks connected phones and grants control according to the mode"""
+
+    def __init__(self, mode=DEFAULT_MODE, grace=DEFAULT_GRACE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown session mode '{mode}'")
+        self.mode = mode
+        self.grace = grace
+        self.controller = None
+        self._clients = []
+        self._ids = itertools.count(1)
+
+    def join(self, client):
+        """Register a newly connected phone"""
+        client.session_id = next(self._ids)
+        self._clients.append(client)
+        if self.mode == 'shared':
+            client.lane.motion_gate = functools.partial(self._pointer_free, client)
+        if self.mode != 'shared' and self.controller is None:
+            self._set_controller(client)
+        else:
+            self.broadcast()
+
+    def leave(self, client):
+        """Forget a disconnected phone, handing control on if it had it"""
+        if client not in self._clients:
+            return
+        self._clients.remove(client)
+        if client is self.controller:
+            self._set_controller(self._clients[0] if self._clients else None)
+        else:
+            self.broadcast()
+
+    def allow(self, client):
+        """True if the client may inject input now; called for every input command"""
+        now = time.monotonic()
+        if self.mode == 'shared' or client is self.controller:
+            allowed = True
+        elif self.mode == 'takeover' and self._idle(self.controller, now):
+            self._set_controller(client)
+            allowed = True
+        else:
+            allowed = False
+        if allowed:
+            client.last_input = now
+        else:
+            INPUT_DENIED.inc(1, self.mode)
+        return allowed
+
+    def request(self, client):
+        """Explicit request for control; granted under the same rules as input"""
+        if self.mode != 'shared' and client is not self.controller:
+            if self.mode == 'takeover' and self._idle(self.controller, time.monotonic()):
+                self._set_controller(client)
+                return
+        # Denied or nothing to do: tell the phone where things stand
+        client.send_event(self._state(client))
+
+    def release(self, client):
+        """Give up control, passing it to the longest-waiting other phone"""
+        if client is not self.controller:
+            return
+        waiting = [other for other in self._clients if other is not client]
+        self._set_controller(waiting[0] if waiting else client)
+
+    def _idle(self, controller, now):
+        if controller is None:
+            return True
+        if controller.input_state.holding:
+            return False
+        return now - controller.last_input >= self.grace
+
+    def _pointer_free(self, client):
+        """Shared mode motion gate: False while another phone holds a mouse button"""
+        for other in self._clients:
+            if other is not client and other.input_state.holding_button:
+                INPUT_DENIED.inc(1, self.mode)
+                return False
+        return True
+
+    def _set_controller(self, client):
+        previous, self.controller = self.controller, client
+        if previous is not None and previous is not client and previous in self._clients:
+            # Its mouseup would be denied from now on, leaving the button stuck, and
+            # gesture timers and coasting would inject without asking allow()
+            previous.release_input('control')
+        if client is not None and client is not previous:
+            # A new controller starts with a fresh idle timer
+            client.last_input = time.monotonic()
+            print(f"[~] Phone {client.session_id} ({client.address}) has control")
+        self.broadcast()
+
+    def _state(self, client):
+        controller = self.controller
+        return {
+            'type': 'session',
+            'mode': self.mode,
+            'id': client.session_id,
+            'clients': len(self._clients),
+            'controller': controller.session_id if controller is not None else None,
+            'control': self.mode == 'shared' or client is controller,
+        }
+
+    def broadcast(self):
+        """Send every phone the current session state"""
+        for client in self._clients:
+            client.send_event(self._state(client))
@@ -5,15 +5,15 @@ Works just like the original version
 """
 
 import asyncio
-import websockets
-import json
-import pyautogui
-import socket
 from aiohttp import web
-
-# Configure pyautogui
-pyautogui.FAILSAFE = False
-pyautogui.PAUSE = 0.01
+from injector import InputInjector
+from commands import create_registry
+from clients import RemoteClient
+from backends import create_backend
+import monitors
+import protocol
+from aiohttp_ws import websocket_route
+from discovery import local_addresses
 
 # The HTML interface (embedded directly)
 HTML_INTERFACE = """
@@ -192,8 +192,9 @@ HTML_INTERFACE = """
         
         // Connect to WebSocket server
         function connect() {
+            // Control channel is served on the same origin as this page
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const wsUrl = protocol + '//' + window.location.hostname + ':8765';
+            const wsUrl = protocol + '//' + window.location.host + '/ws';
             
             ws = new WebSocket(wsUrl);
             
@@ -340,69 +341,61 @@ HTML_INTERFACE = """
 </html>
 """
 
+# Input calls run on their own thread, off the event loop
+injector = InputInjector()
+# pyautogui loads on a background thread while the listeners start
+registry = create_registry(create_backend('pyautogui', deferred=True))
+# Set once the legacy listener has imported websockets
+ConnectionClosed = ()
+
 async def handle_websocket(websocket):
     """Handle WebSocket connections"""
     print(f"[+] Phone connected")
+    client = RemoteClient(websocket, injector)
     
     try:
         async for message in websocket:
+            client.on_message()
             try:
-                data = json.loads(message)
-                
-                if data['type'] == 'mouse_move':
-                    pyautogui.moveRel(data['dx'], data['dy'])
-                
-                elif data['type'] == 'click':
-                    button = data.get('button', 'left')
-                    pyautogui.click(button=button)
-                
-                elif data['type'] == 'key':
-                    pyautogui.press(data['key'])
-                
-                elif data['type'] == 'combo':
-                    pyautogui.hotkey(*data['keys'])
-                
+                if not registry.dispatch_message(message, client):
+                    print(f"[ERROR] Invalid command: {message[:80]!r}")
             except Exception as e:
-                print(f"[ERROR] {e}")
-                
-    except websockets.exceptions.ConnectionClosed:
+                # A bad command must not cost the phone its connection
+                print(f"[ERROR] Error processing command: {e}")
+            await client.throttle()
+    
+    except ConnectionClosed:
         pass
     finally:
+        client.close()
         print(f"[-] Phone disconnected")
 
 async def serve_html(request):
     """Serve the HTML interface"""
     return web.Response(text=HTML_INTERFACE, content_type='text/html')
 
-def get_local_ip():
-    """Get local IP address"""
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return "127.0.0.1"
-
 async def main():
     """Main server function"""
-    local_ip = get_local_ip()
+    global ConnectionClosed
+    addresses = local_addresses() or ['127.0.0.1']
+    injector.start()
+    # Monitor layout for absolute pointer moves, queried in the background while in use
+    monitors.layout.start()
     http_port = 8080
     ws_port = 8765
     
     # Create HTTP server
     app = web.Application()
     app.router.add_get('/', serve_html)
-    
-    # Start WebSocket server
-    ws_server = await websockets.serve(handle_websocket, '0.0.0.0', ws_port)
+    app.router.add_get('/ws', websocket_route(handle_websocket))
     
     print("\n" + "="*50)
     print("PHONE REMOTE CONTROL - SIMPLE VERSION")
     print("="*50)
-    print(f"\nServer running at: http://{local_ip}:{http_port}")
-    print(f"WebSocket port: {ws_port}")
+    print(f"\nServer running at: http://{addresses[0]}:{http_port}")
+    for address in addresses[1:]:
+        print(f"  Also reachable at: http://{address}:{http_port}")
+    print(f"WebSocket: ws://{addresses[0]}:{http_port}/ws (legacy port {ws_port})")
     print("\nOpen this address on your phone's browser")
     print("="*50 + "\n")
     
@@ -412,6 +405,13 @@ async def main():
     site = web.TCPSite(runner, '0.0.0.0', http_port)
     await site.start()
     
+    # Start WebSocket server
+    import websockets
+    ConnectionClosed = websockets.ConnectionClosed
+    ws_server = await websockets.serve(handle_websocket, '0.0.0.0', ws_port,
+                                       subprotocols=protocol.SUBPROTOCOLS,
+                                       select_subprotocol=protocol.select_subprotocol)
+    
     # Keep server running
     await asyncio.Future()
 
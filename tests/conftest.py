@@ -0,0 +1,12 @@
+"""
+Test Setup
+Puts the project folder on sys.path, so the tests import the server modules
+however pytest is started (e.g. 'pytest tests' from anywhere).
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Pointer Ballistics Tests
+Gain curves, sub-pixel carry and stroke resets of ballistics.py, and the
+One-Euro filter it smooths the pointer speed with.
+"""
+
+import unittest
+
+import ballistics
+from ballistics import OneEuroFilter, PointerBallistics, PROFILES
+
+
+class OneEuroFilterTest(unittest.TestCase):
+
+    def test_first_sample_passes_through(self):
+        self.assertEqual(OneEuroFilter()(42.0, 0.01), 42.0)
+
+    def test_constant_signal_stays_put(self):
+        smooth = OneEuroFilter()
+        for _ in range(50):
+            value = smooth(10.0, 0.01)
+        self.assertAlmostEqual(value, 10.0)
+
+    def test_jitter_is_damped(self):
+        smooth = OneEuroFilter()
+        smooth(100.0, 0.01)
+        value = smooth(200.0, 0.01)
+        self.assertGreater(value, 100.0)
+        self.assertLess(value, 150.0)
+
+    def test_fast_changes_are_followed_more_closely(self):
+        # The cutoff rises with the speed of change (beta), so there is less lag
+        slow, fast = OneEuroFilter(beta=0.0), OneEuroFilter(beta=0.01)
+        for smooth in (slow, fast):
+            for i in range(20):
+                value = smooth(i * 1000.0, 0.01)
+        self.assertGreater(fast(20000.0, 0.01), slow(20000.0, 0.01))
+
+    def test_reset_forgets_the_signal(self):
+        smooth = OneEuroFilter()
+        smooth(500.0, 0.01)
+        smooth.reset()
+        self.assertEqual(smooth(5.0, 0.01), 5.0)
+
+
+class PointerBallisticsTest(unittest.TestCase):
+
+    def test_linear_is_one_to_one(self):
+        pointer = PointerBallistics('linear')
+        self.assertEqual(pointer.apply(7, -3, 0.0), (7, -3))
+        self.assertEqual(pointer.apply(250, 0, 0.001), (250, 0))
+
+    def test_gain_curve(self):
+        for name, (min_gain, max_gain, v_low, v_high, _) in PROFILES.items():
+            pointer = PointerBallistics(name)
+            with self.subTest(name):
+                self.assertEqual(pointer.gain(0), min_gain)
+                self.assertEqual(pointer.gain(v_low), min_gain)
+                self.assertEqual(pointer.gain(v_high), max_gain)
+                self.assertEqual(pointer.gain(v_high * 10), max_gain)
+                middle = pointer.gain((v_low + v_high) / 2)
+                self.assertAlmostEqual(middle, (min_gain + max_gain) / 2)
+
+    def test_gain_rises_with_speed(self):
+        pointer = PointerBallistics('balanced')
+        gains = [pointer.gain(speed) for speed in range(0, 2000, 50)]
+        self.assertEqual(gains, sorted(gains))
+
+    def test_fractions_are_carried(self):
+        pointer = PointerBallistics('precise')
+        now = 0.0
+        total = 0
+        # Slow moves, all at the minimum gain of 0.4: 100 * 1 px -> 40 px
+        for _ in range(100):
+            now += 0.05
+            total += pointer.apply(1, 0, now)[0]
+        self.assertEqual(total, 40)
+
+    def test_fast_fling_is_amplified(self):
+        pointer = PointerBallistics('fast')
+        now = 0.0
+        for _ in range(20):
+            now += 0.008
+            ix, _ = pointer.apply(40, 0, now)
+        # 5000 px/s, well above v_high
+        self.assertGreater(ix, 40 * 3)
+
+    def test_new_stroke_starts_slow(self):
+        pointer = PointerBallistics('fast')
+        pointer.apply(40, 0, 0.0)
+        for i in range(1, 20):
+            pointer.apply(40, 0, i * 0.008)
+        # After a pause longer than IDLE_RESET the speed estimate starts over at the slow end
+        ix, _ = pointer.apply(10, 0, 19 * 0.008 + ballistics.IDLE_RESET * 2)
+        self.assertLessEqual(ix, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Command Registry Tests
+Argument validation of commands.py: malformed JSON and binary commands are
+rejected with False instead of raising, and a batch is queued whole or not
+at all.
+"""
+
+import json
+import unittest
+
+import commands
+import protocol
+from backends import RecordingBackend
+from clients import RemoteClient
+from injector import InputInjector
+from monitors import Monitor, MonitorLayout
+
+NAN = float('nan')
+INF = float('inf')
+
+
+class FakeWebSocket:
+    remote_address = ('192.0.2.1', 50000)
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_numbers(self):
+        for value in (0, -3, 2.5, 2 ** 53):
+            self.assertTrue(commands._is_number(value), value)
+        for value in (NAN, INF, -INF, True, False, 2 ** 53 + 1, '1', None, [1]):
+            self.assertFalse(commands._is_number(value), value)
+
+    def test_move(self):
+        self.assertEqual(commands._parse_move({'dx': 1, 'dy': -2.5}), (1, -2.5))
+        for dx in (NAN, INF, True, '1', None):
+            self.assertIsNone(commands._parse_move({'dx': dx, 'dy': 1}), dx)
+
+    def test_mouse_abs(self):
+        self.assertEqual(commands._parse_mouse_abs({'x': 0.5, 'y': 1}), (0.5, 1, -1))
+        self.assertIsNone(commands._parse_mouse_abs({'x': NAN, 'y': 0}))
+        self.assertIsNone(commands._parse_mouse_abs({'x': 0, 'y': 0, 'monitor': True}))
+        self.assertIsNone(commands._parse_mouse_abs({'x': 0, 'y': 0, 'monitor': -2}))
+
+    def test_buttons(self):
+        self.assertEqual(commands._parse_click({}), ('left', False))
+        self.assertEqual(commands._parse_click({'button': 'right', 'double': 1}), ('right', True))
+        self.assertEqual(commands._parse_button({'button': 'middle'}), ('middle',))
+        for button in (['left'], {'left': 1}, 0, None, 'side'):
+            self.assertIsNone(commands._parse_click({'button': button}), button)
+            self.assertIsNone(commands._parse_button({'button': button}), button)
+
+    def test_keys_and_text(self):
+        self.assertEqual(commands._parse_key({'key': 'enter'}), ('enter',))
+        self.assertIsNone(commands._parse_key({'key': ''}))
+        self.assertIsNone(commands._parse_key({'key': ['a']}))
+        self.assertEqual(commands._parse_combo({'keys': ['ctrl', 'c']}), ('ctrl', 'c'))
+        self.assertIsNone(commands._parse_combo({'keys': []}))
+        self.assertIsNone(commands._parse_combo({'keys': ['ctrl', 1]}))
+        self.assertIsNone(commands._parse_combo({'keys': 'ctrl'}))
+        self.assertEqual(commands._parse_text({'text': ''}), ('',))
+        self.assertIsNone(commands._parse_text({'text': None}))
+
+    def test_touch(self):
+        touch = {'phase': 'down', 'id': 1, 'x': 10, 'y': 20, 't': 5.9}
+        self.assertEqual(commands._parse_touch(touch), ('down', 1, 10, 20, 5))
+        for field, value in (('phase', ['down']), ('phase', 'hover'), ('id', True), ('id', 1.0),
+                             ('x', NAN), ('y', INF), ('t', INF), ('t', NAN)):
+            self.assertIsNone(commands._parse_touch(dict(touch, **{field: value})), (field, value))
+
+    def test_scroll_touch(self):
+        self.assertEqual(commands._parse_scroll_touch({'phase': 'start'}), ('start', 0, 0))
+        self.assertIsNone(commands._parse_scroll_touch({'phase': ['move']}))
+        self.assertIsNone(commands._parse_scroll_touch({'phase': 'end', 'y': -INF}))
+
+    def test_settings(self):
+        self.assertEqual(commands._parse_touch_config({'sensitivity': 2}), (2, None))
+        for config in ({'sensitivity': 0}, {'sensitivity': NAN}, {'sensitivity': 21},
+                       {'double_tap': ['click']}, {'double_tap': 'triple'}):
+            self.assertIsNone(commands._parse_touch_config(config), config)
+        self.assertEqual(commands._parse_pointer_config({'profile': ''}), (None,))
+        self.assertIsNone(commands._parse_pointer_config({'profile': ['fast']}))
+        self.assertIsNone(commands._parse_pointer_config({'profile': 'ludicrous'}))
+        self.assertEqual(commands._parse_pong({'id': 3}), (3,))
+        self.assertIsNone(commands._parse_pong({'id': True}))
+
+
+class DispatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = RecordingBackend()
+        self.injector = InputInjector(move_hz=0)
+        layout = MonitorLayout(lambda: [Monitor(0, 0, 1920, 1080, True)])
+        layout.refresh()
+        self.registry = commands.create_registry(self.backend, layout=layout)
+        self.client = RemoteClient(FakeWebSocket(), self.injector)
+
+    def tearDown(self):
+        self.client.close()
+
+    def dispatch(self, message):
+        return self.registry.dispatch_message(message, self.client)
+
+    def test_valid_commands_are_queued(self):
+        self.assertTrue(self.dispatch('{"type": "mouse_move", "dx": 3, "dy": 4}'))
+        self.assertTrue(self.dispatch(protocol.encode({'type': 'click', 'button': 'left'})))
+        self.assertTrue(self.dispatch('{"type": "mouse_abs", "x": 1, "y": 1}'))
+        self.assertEqual(len(self.client.lane), 3)
+
+    def test_malformed_json_is_rejected(self):
+        for message in ('', 'not json', '[1, 2]', '"mouse_move"', '{"dx": 1}',
+                        '{"type": "warp"}', '{"type": ["mouse_move"]}', '{"type": {}}',
+                        '{"type": "mouse_move", "dx": NaN, "dy": 1}',
+                        '{"type": "mouse_move", "dx": Infinity, "dy": 1}',
+                        '{"type": "click", "button": ["left"]}',
+                        '{"type": "touch", "phase": "down", "x": 1, "y": 1, "t": Infinity}',
+                        '{"type": "batch", "events": []}', '{"type": "batch", "events": {}}'):
+            with self.subTest(message):
+                self.assertFalse(self.dispatch(message))
+        self.assertEqual(len(self.client.lane), 0)
+
+    def test_malformed_binary_is_rejected(self):
+        for frame in (b'', b'\xff', protocol.encode({'type': 'scroll', 'dy': 1})[:-1],
+                      bytes([protocol.OP_CLICK, 9, 0])):
+            with self.subTest(frame):
+                self.assertFalse(self.dispatch(frame))
+        self.assertEqual(len(self.client.lane), 0)
+
+    def test_batch_is_all_or_nothing(self):
+        good = {'type': 'key', 'key': 'a'}
+        bad = {'type': 'click', 'button': 'thumb'}
+        self.assertFalse(self.dispatch(json.dumps({'type': 'batch', 'events': [good, bad]})))
+        self.assertEqual(len(self.client.lane), 0)
+        self.assertTrue(self.dispatch(json.dumps({'type': 'batch', 'events': [good, good]})))
+        self.assertEqual(len(self.client.lane), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+mDNS Responder Tests
+DNS message encoding and parsing of discovery.py, and how MdnsResponder
+handles queries and responses: silence while probing, conflicts only from
+well-formed A records for other addresses, and malformed packets ignored.
+A fake transport records what would be sent; nothing touches the network.
+"""
+
+import socket
+import struct
+import unittest
+
+import discovery
+from discovery import MdnsResponder, MDNS_PORT
+
+ADDRESS = '192.168.1.20'
+
+
+class FakeSocket:
+    def setsockopt(self, *args):
+        pass
+
+
+class FakeTransport:
+    def __init__(self):
+        self.sent = []
+
+    def get_extra_info(self, name):
+        return FakeSocket()
+
+    def sendto(self, packet, addr):
+        self.sent.append((packet, addr))
+
+
+def response(answers):
+    """A DNS response carrying the given records"""
+    return discovery._message(0, answers)
+
+
+class MessageTest(unittest.TestCase):
+
+    def test_query_round_trip(self):
+        query = discovery._query('Phone-Remote.local', discovery._TYPE_A)
+        ident, flags, questions, answers = discovery.parse_message(query)
+        self.assertEqual((ident, flags, answers), (0, 0, []))
+        self.assertEqual(questions, [('phone-remote.local', discovery._TYPE_A, False)])
+
+    def test_records_round_trip(self):
+        a = discovery._record('pc.local', discovery._TYPE_A, socket.inet_aton(ADDRESS), 120, True)
+        txt = discovery._record('pc._http._tcp.local', discovery._TYPE_TXT, b'\x03a=b', 120, True)
+        _, flags, _, answers = discovery.parse_message(response([a, txt]))
+        self.assertTrue(flags & 0x8000)
+        self.assertEqual(answers, [('pc.local', discovery._TYPE_A, socket.inet_aton(ADDRESS)),
+                                   ('pc._http._tcp.local', discovery._TYPE_TXT, b'\x03a=b')])
+
+    def test_compressed_names(self):
+        header = struct.pack('!6H', 0, 0, 2, 0, 0, 0)
+        first = discovery._encode_name('pc.local') + struct.pack('!HH', 1, 1)
+        # 'www' followed by a pointer to 'pc.local' at offset 12
+        second = b'\x03www\xc0\x0c' + struct.pack('!HH', 1, 1)
+        _, _, questions, _ = discovery.parse_message(header + first + second)
+        self.assertEqual([name for name, _, _ in questions], ['pc.local', 'www.pc.local'])
+
+    def test_pointer_loop(self):
+        header = struct.pack('!6H', 0, 0, 1, 0, 0, 0)
+        with self.assertRaises(ValueError):
+            discovery.parse_message(header + b'\xc0\x0c' + struct.pack('!HH', 1, 1))
+
+    def test_closest_first(self):
+        addresses = ['10.0.0.5', '192.168.1.20', '172.16.0.1']
+        self.assertEqual(discovery.closest_first(addresses, '192.168.1.77')[0], '192.168.1.20')
+        self.assertEqual(discovery.closest_first(addresses, 'fe80::1'), addresses)
+
+
+class ResponderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.responder = MdnsResponder('pc', 8080, [ADDRESS])
+        self.transport = FakeTransport()
+        self.responder.connection_made(self.transport)
+
+    def receive(self, packet, addr=('192.168.1.77', MDNS_PORT)):
+        self.responder.datagram_received(packet, addr)
+
+    def a_record(self, rdata, name='pc.local'):
+        return discovery._record(name, discovery._TYPE_A, rdata, 120, True)
+
+    def test_silent_while_probing(self):
+        self.receive(discovery._query('pc.local', discovery._TYPE_A))
+        self.assertEqual(self.transport.sent, [])
+        self.responder._probing = False
+        self.receive(discovery._query('pc.local', discovery._TYPE_A))
+        self.assertEqual(len(self.transport.sent), 1)
+        _, _, _, answers = discovery.parse_message(self.transport.sent[0][0])
+        self.assertEqual(answers, [('pc.local', discovery._TYPE_A, socket.inet_aton(ADDRESS))])
+
+    def test_legacy_unicast_query_gets_a_direct_reply(self):
+        self.responder._probing = False
+        query = bytearray(discovery._query('pc.local', discovery._TYPE_A))
+        query[0:2] = b'\x12\x34'
+        self.receive(bytes(query), ('192.168.1.77', 40000))
+        packet, addr = self.transport.sent[0]
+        self.assertEqual(addr, ('192.168.1.77', 40000))
+        ident, _, questions, _ = discovery.parse_message(packet)
+        self.assertEqual(ident, 0x1234)
+        self.assertEqual(questions, [('pc.local', discovery._TYPE_A, False)])
+
+    def test_other_names_are_ignored(self):
+        self.responder._probing = False
+        self.receive(discovery._query('other.local', discovery._TYPE_A))
+        self.assertEqual(self.transport.sent, [])
+
+    def test_conflict_from_another_address(self):
+        self.receive(response([self.a_record(socket.inet_aton('192.168.1.99'))]))
+        self.assertTrue(self.responder._conflict)
+
+    def test_own_address_is_no_conflict(self):
+        self.receive(response([self.a_record(socket.inet_aton(ADDRESS))]))
+        self.assertFalse(self.responder._conflict)
+
+    def test_malformed_a_records_are_ignored(self):
+        for rdata in (b'', b'\x01\x02\x03', b'\x00' * 16):
+            with self.subTest(rdata):
+                self.receive(response([self.a_record(rdata)]))
+                self.assertFalse(self.responder._conflict)
+
+    def test_truncated_packets_are_ignored(self):
+        self.responder._probing = False
+        query = discovery._query('pc.local', discovery._TYPE_A)
+        answer = response([self.a_record(socket.inet_aton('192.168.1.99'))])
+        for packet in (b'', b'\x00' * 5, query[:-3], query[:15], answer[:-6]):
+            with self.subTest(packet):
+                self.receive(packet)
+        self.assertEqual(self.transport.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Gesture Recognizer Tests
+Touch sequences through gestures.py against the recording backend: taps,
+double taps in both modes, holds, drags, two-finger taps and swipes. Each
+test runs on its own event loop (the hold timer needs one) with a short
+HOLD_TIME, and reads the backend calls after draining the injector.
+"""
+
+import asyncio
+import json
+import unittest
+
+import gestures
+from backends import RecordingBackend
+from clients import RemoteClient
+from injector import InputInjector
+
+HOLD = 0.02
+
+
+class FakeWebSocket:
+    remote_address = ('192.0.2.1', 50000)
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+class GestureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hold_time = gestures.HOLD_TIME
+        gestures.HOLD_TIME = HOLD
+        self.backend = RecordingBackend()
+        self.injector = InputInjector(move_hz=0, max_rate=0)
+        self.websocket = FakeWebSocket()
+        self.client = RemoteClient(self.websocket, self.injector)
+        self.move_rel = self.backend.move_rel
+
+    def tearDown(self):
+        gestures.HOLD_TIME = self.hold_time
+
+    def run_touches(self, events, double_tap='click'):
+        """Feed (phase, pointer, x, y, t) events, seconds to wait, or coroutine functions to await
+
+        Returns the backend calls and the gestures reported to the phone.
+        """
+        async def feed():
+            self.client.gestures = gestures.GestureRecognizer(
+                self.client, self.backend, self.move_rel, sensitivity=1.0, double_tap=double_tap)
+            for event in events:
+                if isinstance(event, tuple):
+                    self.client.gestures.on_touch(*event)
+                elif callable(event):
+                    await event()
+                else:
+                    await asyncio.sleep(event)
+            # Let the gesture notifications go out
+            await asyncio.sleep(0)
+
+        asyncio.run(feed())
+        self.injector.start()
+        self.injector.stop(timeout=2.0)
+        calls = [(method, args) for _, method, args in self.backend.take()]
+        names = [message['gesture'] for message in self.websocket.sent if message['type'] == 'gesture']
+        return calls, names
+
+    def test_tap_clicks_at_once(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('up', 1, 0, 0, 80)])
+        self.assertEqual(calls, [('mouse_down', ('left',)), ('mouse_up', ('left',))])
+        self.assertEqual(names, ['Click'])
+
+    def test_second_tap_is_absorbed(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('up', 1, 0, 0, 80),
+                                         ('down', 1, 0, 0, 150), ('up', 1, 0, 0, 230)])
+        self.assertEqual(calls, [('mouse_down', ('left',)), ('mouse_up', ('left',))])
+        self.assertEqual(names, ['Click'])
+
+    def test_second_tap_completes_double_click(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('up', 1, 0, 0, 80),
+                                         ('down', 1, 0, 0, 150), ('up', 1, 0, 0, 230)],
+                                        double_tap='double')
+        # The second click lands within the OS double-click time of the first
+        self.assertEqual(calls, [('mouse_down', ('left',)), ('mouse_up', ('left',))] * 2)
+        self.assertEqual(names, ['Click', 'Double Click'])
+
+    def test_late_second_tap_is_a_new_click(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('up', 1, 0, 0, 80),
+                                         ('down', 1, 0, 0, 1000), ('up', 1, 0, 0, 1080)])
+        self.assertEqual(names, ['Click', 'Click'])
+
+    def test_hold_is_a_right_click(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), HOLD * 3, ('up', 1, 0, 0, 900)])
+        self.assertEqual(calls, [('mouse_down', ('right',)), ('mouse_up', ('right',))])
+        self.assertEqual(names, ['Right Click (Hold)'])
+
+    def test_tap_and_hold_drags(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('up', 1, 0, 0, 80),
+                                         ('down', 1, 0, 0, 150), HOLD * 3,
+                                         ('move', 1, 20, 10, 700), ('up', 1, 20, 10, 800)])
+        self.assertEqual(calls, [
+            ('mouse_down', ('left',)), ('mouse_up', ('left',)),
+            ('mouse_down', ('left',)),
+            ('move_rel', (20.0, 10.0)),
+            ('mouse_up', ('left',)),
+        ])
+        self.assertEqual(names, ['Click', 'Drag Start', 'Drag End'])
+        self.assertFalse(self.client.input_state.holding)
+
+    def test_cancel_releases_a_drag(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('up', 1, 0, 0, 80),
+                                         ('down', 1, 0, 0, 150), HOLD * 3,
+                                         ('cancel', 1, 0, 0, 700)])
+        self.assertEqual(calls[-1], ('mouse_up', ('left',)))
+        self.assertFalse(self.client.input_state.holding)
+
+    def test_losing_control_cancels_the_hold(self):
+        async def lose_control():
+            await asyncio.sleep(HOLD / 4)
+            self.client.release_input('control')
+
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), lose_control, HOLD * 3])
+        self.assertEqual(calls, [])
+        self.assertEqual(names, [])
+
+    def test_two_finger_tap_is_a_right_click(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('down', 2, 50, 0, 10),
+                                         ('up', 2, 50, 0, 90), ('up', 1, 0, 0, 100)])
+        self.assertEqual(calls, [('mouse_down', ('right',)), ('mouse_up', ('right',))])
+        self.assertEqual(names, ['Right Click'])
+
+    def test_swipe_moves_without_clicking(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('move', 1, 3, 0, 20),
+                                         ('move', 1, 10, 4, 40), HOLD * 3, ('up', 1, 10, 4, 900)])
+        self.assertEqual(calls, [('move_rel', (10.0, 4.0))])
+        self.assertEqual(names, [])
+
+    def test_small_wobble_is_still_a_tap(self):
+        calls, names = self.run_touches([('down', 1, 0, 0, 0), ('move', 1, 2, 2, 20),
+                                         ('up', 1, 2, 2, 80)])
+        self.assertEqual(names, ['Click'])
+
+    def test_timestamps_wrap(self):
+        self.assertEqual(gestures._elapsed(5, 0xFFFFFFFF - 4), 10)
+        start = 0xFFFFFFFF - 20
+        calls, names = self.run_touches([('down', 1, 0, 0, start), ('up', 1, 0, 0, start + 80)])
+        self.assertEqual(names, ['Click'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Injector Lane Tests
+Lane policy of injector.py against the recording backend: coalescing,
+never-drop vs droppable commands, rate limits and round-robin fairness.
+Commands are queued before the worker starts, and stop() drains the queue,
+so the order of the recorded calls is deterministic.
+"""
+
+import time
+import unittest
+
+from backends import RecordingBackend
+from injector import InputInjector, SCROLL_STALE_AFTER
+
+
+def calls(backend):
+    """Recorded calls without their timestamps"""
+    return [(method, args) for _, method, args in backend.take()]
+
+
+class LaneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = RecordingBackend()
+        # No motion tick, so coalesced moves apply as soon as the worker gets to them
+        self.injector = InputInjector(move_hz=0, max_rate=0, lane_size=4)
+        self.lane = self.injector.open_lane('phone')
+        # Bound once, as in commands.py: lanes only merge moves with the same callable
+        self.move_rel = self.backend.move_rel
+        self.move_to = self.backend.move_to
+
+    def run_worker(self):
+        self.injector.start()
+        self.injector.stop(timeout=2.0)
+        return calls(self.backend)
+
+    def test_moves_coalesce(self):
+        for dx, dy in ((1, 0), (2, 1), (3, -4)):
+            self.lane.submit_move(self.move_rel, dx, dy)
+        self.assertEqual(self.run_worker(), [('move_rel', (6, -3))])
+
+    def test_moves_do_not_jump_other_commands(self):
+        self.lane.submit_move(self.move_rel, 1, 1)
+        self.lane.submit('mousedown', self.backend.mouse_down, 'left')
+        self.lane.submit_move(self.move_rel, 2, 2)
+        self.lane.submit_move(self.move_rel, 3, 3)
+        self.lane.submit('mouseup', self.backend.mouse_up, 'left')
+        self.assertEqual(self.run_worker(), [
+            ('move_rel', (1, 1)),
+            ('mouse_down', ('left',)),
+            ('move_rel', (5, 5)),
+            ('mouse_up', ('left',)),
+        ])
+
+    def test_newest_position_wins(self):
+        for x in (10, 20, 30):
+            self.lane.submit_position(self.move_to, x, x)
+        self.assertEqual(self.run_worker(), [('move_to', (30, 30))])
+
+    def test_non_finite_moves_are_rejected(self):
+        self.assertFalse(self.lane.submit_move(self.move_rel, float('nan'), 1))
+        self.assertFalse(self.lane.submit_position(self.move_to, 1, float('inf')))
+        self.assertEqual(self.run_worker(), [])
+
+    def test_failing_command_does_not_stop_the_worker(self):
+        def fail():
+            raise ValueError("backend error")
+
+        self.lane.submit('key', fail)
+        # Overflows the ballistics' int conversion on the worker
+        self.lane.submit_move(self.move_rel, 1e308, 0)
+        self.lane.submit_move(self.move_rel, 1e308, 0)
+        self.lane.submit('key', self.backend.press, 'a')
+        self.assertEqual(self.run_worker(), [('key_down', ('a',)), ('key_up', ('a',))])
+
+    def test_full_lane_keeps_commands(self):
+        for i in range(10):
+            self.assertTrue(self.lane.submit('key', self.backend.key_down, str(i)))
+        self.assertGreater(self.lane.backpressure_delay(), 0)
+        self.assertEqual(self.run_worker(), [('key_down', (str(i),)) for i in range(10)])
+
+    def test_full_lane_sheds_droppable_commands(self):
+        accepted = [self.lane.submit_droppable('scroll', self.backend.scroll, i) for i in range(6)]
+        self.assertEqual(accepted, [True] * 4 + [False] * 2)
+        self.assertEqual(self.run_worker(), [('scroll', (i,)) for i in range(4)])
+
+    def test_over_rate_lane(self):
+        lane = self.injector.open_lane('flood', max_rate=3)
+        accepted = [lane.submit_droppable('scroll', self.backend.scroll, 1) for _ in range(5)]
+        self.assertEqual(accepted, [True] * 3 + [False] * 2)
+        # Never-drop commands are accepted over the rate, and the connection is asked to pause
+        self.assertTrue(lane.submit('click', self.backend.click, 'left', False))
+        self.assertGreater(lane.backpressure_delay(), 0)
+
+    def test_stale_scroll_is_dropped(self):
+        self.lane.submit_droppable('scroll', self.backend.scroll, 1)
+        self.lane.submit('key', self.backend.key_down, 'a')
+        item, _ = self.injector._next_item(time.monotonic() + SCROLL_STALE_AFTER + 0.1)
+        self.assertEqual(item[0], 'key')
+
+    def test_lanes_are_served_round_robin(self):
+        other = self.injector.open_lane('other')
+        for i in range(3):
+            self.lane.submit('key', self.backend.key_down, f'a{i}')
+        for i in range(3):
+            other.submit('key', self.backend.key_down, f'b{i}')
+        self.assertEqual([args[0] for _, args in self.run_worker()], ['a0', 'b0', 'a1', 'b1', 'a2', 'b2'])
+
+    def test_motion_gate(self):
+        gate_open = [False]
+        self.lane.motion_gate = lambda: gate_open[0]
+        self.assertFalse(self.lane.submit_move(self.move_rel, 1, 1))
+        self.lane.submit('click', self.backend.click, 'left', False)
+        gate_open[0] = True
+        self.lane.submit_move(self.move_rel, 2, 2)
+        self.assertEqual(self.run_worker(), [
+            ('mouse_down', ('left',)),
+            ('mouse_up', ('left',)),
+            ('move_rel', (2, 2)),
+        ])
+
+    def test_closed_lane_drains(self):
+        self.lane.submit('key', self.backend.key_down, 'a')
+        self.lane.close()
+        self.assertEqual(self.run_worker(), [('key_down', ('a',))])
+        self.assertNotIn(self.lane, self.injector._lanes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Held Input Tests
+Button and key tracking of input_state.py and its watchdog: releases on
+disconnect, heartbeat timeout and max hold time, with the phone told about
+each one. The watchdog runs with a short CHECK_INTERVAL on a real event loop.
+"""
+
+import asyncio
+import json
+import unittest
+
+import input_state
+from backends import RecordingBackend
+from clients import RemoteClient
+from injector import InputInjector
+from input_state import FORCED_RELEASES
+
+CHECK = 0.01
+
+
+class FakeWebSocket:
+    remote_address = ('192.0.2.1', 50000)
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+class InputStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.check_interval = input_state.CHECK_INTERVAL
+        input_state.CHECK_INTERVAL = CHECK
+        self.backend = RecordingBackend()
+        self.injector = InputInjector(move_hz=0, max_rate=0)
+        self.websocket = FakeWebSocket()
+
+    def tearDown(self):
+        input_state.CHECK_INTERVAL = self.check_interval
+
+    def run_client(self, steps, max_hold=60.0, heartbeat_timeout=0.05):
+        """Run steps(client), a coroutine function, on an event loop
+
+        Returns the backend calls and the 'released' events sent to the phone.
+        """
+        async def main():
+            client = RemoteClient(self.websocket, self.injector, max_hold, heartbeat_timeout)
+            await steps(client)
+            await asyncio.sleep(0)
+            client.input_state._cancel_timer()
+
+        asyncio.run(main())
+        self.injector.start()
+        self.injector.stop(timeout=2.0)
+        calls = [(method, args) for _, method, args in self.backend.take()]
+        released = [(m['kind'], m['name'], m['reason']) for m in self.websocket.sent if m['type'] == 'released']
+        return calls, released
+
+    def test_press_and_release(self):
+        async def steps(client):
+            state = client.input_state
+            state.press_button(self.backend, 'left')
+            state.press_key(self.backend, 'shift')
+            self.assertTrue(state.holding)
+            self.assertTrue(state.holding_button)
+            state.release_button(self.backend, 'left')
+            self.assertFalse(state.holding_button)
+            state.release_key(self.backend, 'shift')
+            self.assertFalse(state.holding)
+            # The watchdog stops at its next check once nothing is held
+            await asyncio.sleep(CHECK * 3)
+            self.assertIsNone(state._timer)
+
+        calls, released = self.run_client(steps)
+        self.assertEqual(calls, [('mouse_down', ('left',)), ('key_down', ('shift',)),
+                                 ('mouse_up', ('left',)), ('key_up', ('shift',))])
+        self.assertEqual(released, [])
+
+    def test_disconnect_releases_everything(self):
+        before = FORCED_RELEASES.value('button', 'disconnect')
+
+        async def steps(client):
+            client.input_state.press_button(self.backend, 'right')
+            client.input_state.press_key(self.backend, 'ctrl')
+            client.close()
+
+        calls, released = self.run_client(steps)
+        self.assertEqual(calls[2:], [('mouse_up', ('right',)), ('key_up', ('ctrl',))])
+        self.assertEqual(released, [('button', 'right', 'disconnect'), ('key', 'ctrl', 'disconnect')])
+        self.assertEqual(FORCED_RELEASES.value('button', 'disconnect'), before + 1)
+
+    def test_heartbeat_timeout(self):
+        async def steps(client):
+            client.input_state.heartbeat()
+            client.input_state.press_button(self.backend, 'left')
+            await asyncio.sleep(0.15)
+            self.assertFalse(client.input_state.holding)
+
+        calls, released = self.run_client(steps)
+        self.assertEqual(calls, [('mouse_down', ('left',)), ('mouse_up', ('left',))])
+        self.assertEqual(released, [('button', 'left', 'heartbeat')])
+
+    def test_messages_keep_a_drag_alive(self):
+        async def steps(client):
+            client.input_state.heartbeat()
+            client.input_state.press_button(self.backend, 'left')
+            for _ in range(15):
+                client.on_message()
+                await asyncio.sleep(0.01)
+            self.assertTrue(client.input_state.holding)
+
+        calls, released = self.run_client(steps)
+        self.assertEqual(released, [])
+
+    def test_no_heartbeat_timeout_without_heartbeats(self):
+        async def steps(client):
+            # Older pages never send heartbeats, so silence proves nothing
+            client.input_state.press_key(self.backend, 'alt')
+            await asyncio.sleep(0.15)
+            self.assertTrue(client.input_state.holding)
+
+        calls, released = self.run_client(steps)
+        self.assertEqual(released, [])
+
+    def test_max_hold(self):
+        async def steps(client):
+            client.input_state.press_key(self.backend, 'alt')
+            await asyncio.sleep(0.06)
+            client.input_state.press_button(self.backend, 'left')
+            # alt has been down for longer than max_hold, left not yet
+            await asyncio.sleep(0.07)
+            self.assertEqual(list(client.input_state._held), [('button', 'left')])
+
+        calls, released = self.run_client(steps, max_hold=0.1, heartbeat_timeout=0)
+        self.assertEqual(released, [('key', 'alt', 'max_hold')])
+
+
+if __name__ == "__main__":
+    unittest.main()
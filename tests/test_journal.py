@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Journal Tests
+Ring records of journal.py in a temporary directory: round trips of binary
+and JSON messages, wraparound, long messages split over several records,
+dispatch stamps, reopening, locking, masked typed text and file
+permissions, and a replay through the registry into the recording backend.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import journal
+import protocol
+from backends import RecordingBackend
+from commands import create_registry
+from injector import InputInjector
+from journal import Journal, read_journal
+
+
+class FakeClient:
+    def __init__(self, address='192.0.2.1', session_id=1):
+        self.address = address
+        self.session_id = session_id
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.journal')
+        self.client = FakeClient()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def append_json(self, ring, data, **kwargs):
+        message = json.dumps(data, separators=(',', ':'))
+        return ring.append(self.client, message.encode('utf-8'), False, **kwargs)
+
+    def append_frame(self, ring, data):
+        """Binary frames are short enough for one record each"""
+        return ring.append(self.client, protocol.encode(data), True)
+
+    def test_round_trip(self):
+        ring = Journal(self.path, 16)
+        click = protocol.encode({'type': 'click', 'button': 'right', 'double': False})
+        ring.append(self.client, click, True, seq=7, ts=1234)
+        self.append_json(ring, {'type': 'key', 'key': 'enter'})
+        ring.append(FakeClient('2001:db8::1', 2), b'{"type":"scroll","dy":1}', False)
+        ring.close()
+        header, commands = read_journal(self.path)
+        self.assertEqual(header['records'], ring.next)
+        self.assertEqual([c['cmd']['type'] for c in commands], ['click', 'key', 'scroll'])
+        self.assertEqual(commands[0]['message'], click)
+        self.assertEqual((commands[0]['seq'], commands[0]['ts']), (7, 1234))
+        self.assertEqual([c['address'] for c in commands], ['192.0.2.1', '192.0.2.1', '2001:db8::1'])
+        self.assertEqual(commands[2]['client'], 2)
+        recv = [c['recv_ns'] for c in commands]
+        self.assertEqual(recv, sorted(recv))
+
+    def test_wraparound_keeps_the_newest(self):
+        ring = Journal(self.path, 8)
+        for i in range(20):
+            self.append_frame(ring, {'type': 'scroll', 'dy': i})
+        ring.close()
+        header, commands = read_journal(self.path)
+        self.assertEqual(header['records'], 20)
+        self.assertEqual([c['cmd']['dy'] for c in commands], list(range(12, 20)))
+
+    def test_long_messages_span_records(self):
+        ring = Journal(self.path, 8)
+        combo = {'type': 'hotkey', 'keys': ['ctrl', 'shift', 'alt', 'delete']}
+        index = self.append_json(ring, combo)
+        self.assertGreater(ring.next - index, 1)
+        ring.close()
+        self.assertEqual([c['cmd'] for c in read_journal(self.path)[1]], [combo])
+
+    def test_overwritten_start_is_skipped(self):
+        ring = Journal(self.path, 4)
+        self.append_json(ring, {'type': 'hotkey', 'keys': ['ctrl', 'shift', 'alt', 'delete']})
+        used = ring.next
+        # Overwrite just the first record of the long message
+        for i in range(4 - used + 1):
+            self.append_frame(ring, {'type': 'scroll', 'dy': i})
+        ring.close()
+        self.assertTrue(all(c['cmd']['type'] == 'scroll' for c in read_journal(self.path)[1]))
+
+    def test_mark_dispatched(self):
+        ring = Journal(self.path, 4)
+        first = self.append_frame(ring, {'type': 'scroll', 'dy': 1})
+        second = self.append_frame(ring, {'type': 'scroll', 'dy': 2})
+        ring.mark_dispatched(second, 12.5)
+        for _ in range(4):
+            self.append_frame(ring, {'type': 'scroll', 'dy': 3})
+        # Overwritten already: must not stamp the record now in its slot
+        ring.mark_dispatched(first, 99.0)
+        ring.close()
+        ring.mark_dispatched(second, 13.0)
+        commands = read_journal(self.path)[1]
+        self.assertTrue(all(c['dispatch_ns'] == 0 for c in commands))
+
+        ring = Journal(self.path, 4)
+        index = self.append_frame(ring, {'type': 'scroll', 'dy': 4})
+        ring.mark_dispatched(index, 12.5)
+        ring.close()
+        self.assertEqual(read_journal(self.path)[1][-1]['dispatch_ns'], 12500000000)
+
+    def test_reopen_continues_the_ring(self):
+        ring = Journal(self.path, 8)
+        self.append_frame(ring, {'type': 'scroll', 'dy': 1})
+        ring.close()
+        ring = Journal(self.path, 8)
+        self.assertEqual(ring.next, 1)
+        self.append_frame(ring, {'type': 'scroll', 'dy': 2})
+        ring.close()
+        self.assertEqual([c['cmd']['dy'] for c in read_journal(self.path)[1]], [1, 2])
+        # A different size starts over
+        Journal(self.path, 16).close()
+        self.assertEqual(read_journal(self.path)[1], [])
+
+    def test_one_writer_at_a_time(self):
+        ring = Journal(self.path, 8)
+        try:
+            with self.assertRaises(BlockingIOError):
+                Journal(self.path, 8)
+        finally:
+            ring.close()
+        Journal(self.path, 8).close()
+
+    def test_typed_text_is_masked(self):
+        ring = Journal(self.path, 16)
+        self.append_json(ring, {'type': 'type', 'text': 'hunter2'})
+        self.append_json(ring, {'type': 'batch', 'events': [{'type': 'type', 'text': 'pin 1234'},
+                                                           {'type': 'key', 'key': 'enter'}]})
+        ring.close()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertNotIn(b'hunter2', data)
+        self.assertNotIn(b'1234', data)
+        commands = read_journal(self.path)[1]
+        self.assertEqual(commands[0]['cmd']['text'], journal.REDACTED * 7)
+        self.assertEqual(commands[1]['cmd']['events'][0]['text'], journal.REDACTED * 8)
+        self.assertEqual(commands[1]['cmd']['events'][1], {'type': 'key', 'key': 'enter'})
+
+    @unittest.skipIf(sys.platform == 'win32', "POSIX permissions")
+    def test_private_file(self):
+        path = os.path.join(self.directory, 'new', 'private.journal')
+        Journal(path, 8).close()
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+        link = os.path.join(self.directory, 'link.journal')
+        os.symlink(path, link)
+        with self.assertRaises(OSError):
+            Journal(link, 8)
+
+    def test_replay(self):
+        ring = Journal(self.path, 64)
+        self.append_json(ring, {'type': 'key', 'key': 'a'})
+        ring.append(self.client, protocol.encode({'type': 'mouse_move', 'dx': 5, 'dy': -5}), True)
+        ring.append(self.client, protocol.encode({'type': 'click', 'button': 'left', 'double': False}), True)
+        ring.close()
+        commands = read_journal(self.path)[1]
+
+        backend = RecordingBackend()
+        input_injector = InputInjector(move_hz=0, max_rate=0)
+        registry = create_registry(backend)
+        asyncio.run(journal._replay(commands, 0, registry, input_injector))
+        input_injector.start()
+        input_injector.stop(timeout=2.0)
+        calls = [(method, args) for _, method, args in backend.take()]
+        self.assertEqual(calls, [('key_down', ('a',)), ('key_up', ('a',)), ('move_rel', (5, -5)),
+                                 ('mouse_down', ('left',)), ('mouse_up', ('left',))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Binary Protocol Tests
+Encode/decode round trips of every frame type of protocol.py, timing
+trailers and batches, and rejection of malformed frames.
+"""
+
+import unittest
+
+import protocol
+
+COMMANDS = [
+    {'type': 'mouse_move', 'dx': -12, 'dy': 300},
+    {'type': 'click', 'button': 'right', 'double': True},
+    {'type': 'mousedown', 'button': 'left'},
+    {'type': 'mouseup', 'button': 'middle'},
+    {'type': 'scroll', 'dy': -3},
+    {'type': 'touch', 'phase': 'move', 'id': 2, 'x': 150, 'y': -40, 't': 123456},
+    {'type': 'scroll_touch', 'phase': 'end', 'x': 0, 'y': -900},
+    {'type': 'mouse_abs', 'x': 0.0, 'y': 1.0, 'monitor': 1},
+]
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def test_every_frame_type(self):
+        for command in COMMANDS:
+            with self.subTest(command['type']):
+                frame = protocol.encode(command)
+                self.assertEqual(len(frame), protocol.FRAMES[frame[0]][2])
+                self.assertEqual(protocol.decode(frame), command)
+
+    def test_trailer(self):
+        frame = protocol.encode(COMMANDS[0]) + protocol._TRAILER.pack(7, 99999)
+        self.assertEqual(protocol.decode(frame), dict(COMMANDS[0], seq=7, ts=99999))
+
+    def test_batch(self):
+        batch = {'type': 'batch', 'events': COMMANDS}
+        frame = protocol.encode(batch)
+        self.assertEqual(protocol.decode(frame), batch)
+        frames, trailer = protocol.split_batch(frame + protocol._TRAILER.pack(1, 2))
+        self.assertEqual([bytes(part) for part in frames], [protocol.encode(c) for c in COMMANDS])
+        self.assertEqual(trailer, (1, 2))
+
+    def test_values_are_clamped(self):
+        decoded = protocol.decode(protocol.encode({'type': 'mouse_move', 'dx': 1e9, 'dy': -1e9}))
+        self.assertEqual((decoded['dx'], decoded['dy']), (32767, -32768))
+        decoded = protocol.decode(protocol.encode({'type': 'mouse_abs', 'x': 2, 'y': -1}))
+        self.assertEqual((decoded['x'], decoded['y'], decoded['monitor']), (1.0, 0.0, -1))
+
+    def test_no_binary_form(self):
+        self.assertIsNone(protocol.encode({'type': 'key', 'key': 'a'}))
+        self.assertIsNone(protocol.encode({'type': 'batch', 'events': [{'type': 'key', 'key': 'a'}]}))
+
+
+class MalformedTest(unittest.TestCase):
+
+    def assertRejected(self, frame):
+        with self.assertRaises(ValueError):
+            protocol.decode(frame)
+
+    def test_empty_and_unknown(self):
+        self.assertRejected(b'')
+        self.assertRejected(b'\xff\x00\x00')
+
+    def test_wrong_length(self):
+        for command in COMMANDS:
+            frame = protocol.encode(command)
+            with self.subTest(command['type']):
+                self.assertRejected(frame[:-1])
+                self.assertRejected(frame + b'\x00')
+
+    def test_out_of_range_codes(self):
+        self.assertRejected(bytes([protocol.OP_CLICK, len(protocol.BUTTONS), 0]))
+        self.assertRejected(bytes([protocol.OP_MOUSEDOWN, 200]))
+        self.assertRejected(bytes([protocol.OP_TOUCH, len(protocol.TOUCH_PHASES)]) + bytes(9))
+        self.assertRejected(bytes([protocol.OP_SCROLL_TOUCH, len(protocol.SCROLL_PHASES)]) + bytes(4))
+
+    def test_malformed_batches(self):
+        move = protocol.encode(COMMANDS[0])
+        batch = protocol.encode({'type': 'batch', 'events': COMMANDS[:2]})
+        cases = {
+            'too short': bytes([protocol.OP_BATCH]),
+            'count too high': bytes([protocol.OP_BATCH, 3]) + batch[2:],
+            'truncated frame': batch[:-1],
+            'trailing bytes': batch + b'\x00',
+            'unknown opcode': bytes([protocol.OP_BATCH, 1, 0xff]) + move[1:],
+            'nested batch': bytes([protocol.OP_BATCH, 1]) + batch,
+        }
+        for name, frame in cases.items():
+            with self.subTest(name):
+                self.assertIsNone(protocol.split_batch(frame))
+                self.assertRejected(frame)
+
+    def test_unpackers_check_size(self):
+        for opcode, (name, _, size, unpack) in protocol.FRAMES.items():
+            with self.subTest(name):
+                self.assertIsNone(unpack(bytes([opcode]) + bytes(size)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Kinetic Scrolling Tests
+Direct and coasting scrolls of scrolling.py against the recording backend.
+Coasting is sped up (short TAU, fast tick), and the injector runs alongside
+it so coasting scrolls are injected before they go stale.
+"""
+
+import asyncio
+import math
+import unittest
+
+import scrolling
+from backends import RecordingBackend
+from clients import RemoteClient
+from injector import InputInjector
+from scrolling import ScrollEngine, PIXELS_PER_NOTCH
+
+
+class FakeWebSocket:
+    remote_address = ('192.0.2.1', 50000)
+
+
+class ScrollTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = scrolling.TAU, scrolling.TICK_HZ
+        scrolling.TAU, scrolling.TICK_HZ = 0.05, 200
+        self.backend = RecordingBackend()
+        self.injector = InputInjector(move_hz=0, max_rate=0, lane_size=10000)
+        self.client = RemoteClient(FakeWebSocket(), self.injector)
+        self.engine = ScrollEngine(self.client, self.backend)
+        self.injector.start()
+
+    def tearDown(self):
+        scrolling.TAU, scrolling.TICK_HZ = self.saved
+        self.injector.stop(timeout=2.0)
+
+    def run_touches(self, events):
+        """Feed (phase, a, b) scroll touches, or seconds to wait; returns the scroll calls"""
+        async def feed():
+            for event in events:
+                if isinstance(event, tuple):
+                    self.engine.on_scroll_touch(*event)
+                else:
+                    await asyncio.sleep(event)
+            while self.engine.coasting:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(feed())
+        self.injector.stop(timeout=2.0)
+        return [args for _, method, args in self.backend.take() if method == 'scroll_smooth']
+
+    def test_finger_movement_scrolls_along(self):
+        calls = self.run_touches([('start', 0, 0), ('move', 0, -60), ('move', 15, 30), ('end', 0, 0)])
+        # Finger up scrolls the viewport up (positive wheel notches)
+        self.assertEqual(calls, [(0.0, 60 / PIXELS_PER_NOTCH), (15 / PIXELS_PER_NOTCH, -1.0)])
+        self.assertFalse(self.engine.coasting)
+
+    def test_slow_release_does_not_coast(self):
+        calls = self.run_touches([('start', 0, 0), ('end', 0, scrolling.MIN_FLING - 1)])
+        self.assertEqual(calls, [])
+
+    def test_fling_coasts_with_friction(self):
+        speed = 2000.0
+        calls = self.run_touches([('start', 0, 0), ('end', 0, speed)])
+        self.assertGreater(len(calls), 5)
+        steps = [dy for _, dy in calls]
+        # Each tick scrolls less than the one before, in the same direction
+        self.assertTrue(all(step < 0 for step in steps))
+        self.assertEqual(steps, sorted(steps))
+        # Exponential decay from v covers about v * TAU before it stops
+        distance = -sum(steps) * PIXELS_PER_NOTCH
+        self.assertAlmostEqual(distance, speed * scrolling.TAU, delta=speed * scrolling.TAU * 0.15)
+
+    def test_release_velocity_is_capped(self):
+        calls = self.run_touches([('start', 0, 0), ('end', 0, scrolling.MAX_FLING * 10)])
+        first = -calls[0][1] * PIXELS_PER_NOTCH
+        self.assertAlmostEqual(first, scrolling.MAX_FLING / scrolling.TICK_HZ)
+
+    def test_diagonal_fling_keeps_its_direction(self):
+        calls = self.run_touches([('start', 0, 0), ('end', -600, 800)])
+        for dx, dy in calls:
+            self.assertAlmostEqual(math.atan2(-dy, dx), math.atan2(800, -600))
+
+    def test_touch_stops_coasting(self):
+        calls = self.run_touches([('start', 0, 0), ('end', 0, 2000.0), 0.02, ('start', 0, 0)])
+        self.assertFalse(self.engine.coasting)
+        distance = -sum(dy for _, dy in calls) * PIXELS_PER_NOTCH
+        self.assertLess(distance, 2000.0 * scrolling.TAU * 0.8)
+
+
+if __name__ == "__main__":
+    unittest.main()
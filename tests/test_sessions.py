@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Session Arbitration Tests
+Control rules of sessions.py in shared, exclusive and takeover mode: who
+may inject, hand-over on leave and release, the shared-mode motion gate,
+and held input released when a phone loses control.
+"""
+
+import asyncio
+import unittest
+
+from backends import RecordingBackend
+from clients import RemoteClient
+from injector import InputInjector
+from sessions import SessionManager
+
+
+class FakeWebSocket:
+    remote_address = ('192.0.2.1', 50000)
+
+    async def send(self, message):
+        pass
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = RecordingBackend()
+        self.injector = InputInjector(move_hz=0, max_rate=0)
+        self.move_rel = self.backend.move_rel
+
+    def phones(self, manager, count):
+        phones = [RemoteClient(FakeWebSocket(), self.injector) for _ in range(count)]
+        for phone in phones:
+            manager.join(phone)
+        return phones
+
+    def run_async(self, test):
+        """Run test() on an event loop (sending events and the watchdog need one)"""
+        async def main():
+            test()
+            await asyncio.sleep(0)
+
+        asyncio.run(main())
+
+    def test_shared_mode_allows_everyone(self):
+        def test():
+            manager = SessionManager('shared')
+            a, b = self.phones(manager, 2)
+            self.assertTrue(manager.allow(a))
+            self.assertTrue(manager.allow(b))
+            self.assertIsNone(manager.controller)
+
+        self.run_async(test)
+
+    def test_exclusive_mode(self):
+        def test():
+            manager = SessionManager('exclusive')
+            a, b, c = self.phones(manager, 3)
+            self.assertIs(manager.controller, a)
+            self.assertTrue(manager.allow(a))
+            self.assertFalse(manager.allow(b))
+            # The longest-waiting phone takes over
+            manager.leave(a)
+            self.assertIs(manager.controller, b)
+            manager.release(b)
+            self.assertIs(manager.controller, c)
+            # Only the controller can release
+            manager.release(b)
+            self.assertIs(manager.controller, c)
+
+        self.run_async(test)
+
+    def test_takeover_after_grace(self):
+        def test():
+            manager = SessionManager('takeover', grace=60.0)
+            a, b = self.phones(manager, 2)
+            self.assertTrue(manager.allow(a))
+            self.assertFalse(manager.allow(b))
+            a.last_input -= 61.0
+            self.assertTrue(manager.allow(b))
+            self.assertIs(manager.controller, b)
+
+        self.run_async(test)
+
+    def test_no_takeover_while_holding(self):
+        def test():
+            manager = SessionManager('takeover', grace=60.0)
+            a, b = self.phones(manager, 2)
+            a.input_state.press_key(self.backend, 'shift')
+            a.last_input -= 61.0
+            self.assertFalse(manager.allow(b))
+            self.assertIs(manager.controller, a)
+
+        self.run_async(test)
+
+    def test_release_lets_go_of_held_input(self):
+        def test():
+            manager = SessionManager('exclusive')
+            a, b = self.phones(manager, 2)
+            a.input_state.press_button(self.backend, 'left')
+            a.input_state.press_key(self.backend, 'ctrl')
+            manager.release(a)
+            self.assertIs(manager.controller, b)
+            self.assertFalse(a.input_state.holding)
+
+        self.run_async(test)
+        self.injector.start()
+        self.injector.stop(timeout=2.0)
+        calls = [(method, args) for _, method, args in self.backend.take()]
+        self.assertEqual(calls, [
+            ('mouse_down', ('left',)), ('key_down', ('ctrl',)),
+            ('mouse_up', ('left',)), ('key_up', ('ctrl',)),
+        ])
+
+    def test_last_phone_keeps_control_on_release(self):
+        def test():
+            manager = SessionManager('exclusive')
+            a, = self.phones(manager, 1)
+            a.input_state.press_button(self.backend, 'left')
+            manager.release(a)
+            self.assertIs(manager.controller, a)
+            self.assertTrue(a.input_state.holding)
+
+        self.run_async(test)
+
+    def test_shared_motion_gate(self):
+        def test():
+            manager = SessionManager('shared')
+            a, b = self.phones(manager, 2)
+            self.assertTrue(b.lane.submit_move(self.move_rel, 1, 1))
+            # A drag on one phone keeps the pointer to itself
+            a.input_state.press_button(self.backend, 'left')
+            self.assertFalse(b.lane.submit_move(self.move_rel, 2, 2))
+            self.assertTrue(a.lane.submit_move(self.move_rel, 3, 3))
+            # A held key doesn't lock the pointer
+            a.input_state.release_button(self.backend, 'left')
+            a.input_state.press_key(self.backend, 'shift')
+            self.assertTrue(b.lane.submit_move(self.move_rel, 4, 4))
+
+        self.run_async(test)
+
+    def test_session_ids_are_unique(self):
+        def test():
+            manager = SessionManager('shared')
+            phones = self.phones(manager, 3)
+            self.assertEqual(len({phone.session_id for phone in phones}), 3)
+
+        self.run_async(test)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            SessionManager('anarchy')
+
+
+if __name__ == "__main__":
+    unittest.main()
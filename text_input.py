@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Text Input
+Fast path for the 'type' command. Typing a pasted 2 KB snippet one key at a
+time takes tens of seconds and holds up the client's lane, and pyautogui
+silently drops characters it has no key for. Text is sent one of two ways:
+
+    short text        the backend's write(): batched Unicode key events on
+                      the native Windows backend, key presses elsewhere
+    long text, or     put on the clipboard, pasted with Ctrl+V (Cmd+V on
+    untypable chars   macOS), and the previous clipboard restored afterwards
+
+The clipboard needs pyperclip (installed with pyautogui); on Linux it also
+needs xclip, xsel or wl-clipboard.
+"""
+
+import string
+import sys
+import threading
+
+# Texts at least this long are pasted instead of typed (characters)
+DEFAULT_PASTE_THRESHOLD = 64
+# Delay before the previous clipboard contents are put back (seconds)
+RESTORE_DELAY = 0.5
+
+# Characters every backend can type as key presses
+TYPABLE = frozenset(string.ascii_letters + string.digits + string.punctuation + ' \n\t')
+
+PASTE_KEYS = ('command', 'v') if sys.platform == 'darwin' else ('ctrl', 'v')
+
+_pyperclip = None
+_clipboard_checked = False
+
+
+def clipboard():
+    """The pyperclip module if a clipboard is usable here, else None"""
+    global _pyperclip, _clipboard_checked
+    if not _clipboard_checked:
+        _clipboard_checked = True
+        try:
+            import pyperclip
+            pyperclip.paste()
+            _pyperclip = pyperclip
+        except Exception as e:
+            print(f"[!] Clipboard unavailable, long text will be typed key by key: {e}")
+    return _pyperclip
+
+
+class ClipboardPaster:
+    """Pastes text through the clipboard, restoring what was there before"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._saved = None
+        self._generation = 0
+
+    def paste(self, backend, text):
+        clip = clipboard()
+        with self._lock:
+            # Only the first paste of a burst saves; later ones keep the original
+            if self._saved is None:
+                try:
+                    self._saved = clip.paste()
+                except Exception:
+                    self._saved = ''
+            self._generation += 1
+            generation = self._generation
+        clip.copy(text)
+        backend.hotkey(*PASTE_KEYS)
+        # The target app reads the clipboard asynchronously, so restore later
+        timer = threading.Timer(RESTORE_DELAY, self._restore, (generation,))
+        timer.daemon = True
+        timer.start()
+
+    def _restore(self, generation):
+        with self._lock:
+            if generation != self._generation or self._saved is None:
+                return
+            saved, self._saved = self._saved, None
+        try:
+            clipboard().copy(saved)
+        except Exception as e:
+            print(f"[!] Could not restore the clipboard: {e}")
+
+
+class TextInput:
+    """Chooses between typing and pasting for each 'type' command"""
+
+    def __init__(self, backend, paste_threshold=DEFAULT_PASTE_THRESHOLD):
+        self.backend = backend
+        self.paste_threshold = paste_threshold
+        self._paster = ClipboardPaster()
+
+    def _can_paste(self):
+        return self.backend.paste is not None or clipboard() is not None
+
+    def _paste(self, text):
+        if self.backend.paste is not None:
+            self.backend.paste(text)
+        else:
+            self._paster.paste(self.backend, text)
+
+    def type_text(self, text):
+        """Inject text; runs on the injector thread"""
+        if not text:
+            return
+        typable = self.backend.unicode_write or TYPABLE.issuperset(text)
+        long_text = self.paste_threshold and len(text) >= self.paste_threshold
+        if (long_text or not typable) and self._can_paste():
+            self._paste(text)
+        else:
+            self.backend.write(text)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+UDP Motion Channel
+Optional unreliable side-channel for pointer motion and scroll, so a lost
+TCP segment on lossy Wi-Fi doesn't stall every queued move behind it.
+Clicks, keys and everything else stay on the WebSocket.
+
+A client asks for a channel with {"type": "udp_hello"} on its WebSocket and
+gets back {"type": "udp", "port": ..., "token": "<hex>"}. It then sends
+datagrams (little-endian):
+
+    token       8 bytes
+    seq         uint32   incremented for every datagram
+    total_x     int32    sum of all motion sent so far (pixels)
+    total_y     int32
+    total_dy    int32    sum of all scroll steps sent so far
+
+Totals are absolute, so a lost datagram costs nothing but latency: the next
+one carries its motion too. A datagram whose seq isn't newer than the last
+applied one is stale or reordered and is dropped.
+
+Browsers can't send raw UDP; this is for native clients and bench_udp.py.
+"""
+
+import asyncio
+import secrets
+import struct
+
+import metrics
+
+TOKEN_SIZE = 8
+_DATAGRAM = struct.Struct(f'<{TOKEN_SIZE}sIiii')
+DATAGRAM_SIZE = _DATAGRAM.size
+
+UDP_DATAGRAMS = metrics.registry.counter(
+    'prc_udp_datagrams_total', 'Motion datagrams received, by outcome', ('result',))
+
+
+def pack_datagram(token, seq, total_x, total_y, total_dy):
+    """Build a motion datagram (used by clients and the benchmark)"""
+    return _DATAGRAM.pack(token, seq & 0xFFFFFFFF, total_x, total_y, total_dy)
+
+
+def _newer(seq, last):
+    """True if seq comes after last in 32-bit serial number arithmetic"""
+    return seq != last and ((seq - last) & 0xFFFFFFFF) < 0x80000000
+
+
+class _Session:
+    __slots__ = ('client', 'seq', 'x', 'y', 'dy')
+
+    def __init__(self, client):
+        self.client = client
+        self.seq = None
+        self.x = 0
+        self.y = 0
+        self.dy = 0
+
+
+class MotionChannel(asyncio.DatagramProtocol):
+    """UDP listener applying motion datagrams to the owning client's lane"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        # Bind once, like the registry, so moves coalesce in the lane
+        self.move_rel = backend.move_rel
+        self.port = None
+        self.transport = None
+        # Session manager deciding who may inject; None lets everyone
+        self.arbiter = None
+        self._sessions = {}
+
+    async def start(self, host, port, sock=None):
+        """Bind the UDP socket on the running loop, or use an already bound sock"""
+        loop = asyncio.get_running_loop()
+        if sock is not None:
+            await loop.create_datagram_endpoint(lambda: self, sock=sock)
+        else:
+            await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        self.port = self.transport.get_extra_info('sockname')[1]
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def open_session(self, client):
+        """Issue a token for a client; replaces the client's previous one"""
+        self.close_session(client)
+        token = secrets.token_bytes(TOKEN_SIZE)
+        self._sessions[token] = _Session(client)
+        client.udp_token = token
+        return token
+
+    def close_session(self, client):
+        token = getattr(client, 'udp_token', None)
+        if token is not None:
+            self._sessions.pop(token, None)
+            client.udp_token = None
+
+    def datagram_received(self, data, addr):
+        if len(data) != DATAGRAM_SIZE:
+            UDP_DATAGRAMS.inc(1, 'malformed')
+            return
+        token, seq, x, y, dy = _DATAGRAM.unpack(data)
+        session = self._sessions.get(token)
+        # The token is only valid from the address that asked for it
+        if session is None or addr[0] != session.client.address:
+            UDP_DATAGRAMS.inc(1, 'unknown')
+            return
+        if session.seq is not None and not _newer(seq, session.seq):
+            UDP_DATAGRAMS.inc(1, 'stale')
+            return
+        session.seq = seq
+        move_x = x - session.x
+        move_y = y - session.y
+        scroll = dy - session.dy
+        session.x, session.y, session.dy = x, y, dy
+        if (move_x or move_y or scroll) and self.arbiter is not None \
+                and not self.arbiter.allow(session.client):
+            UDP_DATAGRAMS.inc(1, 'denied')
+            return
+        lane = session.client.lane
+        if move_x or move_y:
+            lane.submit_move(self.move_rel, move_x, move_y)
+        if scroll:
+            lane.submit_droppable('scroll', self.backend.scroll, scroll)
+        UDP_DATAGRAMS.inc(1, 'applied')
@@ -5,51 +5,17 @@ With keyboard, sensitivity control, and improved tap gestures
 """
 
 import asyncio
-import websockets
-import json
-import pyautogui
-import socket
 import sys
-import os
-import subprocess
 from aiohttp import web
-
-# Kill any existing instances of this server
-def kill_existing_servers():
-    """Kill any existing Python processes running this script"""
-    current_pid = os.getpid()
-    script_name = os.path.basename(__file__)
-    
-    if sys.platform == 'win32':
-        # Get all python processes
-        try:
-            result = subprocess.run(['wmic', 'process', 'where', "name='python.exe' or name='py.exe'", 
-                                   'get', 'ProcessId,CommandLine'], 
-                                  capture_output=True, text=True)
-            
-            for line in result.stdout.split('\n'):
-                if script_name in line and 'working_server' in line:
-                    # Extract PID from the line
-                    parts = line.split()
-                    if parts:
-                        try:
-                            pid = int(parts[-1])
-                            if pid != current_pid:
-                                # Kill the old process
-                                subprocess.run(['taskkill', '/F', '/PID', str(pid)], 
-                                             capture_output=True)
-                                print(f"[!] Killed old server instance (PID: {pid})")
-                        except (ValueError, subprocess.CalledProcessError):
-                            pass
-        except Exception as e:
-            pass  # Silently continue if WMIC fails
-
-# Kill old instances before starting
-kill_existing_servers()
-
-# Configure pyautogui
-pyautogui.FAILSAFE = False
-pyautogui.PAUSE = 0.01
+from injector import InputInjector
+from commands import create_registry
+from clients import RemoteClient
+from backends import create_backend
+import protocol
+import monitors
+from aiohttp_ws import websocket_route
+from discovery import local_addresses
+from instance_guard import InstanceGuard, listen
 
 # The HTML interface with all features
 HTML_INTERFACE = """
@@ -325,6 +291,13 @@ HTML_INTERFACE = """
         let isDragging = false;
         let sensitivity = 2.0;
         
+        // While a button is held, keep telling the server we're alive so it
+        // releases the button quickly if this phone drops off the network
+        const HEARTBEAT_INTERVAL = 1000;
+        setInterval(() => {
+            if (isDragging) sendCommand({ type: 'heartbeat' });
+        }, HEARTBEAT_INTERVAL);
+        
         // Gesture feedback
         function showGesture(text) {
             const indicator = document.getElementById('gestureIndicator');
@@ -343,8 +316,9 @@ HTML_INTERFACE = """
         
         // Connect to WebSocket server
         function connect() {
+            // Control channel is served on the same origin as this page
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const wsUrl = protocol + '//' + window.location.hostname + ':8765';
+            const wsUrl = protocol + '//' + window.location.host + '/ws';
             
             ws = new WebSocket(wsUrl);
             
@@ -353,10 +327,11 @@ HTML_INTERFACE = """
                 document.getElementById('status').className = 'status connected';
             };
             
-            ws.onclose = () => {
+            ws.onclose = (event) => {
                 document.getElementById('status').textContent = 'Disconnected';
                 document.getElementById('status').className = 'status disconnected';
-                setTimeout(connect, 2000);
+                // 1012: the server is restarting and its replacement is already listening
+                setTimeout(connect, event.code === 1012 ? 0 : 2000);
             };
             
             ws.onerror = (error) => {
@@ -620,81 +595,65 @@ HTML_INTERFACE = """
 </html>
 """
 
+# Input calls run on their own thread, off the event loop
+injector = InputInjector()
+# pyautogui loads on a background thread while the listeners start
+registry = create_registry(create_backend('pyautogui', deferred=True))
+# Set once the legacy listener has imported websockets
+ConnectionClosed = ()
+# Connected phones, sent off with 1012 when a newer instance takes over
+clients = set()
+
 async def handle_websocket(websocket):
     """Handle WebSocket connections"""
     print(f"[+] Phone connected")
+    client = RemoteClient(websocket, injector)
+    clients.add(client)
     
     try:
         async for message in websocket:
+            client.on_message()
             try:
-                data = json.loads(message)
-                
-                if data['type'] == 'mouse_move':
-                    pyautogui.moveRel(data['dx'], data['dy'])
-                
-                elif data['type'] == 'click':
-                    button = data.get('button', 'left')
-                    pyautogui.click(button=button)
-                
-                elif data['type'] == 'mousedown':
-                    pyautogui.mouseDown(button=data['button'])
-                
-                elif data['type'] == 'mouseup':
-                    pyautogui.mouseUp(button=data['button'])
-                
-                elif data['type'] == 'scroll':
-                    pyautogui.scroll(data['dy'])
-                
-                elif data['type'] == 'key':
-                    pyautogui.press(data['key'])
-                
-                elif data['type'] == 'combo':
-                    pyautogui.hotkey(*data['keys'])
-                
-                elif data['type'] == 'type':
-                    pyautogui.write(data['text'])
-                
+                if not registry.dispatch_message(message, client):
+                    print(f"[ERROR] Invalid command: {message[:80]!r}")
             except Exception as e:
-                print(f"[ERROR] {e}")
-                
-    except websockets.exceptions.ConnectionClosed:
+                # A bad command must not cost the phone its connection
+                print(f"[ERROR] Error processing command: {e}")
+            await client.throttle()
+    
+    except ConnectionClosed:
         pass
     finally:
+        clients.discard(client)
+        client.close()
         print(f"[-] Phone disconnected")
 
 async def serve_html(request):
     """Serve the HTML interface"""
     return web.Response(text=HTML_INTERFACE, content_type='text/html')
 
-def get_local_ip():
-    """Get local IP address"""
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return "127.0.0.1"
-
-async def main():
-    """Main server function"""
-    local_ip = get_local_ip()
+async def main(guard):
+    """Main server function; returns when a newer instance takes over"""
+    global ConnectionClosed
+    addresses = local_addresses() or ['127.0.0.1']
+    injector.start()
+    # Monitor layout for absolute pointer moves, queried in the background while in use
+    monitors.layout.start()
     http_port = 8080
     ws_port = 8765
     
     # Create HTTP server
     app = web.Application()
     app.router.add_get('/', serve_html)
-    
-    # Start WebSocket server
-    ws_server = await websockets.serve(handle_websocket, '0.0.0.0', ws_port)
+    app.router.add_get('/ws', websocket_route(handle_websocket))
     
     print("\n" + "="*50)
     print("PHONE REMOTE CONTROL - FULL VERSION")
     print("="*50)
-    print(f"\nServer running at: http://{local_ip}:{http_port}")
-    print(f"WebSocket port: {ws_port}")
+    print(f"\nServer running at: http://{addresses[0]}:{http_port}")
+    for address in addresses[1:]:
+        print(f"  Also reachable at: http://{address}:{http_port}")
+    print(f"WebSocket: ws://{addresses[0]}:{http_port}/ws (legacy port {ws_port})")
     print("\nFeatures:")
     print("- Single tap = Left click")
     print("- Double tap = Right click")
@@ -706,14 +665,40 @@ async def main():
     # Start HTTP server
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', http_port)
+    # Listening sockets are inherited from the previous instance if there was one
+    http_sock = listen('0.0.0.0', http_port, guard.inherited)
+    site = web.SockSite(runner, http_sock)
     await site.start()
     
-    # Keep server running
-    await asyncio.Future()
+    # Start WebSocket server
+    import websockets
+    ConnectionClosed = websockets.ConnectionClosed
+    ws_sock = listen('0.0.0.0', ws_port, guard.inherited)
+    ws_server = await websockets.serve(handle_websocket, sock=ws_sock,
+                                       subprotocols=protocol.SUBPROTOCOLS,
+                                       select_subprotocol=protocol.select_subprotocol)
+    
+    # Keep server running until a newer instance takes over
+    stop = asyncio.Event()
+    await guard.serve(stop.set, [http_sock, ws_sock])
+    await stop.wait()
+    # Stop accepting, send phones to the new instance, let queued input finish
+    ws_server.close(close_connections=False)
+    await site.stop()
+    await asyncio.gather(*(client.websocket.close(1012, 'server restart') for client in list(clients)),
+                         return_exceptions=True)
+    await asyncio.sleep(0.1)
+    await runner.cleanup()
+    injector.stop(2.0)
+    guard.release()
 
 if __name__ == "__main__":
+    # Take over from an instance that is still running, like a restart
+    guard = InstanceGuard('working_server')
+    if not guard.acquire(replace=True):
+        print("[ERROR] Could not take over from the running server instance")
+        sys.exit(1)
     try:
-        asyncio.run(main())
+        asyncio.run(main(guard))
     except KeyboardInterrupt:
         print("\n\nServer stopped.")
\ No newline at end of file